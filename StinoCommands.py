@@ -113,9 +113,56 @@ class StinoRefreshExamplesCommand(sublime_plugin.WindowCommand):
 
     def run(self):
         """."""
+        stino.st_menu.examples_index.clear()
         stino.st_menu.update_example_menu(stino.arduino_info)
 
 
+class StinoBrowseExamplesCommand(sublime_plugin.WindowCommand):
+    """Browse an examples tree one directory level at a time."""
+
+    def run(self, dir_path):
+        """."""
+        self.dir_paths = [dir_path]
+        self.entries = []
+        self.show_level()
+
+    def show_level(self):
+        """."""
+        root_path = self.dir_paths[0]
+        dir_path = self.dir_paths[-1]
+        self.entries = stino.st_menu.examples_index.list_dirs(dir_path)
+
+        items = []
+        if len(self.dir_paths) > 1:
+            items.append(['..', os.path.relpath(dir_path, root_path)])
+        for name, path, is_sketch in self.entries:
+            if is_sketch:
+                detail = stino.translate('Example')
+            else:
+                detail = os.path.relpath(path, root_path) + '/'
+            items.append([name, detail])
+        show_panel = self.window.show_quick_panel
+        sublime.set_timeout(lambda: show_panel(items, self.on_done), 0)
+
+    def on_done(self, index):
+        """."""
+        if index < 0:
+            return
+        if len(self.dir_paths) > 1:
+            if index == 0:
+                self.dir_paths.pop()
+                self.show_level()
+                return
+            index -= 1
+
+        name, path, is_sketch = self.entries[index]
+        if is_sketch:
+            stino.open_project(path, self.window)
+        else:
+            self.dir_paths.append(path)
+            self.show_level()
+
+
 class StinoOpenExampleCommand(sublime_plugin.WindowCommand):
     """."""
 
@@ -260,6 +307,14 @@ class StinoCheckToolsCommand(sublime_plugin.WindowCommand):
         stino.check_tools_deps(platform_info)
 
 
+class StinoGcStoreCommand(sublime_plugin.WindowCommand):
+    """."""
+
+    def run(self):
+        """."""
+        stino.tools_store_cleaner.put(stino.arduino_info['blob_store'])
+
+
 class StinoSelectVersionCommand(sublime_plugin.WindowCommand):
     """."""
 
@@ -279,6 +334,7 @@ class StinoRefreshPlatformExamplesCommand(sublime_plugin.WindowCommand):
 
     def run(self):
         """."""
+        stino.st_menu.examples_index.clear()
         stino.st_menu.update_platform_example_menu(stino.arduino_info)
 
 
@@ -348,6 +404,72 @@ class StinoSelectBoardCommand(sublime_plugin.WindowCommand):
         return state
 
 
+class StinoSearchBoardsCommand(sublime_plugin.WindowCommand):
+    """Find a board or platform by name, FQBN, architecture or MCU."""
+
+    def run(self, query=None):
+        """."""
+        self.results = []
+        if query is None:
+            caption = stino.translate('Search Boards:')
+            self.window.show_input_panel(caption, '', self.on_query, None,
+                                         None)
+        else:
+            self.on_query(query)
+
+    def on_query(self, query):
+        """."""
+        self.results = stino.search_boards(query)
+        items = []
+        for title, payload in self.results:
+            if payload['type'] == 'board':
+                detail = '%s (%s)' % (payload['fqbn'], payload['version'])
+            else:
+                detail = stino.translate('Install Platform')
+                detail += ' [%s] %s' % (payload['package'],
+                                        payload['version'])
+            items.append([title, detail])
+        if items:
+            show_panel = self.window.show_quick_panel
+            sublime.set_timeout(lambda: show_panel(items, self.on_done), 0)
+
+    def on_done(self, index):
+        """."""
+        if index >= 0:
+            title, payload = self.results[index]
+            stino.on_board_search_select(payload)
+
+
+class StinoSearchLibrariesCommand(sublime_plugin.WindowCommand):
+    """Find a library in the library index and install it."""
+
+    def run(self, query=None):
+        """."""
+        self.results = []
+        if query is None:
+            caption = stino.translate('Search Libraries:')
+            self.window.show_input_panel(caption, '', self.on_query, None,
+                                         None)
+        else:
+            self.on_query(query)
+
+    def on_query(self, query):
+        """."""
+        self.results = stino.search_libraries(query)
+        items = []
+        for lib_info in self.results:
+            title = '%s %s' % (lib_info['name'], lib_info['version'])
+            items.append([title, lib_info.get('sentence') or ''])
+        if items:
+            show_panel = self.window.show_quick_panel
+            sublime.set_timeout(lambda: show_panel(items, self.on_done), 0)
+
+    def on_done(self, index):
+        """."""
+        if index >= 0:
+            stino.library_installer.put(self.results[index])
+
+
 class StinoRefreshBoardOptionsCommand(sublime_plugin.WindowCommand):
     """."""
 
@@ -395,6 +517,70 @@ class StinoToggleFullBuildCommand(sublime_plugin.WindowCommand):
         return state
 
 
+class StinoTogglePrecompileHeaderCommand(sublime_plugin.WindowCommand):
+    """."""
+
+    def run(self):
+        """."""
+        settings = stino.arduino_info['settings']
+        state = bool(settings.get('precompile_header'))
+        settings.set('precompile_header', not state)
+
+    def is_checked(self):
+        """."""
+        settings = stino.arduino_info['settings']
+        state = bool(settings.get('precompile_header'))
+        return state
+
+
+class StinoUnityBuildLibrariesCommand(sublime_plugin.WindowCommand):
+    """Choose the libraries compiled as a few unity files."""
+
+    def run(self):
+        """."""
+        settings = stino.arduino_info['settings']
+        unity_names = stino.get_unity_libraries()
+        fallbacks = settings.get('unity_fallbacks', [])
+        self.names = []
+        items = []
+        for lib_path in stino.get_library_paths():
+            name = os.path.basename(lib_path)
+            if name in self.names:
+                continue
+            self.names.append(name)
+            if name in unity_names:
+                state = stino.translate('Unity build')
+            elif name in fallbacks:
+                state = stino.translate('Failed in unity build')
+            else:
+                state = stino.translate('File by file')
+            items.append([name, state])
+        if items:
+            self.window.show_quick_panel(items, self.on_done)
+
+    def on_done(self, index):
+        """."""
+        if index >= 0:
+            stino.toggle_unity_library(self.names[index])
+
+
+class StinoToggleInstallMissingLibrariesCommand(
+        sublime_plugin.WindowCommand):
+    """."""
+
+    def run(self):
+        """."""
+        settings = stino.arduino_info['settings']
+        state = bool(settings.get('auto_install_libraries'))
+        settings.set('auto_install_libraries', not state)
+
+    def is_checked(self):
+        """."""
+        settings = stino.arduino_info['settings']
+        state = bool(settings.get('auto_install_libraries'))
+        return state
+
+
 class StinoShowBuildOutputCommand(sublime_plugin.WindowCommand):
     """."""
 
@@ -666,8 +852,12 @@ class StinoAboutCommand(sublime_plugin.WindowCommand):
 class StinoPanelWriteCommand(sublime_plugin.TextCommand):
     """."""
 
-    def run(self, edit, text):
+    def run(self, edit, text, max_size=0):
         """."""
         point = self.view.size()
         self.view.insert(edit, point, text)
-        self.view.show(point)
+        excess = self.view.size() - max_size
+        if max_size and excess > 0:
+            cut = self.view.full_line(excess).end()
+            self.view.erase(edit, sublime.Region(0, cut))
+        self.view.show(self.view.size())
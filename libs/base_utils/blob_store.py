@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Doc."""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import stat
+import time
+import uuid
+import hashlib
+import threading
+
+BUFFER_SIZE = 256 * 1024
+TMP_FILE_AGE = 3600
+
+
+class BlobStore(object):
+    """Content addressed files, shared by hardlinks between versions."""
+
+    def __init__(self, path):
+        """."""
+        self._path = path
+        self._tmp_path = os.path.join(path, 'tmp')
+        self._lock = threading.RLock()
+
+    def get_path(self):
+        """."""
+        return self._path
+
+    def get_blob_path(self, key):
+        """."""
+        return os.path.join(self._path, key[:2], key[2:])
+
+    def get_key(self, digest, mode):
+        """."""
+        key = digest
+        if mode & stat.S_IXUSR:
+            key += 'x'
+        return key
+
+    def new_tmp_file_path(self):
+        """."""
+        if not os.path.isdir(self._tmp_path):
+            os.makedirs(self._tmp_path)
+        return os.path.join(self._tmp_path, uuid.uuid4().hex)
+
+    def commit(self, tmp_file_path, digest, mode):
+        """Move a written file into the store, return its blob path."""
+        key = self.get_key(digest, mode)
+        blob_path = self.get_blob_path(key)
+        with self._lock:
+            if os.path.isfile(blob_path):
+                os.remove(tmp_file_path)
+            else:
+                dir_path = os.path.dirname(blob_path)
+                if not os.path.isdir(dir_path):
+                    os.makedirs(dir_path)
+                os.chmod(tmp_file_path, stat.S_IMODE(mode))
+                os.rename(tmp_file_path, blob_path)
+        return blob_path
+
+    def supports_links(self, dir_path):
+        """."""
+        state = False
+        tmp_file_path = self.new_tmp_file_path()
+        link_path = os.path.join(dir_path, '.stino-link-test')
+        try:
+            open(tmp_file_path, 'wb').close()
+            os.link(tmp_file_path, link_path)
+        except OSError:
+            pass
+        else:
+            os.remove(link_path)
+            state = True
+        finally:
+            if os.path.isfile(tmp_file_path):
+                os.remove(tmp_file_path)
+        return state
+
+    def link(self, blob_path, target_path):
+        """."""
+        dir_path = os.path.dirname(target_path)
+        if not os.path.isdir(dir_path):
+            os.makedirs(dir_path)
+        if os.path.lexists(target_path):
+            os.remove(target_path)
+        os.link(blob_path, target_path)
+
+    def add_stream(self, fileobj, target_path, mode):
+        """Write fileobj into the store and hardlink it at target_path."""
+        hasher = hashlib.sha256()
+        tmp_file_path = self.new_tmp_file_path()
+        with open(tmp_file_path, 'wb') as f:
+            while True:
+                data = fileobj.read(BUFFER_SIZE)
+                if not data:
+                    break
+                hasher.update(data)
+                f.write(data)
+        with self._lock:
+            blob_path = self.commit(tmp_file_path, hasher.hexdigest(), mode)
+            self.link(blob_path, target_path)
+
+    def add_file(self, file_path):
+        """Replace a regular file with a hardlink into the store."""
+        file_stat = os.lstat(file_path)
+        if not stat.S_ISREG(file_stat.st_mode) or file_stat.st_nlink > 1:
+            return 0
+        hasher = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            while True:
+                data = f.read(BUFFER_SIZE)
+                if not data:
+                    break
+                hasher.update(data)
+        key = self.get_key(hasher.hexdigest(), file_stat.st_mode)
+        blob_path = self.get_blob_path(key)
+
+        saved_size = 0
+        with self._lock:
+            if os.path.isfile(blob_path):
+                tmp_link_path = file_path + '.stino-link'
+                os.link(blob_path, tmp_link_path)
+                os.rename(tmp_link_path, file_path)
+                saved_size = file_stat.st_size
+            else:
+                dir_path = os.path.dirname(blob_path)
+                if not os.path.isdir(dir_path):
+                    os.makedirs(dir_path)
+                os.link(file_path, blob_path)
+        return saved_size
+
+    def add_tree(self, dir_path):
+        """Deduplicate every regular file under dir_path."""
+        saved_size = 0
+        for root, dir_names, file_names in os.walk(dir_path):
+            for file_name in file_names:
+                file_path = os.path.join(root, file_name)
+                try:
+                    saved_size += self.add_file(file_path)
+                except OSError:
+                    return saved_size
+        return saved_size
+
+    def gc(self):
+        """Remove blobs no version directory links to any more."""
+        removed_count = 0
+        removed_size = 0
+        if not os.path.isdir(self._path):
+            return removed_count, removed_size
+        with self._lock:
+            for name in os.listdir(self._path):
+                dir_path = os.path.join(self._path, name)
+                if not os.path.isdir(dir_path):
+                    continue
+                for blob_name in os.listdir(dir_path):
+                    blob_path = os.path.join(dir_path, blob_name)
+                    blob_stat = os.lstat(blob_path)
+                    if name == 'tmp':
+                        is_orphan = time.time() - blob_stat.st_mtime > \
+                            TMP_FILE_AGE
+                    else:
+                        is_orphan = blob_stat.st_nlink < 2
+                    if is_orphan:
+                        os.remove(blob_path)
+                        removed_count += 1
+                        removed_size += blob_stat.st_size
+        return removed_count, removed_size
@@ -125,6 +125,32 @@ def combine_ino_files(ino_file_paths, target_file_path):
             target_f.write(text)
 
 
+def gen_unity_files(name, src_paths, unity_dir_path, max_files=16):
+    """Group src_paths into a few translation units, return their paths.
+
+    Members are #included by absolute path, so diagnostics keep their
+    own file and line and relative includes resolve as before. A unity
+    file is only rewritten when a member changes, which keeps its mtime
+    usable for incremental builds.
+    """
+    unity_paths = []
+    if not os.path.isdir(unity_dir_path):
+        os.makedirs(unity_dir_path)
+    for index in range(0, len(src_paths), max_files):
+        text = ''
+        for src_path in src_paths[index:index + max_files]:
+            text += '// %s\n' % os.path.getmtime(src_path)
+            text += '#include "%s"\n' % src_path
+        unity_name = '%s.unity%d.cpp' % (name, index // max_files)
+        unity_path = os.path.join(unity_dir_path, unity_name)
+        unity_path = unity_path.replace('\\', '/')
+        unity_file = file.File(unity_path)
+        if not os.path.isfile(unity_path) or unity_file.read() != text:
+            unity_file.write(text)
+        unity_paths.append(unity_path)
+    return unity_paths
+
+
 def check_main_file(file_paths, prj_type='arduino'):
     """."""
     has_main_file = False
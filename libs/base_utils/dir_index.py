@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Doc."""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import threading
+import collections
+
+MAX_DIRS = 1024
+SKETCH_EXTS = ['.ino', '.pde']
+
+
+def is_sketch_dir(dir_path):
+    """."""
+    name = os.path.basename(dir_path)
+    for ext in SKETCH_EXTS:
+        if os.path.isfile(os.path.join(dir_path, name + ext)):
+            return True
+    return False
+
+
+class DirIndex(object):
+    """Sub-directory listings, cached by path until the mtime changes."""
+
+    def __init__(self, max_dirs=MAX_DIRS):
+        """."""
+        self._max_dirs = max_dirs
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def list_dirs(self, dir_path):
+        """Return [(name, path, is_sketch)] for the sub-directories."""
+        try:
+            mtime = os.stat(dir_path).st_mtime
+        except OSError:
+            return []
+
+        with self._lock:
+            cached = self._cache.pop(dir_path, None)
+            if cached and cached[0] == mtime:
+                self._cache[dir_path] = cached
+                return list(cached[1])
+
+        entries = []
+        try:
+            names = os.listdir(dir_path)
+        except OSError:
+            names = []
+        for name in sorted(names, key=lambda n: n.lower()):
+            path = os.path.join(dir_path, name)
+            if not name.startswith('.') and os.path.isdir(path):
+                entries.append((name, path, is_sketch_dir(path)))
+
+        with self._lock:
+            self._cache[dir_path] = (mtime, entries)
+            while len(self._cache) > self._max_dirs:
+                self._cache.popitem(last=False)
+        return list(entries)
+
+    def clear(self):
+        """."""
+        with self._lock:
+            self._cache.clear()
@@ -10,138 +10,319 @@ from __future__ import unicode_literals
 
 import os
 import sys
+import glob
+import time
+import hashlib
+import shutil
+import threading
 import http.client
 import ssl
 import socket
 import urllib.error
 import urllib.request
 import operator
+from concurrent import futures
 
 from . import task_queue
 
+BUFFER_SIZE = 256 * 1024
+TIMEOUT = 30
+MAX_RETRIES = 8
+MAX_BACKOFF = 30
+PROGRESS_INTERVAL = 1.0
+SPLIT_MIN_SIZE = 8 * 1024 * 1024
+
 
 def get_remote_file_info(url):
     """."""
     info = {}
-    if url.startswith('https'):
-        opener = urllib.request.build_opener(HTTPSHandlerV3())
-        urllib.request.install_opener(opener)
-    try:
-        response = urllib.request.urlopen(url)
-    except (urllib.error.URLError, urllib.error.HTTPError) as e:
-        print(url, e)
-    else:
-        info = dict(response.headers)
-        response.close()
+    opener = build_opener(url)
+    for method in ('HEAD', 'GET'):
+        req = urllib.request.Request(url, method=method)
+        try:
+            response = opener.open(req, timeout=TIMEOUT)
+        except (ValueError, urllib.error.URLError, socket.error) as e:
+            if method == 'GET':
+                print(url, e)
+        else:
+            info = dict(response.headers)
+            response.close()
+            break
     return info
 
 
-def get_remote_etag(url):
+def build_opener(url):
     """."""
-    info = get_remote_file_info(url)
-    if 'ETag' in info:
-        etag = info.get('ETag')
-    elif 'Last-Modified' in info:
-        etag = info.get('Last-Modified')
-    elif 'Content-Length' in info:
-        etag = info.get('Content-Length')
+    if url.startswith('https'):
+        opener = urllib.request.build_opener(HTTPSHandlerV3())
     else:
-        etag = ''
-
-    if etag.endswith('"'):
-        etag = etag[:-1]
-    if '"'in etag:
-        index = etag.index('"')
-        etag = etag[index + 1:]
-    return etag
-
+        opener = urllib.request.build_opener()
+    return opener
 
-def download(url, target_dir,
-             message_consumer=sys.stdout.write, mode='resume'):
-    """."""
-    is_done = False
-    trunk_size = 1024
-    done_size = 0
 
+def download_if_modified(url, target_dir, validators=None, timeout=30):
+    """Return (state, validators); state is modified, not_modified, failed."""
+    state = 'failed'
+    validators = dict(validators or {})
     file_name = os.path.basename(url)
     target_file_path = os.path.join(target_dir, file_name)
-    tmp_file_path = target_file_path + '.stino-down'
-
-    remote_info = get_remote_file_info(url)
-    remote_size = int(remote_info.get('Content-Length', '0'))
+    req = urllib.request.Request(url)
+    if os.path.isfile(target_file_path):
+        if validators.get('etag'):
+            req.add_header('If-None-Match', validators['etag'])
+        if validators.get('last_modified'):
+            req.add_header('If-Modified-Since', validators['last_modified'])
 
-    if remote_size > 0:
-        if mode == 'resume':
+    try:
+        remote_f = build_opener(url).open(req, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            state = 'not_modified'
+        else:
+            print(url, e)
+    except (ValueError, urllib.error.URLError, socket.error) as e:
+        print(url, e)
+    else:
+        tmp_file_path = target_file_path + '.stino-down'
+        if not os.path.isdir(target_dir):
+            os.makedirs(target_dir)
+        try:
+            with open(tmp_file_path, 'wb') as f:
+                while True:
+                    trunk = remote_f.read(BUFFER_SIZE)
+                    if not trunk:
+                        break
+                    f.write(trunk)
+        except (IOError, urllib.error.URLError, socket.error) as e:
+            print(url, e)
+        else:
             if os.path.isfile(target_file_path):
-                if os.path.getsize(target_file_path) == remote_size:
-                    is_done = True
-
-        if not is_done:
-            if url.startswith('https'):
-                opener = urllib.request.build_opener(HTTPSHandlerV3())
-                urllib.request.install_opener(opener)
-            req = urllib.request.Request(url)
-            if os.path.isfile(tmp_file_path):
-                if mode == 'resume':
-                    done_size = os.path.getsize(tmp_file_path)
-                    req.add_header('Range', 'bytes=%d-' % done_size)
-                else:
-                    os.remove(tmp_file_path)
+                os.remove(target_file_path)
+            os.rename(tmp_file_path, target_file_path)
+            validators['etag'] = remote_f.headers.get('ETag', '')
+            validators['last_modified'] = \
+                remote_f.headers.get('Last-Modified', '')
+            state = 'modified'
+        finally:
+            remote_f.close()
+    return state, validators
+
+
+class Progress(object):
+    """."""
 
+    def __init__(self, url, total_size, done_size=0,
+                 message_consumer=sys.stdout.write,
+                 interval=PROGRESS_INTERVAL):
+        """."""
+        self._url = url
+        self._total_size = total_size
+        self._done_size = done_size
+        self._consumer = message_consumer
+        self._interval = interval
+        self._last_time = time.time()
+        self._lock = threading.Lock()
+
+    def add(self, size):
+        """."""
+        with self._lock:
+            self._done_size += size
+            now = time.time()
+            if now - self._last_time >= self._interval:
+                self._last_time = now
+                self.report()
+
+    def report(self):
+        """."""
+        done_size = self._done_size / 1024 / 1024
+        if self._total_size > 0:
+            percent = self._done_size / self._total_size * 100
+            total_size = self._total_size / 1024 / 1024
+            text = '[%s] %.0f%% (%.2f M / %.2f M)\n' % (self._url, percent,
+                                                        done_size, total_size)
+        else:
+            text = '[%s] %.2f M\n' % (self._url, done_size)
+        self._consumer(text)
+
+
+def fetch_part(url, part_path, start, end, progress):
+    """Fetch bytes start..end (inclusive, None for EOF) into part_path."""
+    retry_counter = 0
+    while True:
+        done_size = 0
+        if os.path.isfile(part_path):
+            done_size = os.path.getsize(part_path)
+        if end is not None and start + done_size > end:
+            return True
+
+        req = urllib.request.Request(url)
+        is_ranged = start + done_size > 0 or end is not None
+        if is_ranged:
+            end_text = '' if end is None else str(end)
+            req.add_header('Range', 'bytes=%d-%s' % (start + done_size,
+                                                     end_text))
+        try:
+            remote_f = build_opener(url).open(req, timeout=TIMEOUT)
+            file_mode = 'ab'
+            if is_ranged and remote_f.getcode() != 206:
+                if start > 0:
+                    remote_f.close()
+                    return False
+                file_mode = 'wb'
+                progress.add(-done_size)
             try:
-                remote_f = urllib.request.urlopen(req)
-            except (ValueError, urllib.error.HTTPError, urllib.error.URLError):
-                message_consumer('[Error] Can not fetch %s\n' % url)
-            else:
-                message_consumer('[%s] Download started.\n' % url)
-                block = b''
-                retry_counter = 0
-
-                if not os.path.isdir(target_dir):
-                    os.makedirs(target_dir)
-                f = open(tmp_file_path, 'ab')
-                while True:
-                    try:
-                        trunk = remote_f.read(trunk_size)
-                    except (urllib.error.HTTPError, urllib.error.URLError):
-                        retry_counter += 1
-                        if retry_counter < 20:
-                            continue
-                        else:
-                            break
-                    else:
+                with open(part_path, file_mode) as f:
+                    while True:
+                        trunk = remote_f.read(BUFFER_SIZE)
                         if not trunk:
-                            is_done = True
                             break
+                        f.write(trunk)
+                        progress.add(len(trunk))
+            finally:
+                remote_f.close()
+        except urllib.error.HTTPError as e:
+            print(url, e)
+            if e.code < 500:
+                return False
+        except ValueError as e:
+            print(url, e)
+            return False
+        except (urllib.error.URLError, socket.error,
+                http.client.HTTPException) as e:
+            print(url, e)
+        else:
+            if end is None or start + os.path.getsize(part_path) > end:
+                return True
+
+        retry_counter += 1
+        if retry_counter > MAX_RETRIES:
+            return False
+        time.sleep(min(2 ** retry_counter, MAX_BACKOFF))
+
+
+def split_ranges(size, connections):
+    """."""
+    ranges = []
+    part_size = size // connections
+    for index in range(connections):
+        start = index * part_size
+        end = start + part_size - 1
+        if index == connections - 1:
+            end = size - 1
+        ranges.append((start, end))
+    return ranges
+
+
+def get_parts_key(remote_info, remote_size):
+    """Tie resumable parts to the size and version of the remote file."""
+    key = '%d' % remote_size
+    validator = remote_info.get('ETag') or remote_info.get('Last-Modified')
+    if validator:
+        key += '.' + hashlib.md5(validator.encode('utf-8')).hexdigest()[:8]
+    return key
+
+
+def join_parts(part_paths, file_path):
+    """."""
+    with open(file_path, 'wb') as target_f:
+        for part_path in part_paths:
+            with open(part_path, 'rb') as part_f:
+                shutil.copyfileobj(part_f, target_f, BUFFER_SIZE)
+    for part_path in part_paths:
+        os.remove(part_path)
 
-                        block += trunk
-                        if len(block) > remote_size / 10:
-                            done_size += len(block)
-                            f.write(block)
-                            block = b''
 
-                            percent = done_size / remote_size * 100
-                            text = '[%s] %.0f%%' % (url, percent)
-                            text += ' ('
-                            text += '%.2f' % (done_size / 1024 / 1024)
-                            text += ' M / '
-                            text += '%.2f' % (remote_size / 1024 / 1024)
-                            text += ' M)\n'
-                            message_consumer(text)
+def download(url, target_dir, message_consumer=sys.stdout.write,
+             mode='resume', connections=1):
+    """."""
+    is_done = False
+    file_name = os.path.basename(url)
+    target_file_path = os.path.join(target_dir, file_name)
+    tmp_file_path = target_file_path + '.stino-down'
 
-                if done_size < remote_size:
-                    f.write(block)
+    remote_info = get_remote_file_info(url)
+    if not remote_info:
+        message_consumer('[Error] Can not fetch %s\n' % url)
+        return is_done
 
-                remote_f.close()
-                f.close()
-
-                if is_done:
-                    if os.path.isfile(target_file_path):
-                        os.remove(target_file_path)
-                    os.rename(tmp_file_path, target_file_path)
-                    message_consumer('[%s] Download completed.\n' % url)
-                else:
-                    message_consumer('[%s] Download failed.\n' % url)
+    remote_size = int(remote_info.get('Content-Length', '0'))
+    accept_ranges = remote_info.get('Accept-Ranges', '') == 'bytes'
+    if mode == 'resume' and remote_size > 0:
+        if os.path.isfile(target_file_path):
+            if os.path.getsize(target_file_path) == remote_size:
+                return True
+
+    has_validator = bool(remote_info.get('ETag') or
+                         remote_info.get('Last-Modified'))
+    has_old_part = mode == 'resume' and accept_ranges and \
+        os.path.isfile(tmp_file_path) and \
+        0 < os.path.getsize(tmp_file_path) <= remote_size
+    parts_key = get_parts_key(remote_info, remote_size)
+    if connections > 1 and accept_ranges and \
+            remote_size >= SPLIT_MIN_SIZE and not has_old_part:
+        ranges = split_ranges(remote_size, connections)
+        part_paths = ['%s.%s.part%d' % (tmp_file_path, parts_key, index)
+                      for index in range(connections)]
+    elif remote_size > 0 and has_validator:
+        ranges = [(0, remote_size - 1)]
+        part_paths = ['%s.%s.part' % (tmp_file_path, parts_key)]
+    elif remote_size > 0:
+        ranges = [(0, remote_size - 1)]
+        part_paths = [tmp_file_path]
+    else:
+        ranges = [(0, None)]
+        part_paths = [tmp_file_path]
+
+    # An unkeyed .stino-down is left by older versions and by
+    # installer.stream_install; carry on from it as the single part.
+    if has_old_part and part_paths[0] != tmp_file_path and \
+            not os.path.isfile(part_paths[0]):
+        os.rename(tmp_file_path, part_paths[0])
+
+    old_paths = glob.glob(tmp_file_path + '*')
+    for path in old_paths:
+        if mode != 'resume' or path not in part_paths or \
+                (len(part_paths) == 1 and not accept_ranges):
+            os.remove(path)
+    for part_path, (start, end) in zip(part_paths, ranges):
+        if end is not None and os.path.isfile(part_path) and \
+                os.path.getsize(part_path) > end - start + 1:
+            os.remove(part_path)
+
+    if not os.path.isdir(target_dir):
+        os.makedirs(target_dir)
+    done_size = sum(os.path.getsize(p) for p in part_paths
+                    if os.path.isfile(p))
+    progress = Progress(url, remote_size, done_size, message_consumer)
+
+    message_consumer('[%s] Download started.\n' % url)
+    if len(part_paths) == 1:
+        results = [fetch_part(url, part_paths[0], 0, ranges[0][1], progress)]
+    else:
+        with futures.ThreadPoolExecutor(max_workers=len(part_paths)) as ex:
+            jobs = [ex.submit(fetch_part, url, part_path, start, end,
+                              progress)
+                    for part_path, (start, end) in zip(part_paths, ranges)]
+            results = [job.result() for job in jobs]
+
+    if all(results):
+        if len(part_paths) > 1:
+            join_parts(part_paths, tmp_file_path)
+        elif part_paths[0] != tmp_file_path:
+            os.rename(part_paths[0], tmp_file_path)
+        if remote_size <= 0 or os.path.getsize(tmp_file_path) == remote_size:
+            is_done = True
+        else:
+            os.remove(tmp_file_path)
+
+    if is_done:
+        if os.path.isfile(target_file_path):
+            os.remove(target_file_path)
+        os.rename(tmp_file_path, target_file_path)
+        progress.report()
+        message_consumer('[%s] Download completed.\n' % url)
+    else:
+        message_consumer('[%s] Download failed.\n' % url)
     return is_done
 
 
@@ -185,14 +366,11 @@ class HTTPSHandlerV3(urllib.request.HTTPSHandler):
 class DownloadQueue(task_queue.TaskQueue):
     """."""
 
-    def put(self, down_info):
+    def _accept(self, down_info):
         """."""
-        if self._callable:
-            in_queue = False
-            for info in self._queue:
-                if operator.eq(info, down_info):
-                    in_queue = True
-                    break
-            if not in_queue:
-                self._queue.append(down_info)
-                self._start()
+        in_queue = False
+        for info in self._queue:
+            if operator.eq(info, down_info):
+                in_queue = True
+                break
+        return not in_queue
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Doc."""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+
+import struct
+
+ELF_MAGIC = b'\x7fELF'
+ELF_CLASS_64 = 2
+ELF_DATA_BE = 2
+
+SHT_SYMTAB = 2
+SHT_STRTAB = 3
+SHT_RELA = 4
+SHT_NOBITS = 8
+SHT_REL = 9
+SHT_SYMTAB_SHNDX = 18
+SHF_WRITE = 0x1
+SHF_ALLOC = 0x2
+STT_OBJECT = 1
+STT_FUNC = 2
+
+HEADER_FORMATS = {1: 'HHIIIIIHHHHHH', 2: 'HHIQQQIHHHHHH'}
+SECTION_FORMATS = {1: 'IIIIIIIIII', 2: 'IIQQQQIIQQ'}
+SYMBOL_FORMATS = {1: 'IIIBBH', 2: 'IBBHQQ'}
+
+# Linker bookkeeping that binutils keeps out of its section list.
+HIDDEN_TYPES = (SHT_SYMTAB, SHT_STRTAB, SHT_RELA, SHT_REL, SHT_SYMTAB_SHNDX)
+
+
+class ElfError(Exception):
+    """."""
+
+
+class ElfFile(object):
+    """Sections and symbols of an ELF file, read without any tool."""
+
+    def __init__(self, path):
+        """."""
+        with open(path, 'rb') as f:
+            self._data = f.read()
+        if self._data[:4] != ELF_MAGIC or len(self._data) < 16:
+            raise ElfError('%s is not an ELF file.' % path)
+
+        self._class = bytearray(self._data[4:5])[0]
+        if self._class not in HEADER_FORMATS:
+            raise ElfError('%s has an unknown ELF class.' % path)
+        order = '>' if bytearray(self._data[5:6])[0] == ELF_DATA_BE else '<'
+        self._header = struct.Struct(order + HEADER_FORMATS[self._class])
+        self._section = struct.Struct(order + SECTION_FORMATS[self._class])
+        self._symbol = struct.Struct(order + SYMBOL_FORMATS[self._class])
+        self._sections = self._read_sections()
+
+    def _unpack(self, fmt, offset):
+        """."""
+        try:
+            return fmt.unpack_from(self._data, offset)
+        except struct.error:
+            raise ElfError('Truncated ELF file.')
+
+    def _read_sections(self):
+        """."""
+        header = self._unpack(self._header, 16)
+        sh_offset, sh_size, sh_num, sh_strndx = \
+            header[5], header[10], header[11], header[12]
+
+        sections = []
+        for index in range(sh_num):
+            values = self._unpack(self._section, sh_offset + index * sh_size)
+            sections.append({'name_offset': values[0], 'type': values[1],
+                             'flags': values[2], 'addr': values[3],
+                             'offset': values[4], 'size': values[5],
+                             'link': values[6], 'entsize': values[9]})
+
+        if sh_strndx < len(sections):
+            str_offset = sections[sh_strndx]['offset']
+            for section in sections:
+                section['name'] = self._get_string(str_offset,
+                                                   section['name_offset'])
+        return sections
+
+    def _get_string(self, table_offset, offset):
+        """."""
+        start = table_offset + offset
+        end = self._data.find(b'\0', start)
+        if end < 0:
+            end = len(self._data)
+        return self._data[start:end].decode('utf-8', 'replace')
+
+    def get_sections(self):
+        """Return [(name, size, addr, flags)] like size -A lists them."""
+        return [(s.get('name', ''), s['size'], s['addr'], s['flags'])
+                for s in self._sections[1:]
+                if s['flags'] & SHF_ALLOC or s['type'] not in HIDDEN_TYPES]
+
+    def get_symbols(self):
+        """Return [(name, size, section name)] of functions and objects."""
+        symbols = []
+        for section in self._sections:
+            if section['type'] != SHT_SYMTAB or not section['entsize']:
+                continue
+            str_offset = self._sections[section['link']]['offset']
+            count = section['size'] // section['entsize']
+            for index in range(1, count):
+                offset = section['offset'] + index * section['entsize']
+                values = self._unpack(self._symbol, offset)
+                if self._class == ELF_CLASS_64:
+                    name_offset, info, other, shndx, value, size = values
+                else:
+                    name_offset, value, size, info, other, shndx = values
+                if info & 0xf not in (STT_OBJECT, STT_FUNC) or not size or \
+                        shndx >= len(self._sections):
+                    continue
+                target = self._sections[shndx]
+                if not target['flags'] & SHF_ALLOC:
+                    continue
+                name = self._get_string(str_offset, name_offset)
+                symbols.append((name, size, target.get('name', '')))
+        return symbols
+
+
+def format_sysv_sizes(file_path, sections):
+    """Text in the layout of size -A, for the recipe.size.regex patterns."""
+    lines = ['%s  :' % file_path, 'section size addr']
+    total = 0
+    for name, size, addr, flags in sections:
+        if name:
+            lines.append('%s %d %d' % (name, size, addr))
+            total += size
+    lines.append('Total %d' % total)
+    return '\n'.join(lines) + '\n'
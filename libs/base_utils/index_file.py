@@ -8,6 +8,8 @@ from __future__ import print_function
 from __future__ import division
 from __future__ import unicode_literals
 
+import os
+
 from . import file
 
 
@@ -24,7 +26,9 @@ def get_item_info(parent_item, items_id):
                 'platforms':
                 {
                     'names': [$names],
-                    'arches': [$arches]
+                    'arches': [$arches],
+                    'arch_names': {$arch: $name},
+                    'name_arches': {$name: $arch},
                     $name:
                     {
 
@@ -43,7 +47,9 @@ def get_item_info(parent_item, items_id):
     }
     """
     info = {'names': [],
-            'arches': []}
+            'arches': [],
+            'arch_names': {},
+            'name_arches': {}}
 
     name_items_info = {}
     items = parent_item.get(items_id, [])
@@ -56,8 +62,10 @@ def get_item_info(parent_item, items_id):
             name_items_info[name].append(item)
 
         arch = item.get('architecture', '')
-        if arch not in info['arches']:
+        if arch not in info['arch_names']:
             info['arches'].append(arch)
+            info['arch_names'][arch] = name
+        info['name_arches'].setdefault(name, arch)
 
     for name in info['names']:
         info[name] = {}
@@ -100,20 +108,32 @@ class IndexFile(file.JSONFile):
 class IndexFiles():
     """Class Docs."""
 
+    _cache = {}
+
     def __init__(self, paths):
         """Method Docs."""
         all_packages_info = {'names': []}
         for path in paths:
-            index_file = IndexFile(path)
-            index_file_info = index_file.get_info()
+            index_file_info = self.get_file_info(path)
 
             packages_info = index_file_info.get('packages')
-            names = packages_info.pop('names')
-            all_packages_info['names'] += names
-            all_packages_info.update(packages_info)
+            for name in packages_info.get('names', []):
+                all_packages_info['names'].append(name)
+                all_packages_info[name] = packages_info[name]
         all_packages_info['names'].sort(key=str.lower)
         self._info = {'packages': all_packages_info}
 
+    @classmethod
+    def get_file_info(cls, path):
+        """."""
+        mtime = os.path.getmtime(path) if os.path.isfile(path) else 0
+        cached = cls._cache.get(path)
+        if cached is None or cached[0] != mtime:
+            index_file = IndexFile(path)
+            cached = (mtime, index_file.get_info())
+            cls._cache[path] = cached
+        return cached[1]
+
     def get_info(self):
         """."""
         return self._info
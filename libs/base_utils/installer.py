@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Doc."""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import sys
+import shutil
+import socket
+import hashlib
+import http.client
+import tarfile
+import posixpath
+import zipfile
+import urllib.error
+
+from . import downloader
+
+HASH_NAMES = {'SHA-256': 'sha256', 'SHA-1': 'sha1', 'MD5': 'md5'}
+TAR_EXTS = ['.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz']
+
+
+def parse_checksum(checksum):
+    """."""
+    hash_name = 'sha256'
+    digest = ''
+    if ':' in checksum:
+        algorithm, digest = checksum.split(':', 1)
+        hash_name = HASH_NAMES.get(algorithm.upper(), '')
+    return hash_name, digest.lower()
+
+
+def is_tar_file(file_name):
+    """."""
+    return any(file_name.endswith(ext) for ext in TAR_EXTS)
+
+
+def is_safe_member(name):
+    """."""
+    name = name.replace('\\', '/')
+    return not (name.startswith('/') or '..' in name.split('/'))
+
+
+def is_under_links(name, link_names):
+    """True if name lies below a symlink extracted earlier."""
+    parts = posixpath.normpath(name.replace('\\', '/')).split('/')
+    return any('/'.join(parts[:i]) in link_names
+               for i in range(1, len(parts) + 1))
+
+
+def is_safe_tar_member(member, link_names):
+    """Check the name and, for links, the target of a tar member."""
+    name = member.name.replace('\\', '/')
+    if not is_safe_member(name) or is_under_links(name, link_names):
+        return False
+    if member.isdev():
+        return False
+    if member.issym():
+        linkname = member.linkname.replace('\\', '/')
+        target = posixpath.normpath(posixpath.join(posixpath.dirname(name),
+                                                   linkname))
+        if linkname.startswith('/') or target.split('/')[0] == '..':
+            return False
+    elif member.islnk():
+        if not is_safe_member(member.linkname) or \
+                is_under_links(member.linkname, link_names):
+            return False
+    return True
+
+
+class TeeReader(object):
+    """Read from a stream, hashing and saving every byte on the way."""
+
+    def __init__(self, fileobj, hasher, copy_f=None, progress=None):
+        """."""
+        self._f = fileobj
+        self._hasher = hasher
+        self._copy_f = copy_f
+        self._progress = progress
+        self.size = 0
+
+    def read(self, size=-1):
+        """."""
+        if size is None or size < 0:
+            data = self._f.read()
+        else:
+            data = self._f.read(size)
+        if data:
+            self.size += len(data)
+            self._hasher.update(data)
+            if self._copy_f:
+                self._copy_f.write(data)
+            if self._progress:
+                self._progress.add(len(data))
+        return data
+
+    def drain(self):
+        """."""
+        while self.read(downloader.BUFFER_SIZE):
+            pass
+
+
+def extract_tar_stream(fileobj, target_path, store=None):
+    """."""
+    link_names = set()
+    with tarfile.open(fileobj=fileobj, mode='r|*') as f:
+        for member in f:
+            if not is_safe_tar_member(member, link_names):
+                continue
+            if member.issym():
+                link_names.add(posixpath.normpath(member.name))
+            if store and member.isreg():
+                member_path = os.path.join(target_path, member.name)
+                store.add_stream(f.extractfile(member), member_path,
+                                 member.mode)
+            else:
+                f.extract(member, target_path)
+
+
+def extract_zip(file_path, target_path):
+    """."""
+    with zipfile.ZipFile(file_path, 'r') as f:
+        names = [n for n in f.namelist() if is_safe_member(n)]
+        f.extractall(target_path, names)
+
+
+def hash_file(file_path, hash_name):
+    """."""
+    hasher = hashlib.new(hash_name)
+    with open(file_path, 'rb') as f:
+        TeeReader(f, hasher).drain()
+    return hasher.hexdigest(), os.path.getsize(file_path)
+
+
+def extract(file_path, target_path, store=None):
+    """."""
+    if is_tar_file(file_path):
+        with open(file_path, 'rb') as f:
+            extract_tar_stream(f, target_path, store)
+    else:
+        extract_zip(file_path, target_path)
+        if store:
+            store.add_tree(target_path)
+
+
+def move_extracted(tmp_path, target_path):
+    """."""
+    names = os.listdir(tmp_path)
+    if len(names) == 1 and os.path.isdir(os.path.join(tmp_path, names[0])):
+        os.rename(os.path.join(tmp_path, names[0]), target_path)
+        os.rmdir(tmp_path)
+    else:
+        os.rename(tmp_path, target_path)
+
+
+def stream_install(url, archive_path, tmp_path, hasher, message_consumer,
+                   store=None):
+    """Extract while downloading; a partial copy is left for resuming."""
+    remote_f = downloader.build_opener(url).open(url,
+                                                 timeout=downloader.TIMEOUT)
+    remote_size = int(remote_f.headers.get('Content-Length', '0'))
+    progress = downloader.Progress(url, remote_size,
+                                   message_consumer=message_consumer)
+    down_path = archive_path + '.stino-down'
+    try:
+        with open(down_path, 'wb') as copy_f:
+            reader = TeeReader(remote_f, hasher, copy_f, progress)
+            extract_tar_stream(reader, tmp_path, store)
+            reader.drain()
+    finally:
+        remote_f.close()
+    progress.report()
+    if remote_size > 0 and reader.size != remote_size:
+        raise IOError('Incomplete download of %s' % url)
+    os.rename(down_path, archive_path)
+    return reader.size
+
+
+def install(url, target_path, staging_path, checksum='', size=0,
+            message_consumer=sys.stdout.write, connections=1, store=None):
+    """Download, verify and extract url into target_path."""
+    is_done = False
+    file_name = os.path.basename(url)
+    archive_path = os.path.join(staging_path, file_name)
+    down_path = archive_path + '.stino-down'
+    parent_path = os.path.dirname(target_path)
+    tmp_path = os.path.join(parent_path,
+                            '.stino-tmp-' + os.path.basename(target_path))
+
+    hash_name, digest = parse_checksum(checksum)
+    if not hash_name:
+        hash_name, digest = 'sha256', ''
+    for path in (staging_path, parent_path):
+        if not os.path.isdir(path):
+            os.makedirs(path)
+    if os.path.isdir(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+    if store and not store.supports_links(parent_path):
+        store = None
+
+    try:
+        is_streamed = False
+        if is_tar_file(file_name) and not os.path.isfile(archive_path) and \
+                not os.path.isfile(down_path) and \
+                (connections <= 1 or
+                 0 < int(size or 0) < downloader.SPLIT_MIN_SIZE):
+            hasher = hashlib.new(hash_name)
+            message_consumer('[%s] Download started.\n' % url)
+            try:
+                done_size = stream_install(url, archive_path, tmp_path,
+                                           hasher, message_consumer, store)
+            except (IOError, EOFError, socket.error, urllib.error.URLError,
+                    http.client.HTTPException, tarfile.TarError) as e:
+                message_consumer('[%s] %s\n' % (url, e))
+                shutil.rmtree(tmp_path)
+                os.makedirs(tmp_path)
+            else:
+                is_streamed = True
+                real_digest = hasher.hexdigest()
+
+        if not is_streamed:
+            if not downloader.download(url, staging_path, message_consumer,
+                                       connections=connections):
+                raise IOError('Can not download %s' % url)
+            real_digest, done_size = hash_file(archive_path, hash_name)
+
+        if digest and real_digest != digest:
+            os.remove(archive_path)
+            raise IOError('Checksum mismatch for %s' % file_name)
+        if size and int(size) != done_size:
+            raise IOError('Size mismatch for %s' % file_name)
+        if not is_streamed:
+            extract(archive_path, tmp_path, store)
+
+        if os.path.isdir(target_path):
+            shutil.rmtree(target_path)
+        move_extracted(tmp_path, target_path)
+        is_done = True
+    except (IOError, OSError, ValueError, EOFError, socket.error,
+            urllib.error.URLError, tarfile.TarError,
+            zipfile.BadZipfile) as e:
+        message_consumer('[Error] %s\n' % e)
+    finally:
+        if os.path.isdir(tmp_path):
+            shutil.rmtree(tmp_path)
+    return is_done
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Doc."""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import re
+import gzip
+import json
+import codecs
+import threading
+
+from . import downloader
+
+TABLE_VERSION = 1
+TABLE_FILE_NAME = 'library_catalog.json.gz'
+FIELDS = ['name', 'version', 'author', 'sentence', 'category',
+          'architectures', 'types', 'url', 'archiveFileName', 'size',
+          'checksum', 'providesIncludes', 'dependencies']
+COLUMNS = dict((name, index) for index, name in enumerate(FIELDS))
+
+
+def version_key(version):
+    """Sort key for versions such as 1.2.10, 1.0.0-beta."""
+    return [int(n) for n in re.findall(r'\d+', version or '')]
+
+
+def get_header_names(lib_info):
+    """Headers a library provides, guessed from its name if not listed."""
+    headers = list(lib_info.get('providesIncludes') or [])
+    if not headers:
+        name = (lib_info.get('name') or '').replace(' ', '_')
+        if name:
+            headers.append(name + '.h')
+    return headers
+
+
+def open_index_file(path):
+    """."""
+    if path.endswith('.gz'):
+        return codecs.getreader('utf-8')(gzip.open(path, 'rb'))
+    return codecs.open(path, 'r', 'utf-8')
+
+
+def build_table(index_file_path):
+    """Turn library_index.json(.gz) into rows plus lookup indexes."""
+    with open_index_file(index_file_path) as f:
+        index_info = json.load(f)
+
+    lib_infos = index_info.get('libraries', [])
+    lib_infos.sort(key=lambda i: (i.get('name', '').lower(),
+                                  version_key(i.get('version'))))
+    rows = []
+    indexes = {'name': {}, 'architecture': {}, 'category': {},
+               'header': {}}
+    for row_id, lib_info in enumerate(lib_infos):
+        row = [lib_info.get(name) for name in FIELDS]
+        row[COLUMNS['providesIncludes']] = get_header_names(lib_info)
+        rows.append(row)
+
+        name = lib_info.get('name', '')
+        indexes['name'].setdefault(name.lower(), []).append(row_id)
+
+    # Only the newest version of a library is listed by the other indexes.
+    for row_ids in indexes['name'].values():
+        row_id = row_ids[-1]
+        row = rows[row_id]
+        for arch in row[COLUMNS['architectures']] or ['*']:
+            indexes['architecture'].setdefault(arch.lower(),
+                                               []).append(row_id)
+        category = (row[COLUMNS['category']] or '').lower()
+        indexes['category'].setdefault(category, []).append(row_id)
+        for header in row[COLUMNS['providesIncludes']]:
+            indexes['header'].setdefault(header, []).append(row_id)
+    return {'version': TABLE_VERSION, 'fields': FIELDS, 'rows': rows,
+            'indexes': indexes}
+
+
+class LibraryCatalog(object):
+    """Arduino library index, kept as a compact table with indexes."""
+
+    def __init__(self, dir_path, url=''):
+        """."""
+        self._dir_path = dir_path
+        self._url = url
+        self._table_path = os.path.join(dir_path, TABLE_FILE_NAME)
+        self._table = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def get_table_path(self):
+        """."""
+        return self._table_path
+
+    def update(self, validators=None):
+        """Fetch the index if it changed; return (state, validators)."""
+        state, validators = downloader.download_if_modified(self._url,
+                                                            self._dir_path,
+                                                            validators)
+        index_file_path = os.path.join(self._dir_path,
+                                       os.path.basename(self._url))
+        if state == 'modified' or (os.path.isfile(index_file_path) and
+                                   not os.path.isfile(self._table_path)):
+            self.import_index(index_file_path)
+        return state, validators
+
+    def import_index(self, index_file_path):
+        """Rebuild the table from a local library_index.json(.gz)."""
+        table = build_table(index_file_path)
+        if not os.path.isdir(self._dir_path):
+            os.makedirs(self._dir_path)
+        tmp_path = self._table_path + '.stino-tmp'
+        with gzip.open(tmp_path, 'wb') as f:
+            text = json.dumps(table, separators=(',', ':'))
+            f.write(text.encode('utf-8'))
+        os.replace(tmp_path, self._table_path)
+        with self._lock:
+            self._table = None
+
+    def _load(self):
+        """Return the table, reading it again if the file changed."""
+        with self._lock:
+            try:
+                mtime = os.stat(self._table_path).st_mtime
+            except OSError:
+                return None
+            if self._table is None or mtime != self._mtime:
+                try:
+                    with gzip.open(self._table_path, 'rb') as f:
+                        table = json.loads(f.read().decode('utf-8'))
+                except (IOError, OSError, ValueError):
+                    return None
+                if table.get('version') != TABLE_VERSION:
+                    return None
+                self._table = table
+                self._mtime = mtime
+            return self._table
+
+    def is_ready(self):
+        """."""
+        return self._load() is not None
+
+    def _to_info(self, row):
+        """."""
+        return dict(zip(FIELDS, row))
+
+    def get_versions(self, name):
+        """All versions of a library, oldest first."""
+        table = self._load()
+        if not table:
+            return []
+        row_ids = table['indexes']['name'].get(name.lower(), [])
+        return [self._to_info(table['rows'][i]) for i in row_ids]
+
+    def get_library(self, name, version=''):
+        """The given or else the newest version of a library."""
+        infos = self.get_versions(name)
+        if version:
+            infos = [i for i in infos if i['version'] == version]
+        return infos[-1] if infos else {}
+
+    def find_header(self, header, arch=''):
+        """Newest libraries providing header, those for arch first."""
+        table = self._load()
+        if not table:
+            return []
+        header = os.path.basename(header.replace('\\', '/'))
+        row_ids = table['indexes']['header'].get(header, [])
+        infos = [self._to_info(table['rows'][i]) for i in row_ids]
+        if arch:
+            infos.sort(key=lambda i: get_arch_rank(i, arch))
+        return infos
+
+    def search(self, query, arch='', category='', limit=100):
+        """Newest libraries whose name or sentence has every query word."""
+        table = self._load()
+        if not table:
+            return []
+        indexes = table['indexes']
+        if category:
+            row_ids = indexes['category'].get(category.lower(), [])
+        else:
+            row_ids = [ids[-1] for ids in indexes['name'].values()]
+        if arch:
+            arch_ids = set(indexes['architecture'].get(arch.lower(), []))
+            arch_ids.update(indexes['architecture'].get('*', []))
+            row_ids = [i for i in row_ids if i in arch_ids]
+
+        words = query.lower().split()
+        name_col = COLUMNS['name']
+        sentence_col = COLUMNS['sentence']
+        results = []
+        for row_id in row_ids:
+            row = table['rows'][row_id]
+            name = (row[name_col] or '').lower()
+            text = name + ' ' + (row[sentence_col] or '').lower()
+            if all(w in text for w in words):
+                rank = 0 if all(w in name for w in words) else 1
+                results.append((rank, name, row_id))
+        results.sort()
+        return [self._to_info(table['rows'][r[2]]) for r in results[:limit]]
+
+
+def get_arch_rank(lib_info, arch):
+    """0 for libraries made for arch, 1 for any arch, 2 for others."""
+    arches = [a.lower() for a in lib_info.get('architectures') or ['*']]
+    if arch.lower() in arches:
+        return 0
+    if '*' in arches:
+        return 1
+    return 2
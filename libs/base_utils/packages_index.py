@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Doc."""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import threading
+
+from . import file
+from .tools_index import get_mtime, list_dir_names
+
+
+class PackagesIndex(file.JSONFile):
+    """Installed platforms under packages/<packager>/hardware/<arch>."""
+
+    def __init__(self, path, packages_path):
+        """."""
+        super(PackagesIndex, self).__init__(path)
+        self._packages_path = packages_path
+        self._lock = threading.Lock()
+        if self._data.get('packages_path') != packages_path:
+            self._data = {'packages_path': packages_path}
+        self._data.setdefault('mtime', 0)
+        self._data.setdefault('packages', {})
+
+    def refresh(self):
+        """."""
+        with self._lock:
+            is_changed = False
+            mtime = get_mtime(self._packages_path)
+            pkgs_data = self._data['packages']
+            if mtime != self._data['mtime']:
+                self._data['mtime'] = mtime
+                names = list_dir_names(self._packages_path)
+                for name in list(pkgs_data):
+                    if name not in names:
+                        pkgs_data.pop(name)
+                for name in names:
+                    pkgs_data.setdefault(name, {'mtime': 0, 'platforms': {}})
+                is_changed = True
+
+            for pkg_name in pkgs_data:
+                if self._refresh_package(pkg_name):
+                    is_changed = True
+            if is_changed:
+                self.save()
+
+    def _refresh_package(self, pkg_name):
+        """."""
+        is_changed = False
+        pkg_data = self._data['packages'][pkg_name]
+        hardware_path = os.path.join(self._packages_path, pkg_name,
+                                     'hardware')
+        mtime = get_mtime(hardware_path)
+        ptfms_data = pkg_data['platforms']
+        if mtime != pkg_data['mtime']:
+            pkg_data['mtime'] = mtime
+            arches = list_dir_names(hardware_path)
+            for arch in list(ptfms_data):
+                if arch not in arches:
+                    ptfms_data.pop(arch)
+            for arch in arches:
+                ptfms_data.setdefault(arch, {'mtime': 0, 'versions': []})
+            is_changed = True
+
+        for arch in ptfms_data:
+            ptfm_data = ptfms_data[arch]
+            mtime = get_mtime(os.path.join(hardware_path, arch))
+            if mtime != ptfm_data['mtime']:
+                ptfm_data['mtime'] = mtime
+                ptfm_data['versions'] = \
+                    list_dir_names(os.path.join(hardware_path, arch))
+                is_changed = True
+        return is_changed
+
+    def add_version(self, package, arch, version):
+        """Record a platform version the installer has just put in place."""
+        with self._lock:
+            pkg_path = os.path.join(self._packages_path, package)
+            hardware_path = os.path.join(pkg_path, 'hardware')
+            arch_path = os.path.join(hardware_path, arch)
+
+            pkgs_data = self._data['packages']
+            pkg_data = pkgs_data.setdefault(package,
+                                            {'mtime': 0, 'platforms': {}})
+            ptfms_data = pkg_data['platforms']
+            ptfm_data = ptfms_data.setdefault(arch,
+                                              {'mtime': 0, 'versions': []})
+            if version not in ptfm_data['versions']:
+                ptfm_data['versions'].append(version)
+                ptfm_data['versions'].sort()
+
+            self._data['mtime'] = get_mtime(self._packages_path)
+            pkg_data['mtime'] = get_mtime(hardware_path)
+            ptfm_data['mtime'] = get_mtime(arch_path)
+            self.save()
+
+    def get_packages(self):
+        """Return {package: {arch: [versions]}}."""
+        with self._lock:
+            pkgs = {}
+            for pkg_name, pkg_data in self._data['packages'].items():
+                pkgs[pkg_name] = {}
+                for arch, ptfm_data in pkg_data['platforms'].items():
+                    pkgs[pkg_name][arch] = list(ptfm_data['versions'])
+            return pkgs
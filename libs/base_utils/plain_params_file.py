@@ -219,6 +219,26 @@ class BoardsFile(PlainParamsFile):
         menu_info['sub_menus']['names'].sort(key=str.lower)
         return menu_info
 
+    def get_board_summaries(self):
+        """Return [(board_id, name, build_info)] without parsing menus."""
+        ids = []
+        summaries = {}
+        for line in self._lines:
+            key, value = get_key_value(line)
+            parts = key.split('.')
+            if parts[0] == 'menu' or len(parts) < 2:
+                continue
+            board_id = parts[0]
+            if board_id not in summaries:
+                ids.append(board_id)
+                summaries[board_id] = {'name': '', 'build': {}}
+            if len(parts) == 2 and parts[1] == 'name':
+                summaries[board_id]['name'] = value
+            elif len(parts) == 3 and parts[1] == 'build':
+                summaries[board_id]['build'][parts[2]] = value
+        return [(i, summaries[i]['name'], summaries[i]['build'])
+                for i in ids if summaries[i]['name']]
+
     def get_boards_info(self):
         """."""
         boards_info = {'boards': {}}
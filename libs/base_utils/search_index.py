@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Doc."""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+
+import re
+import threading
+
+WORD_PATTERN = re.compile(r'[^\W_]+', re.UNICODE)
+PREFIX_LENGTH = 2
+
+
+def normalize(text):
+    """."""
+    return ' '.join(WORD_PATTERN.findall(text.lower()))
+
+
+def get_trigrams(text):
+    """."""
+    return set(text[i:i + 3] for i in range(len(text) - 2))
+
+
+class SearchIndex(object):
+    """Entries searchable by words, with trigram and prefix postings.
+
+    Entries are added in groups (one per platform, one per package index
+    entry...); update_group replaces a group only when its signature
+    changes, so the index is maintained incrementally.
+    """
+
+    def __init__(self):
+        """."""
+        self._entries = {}
+        self._groups = {}
+        self._trigrams = {}
+        self._prefixes = {}
+        self._lock = threading.Lock()
+
+    def _add(self, key, title, fields, payload):
+        """."""
+        text = normalize(' '.join([title] + list(fields)))
+        self._entries[key] = (normalize(title), text, title, payload)
+        for trigram in get_trigrams(text):
+            self._trigrams.setdefault(trigram, set()).add(key)
+        for word in text.split():
+            prefix = word[:PREFIX_LENGTH]
+            self._prefixes.setdefault(prefix, set()).add(key)
+
+    def _remove(self, key):
+        """."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        text = entry[1]
+        for trigram in get_trigrams(text):
+            keys = self._trigrams.get(trigram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._trigrams[trigram]
+        for word in text.split():
+            prefix = word[:PREFIX_LENGTH]
+            keys = self._prefixes.get(prefix)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._prefixes[prefix]
+
+    def get_signature(self, group):
+        """."""
+        with self._lock:
+            return self._groups.get(group, (None, []))[0]
+
+    def update_group(self, group, signature, entries):
+        """Replace group with entries [(key, title, fields, payload)]."""
+        with self._lock:
+            old_signature, old_keys = self._groups.get(group, (None, []))
+            if group in self._groups and old_signature == signature:
+                return False
+            for key in old_keys:
+                self._remove(key)
+            keys = []
+            for key, title, fields, payload in entries:
+                self._add(key, title, fields, payload)
+                keys.append(key)
+            self._groups[group] = (signature, keys)
+            return True
+
+    def remove_groups(self, keep_groups):
+        """Drop every group not in keep_groups."""
+        with self._lock:
+            for group in list(self._groups):
+                if group not in keep_groups:
+                    for key in self._groups.pop(group)[1]:
+                        self._remove(key)
+
+    def _get_candidates(self, word):
+        """."""
+        if len(word) < PREFIX_LENGTH:
+            return None
+        if len(word) < 3:
+            return self._prefixes.get(word, set())
+        keys = None
+        for trigram in get_trigrams(word):
+            postings = self._trigrams.get(trigram, set())
+            keys = set(postings) if keys is None else keys & postings
+            if not keys:
+                break
+        return keys
+
+    def search(self, query, limit=100):
+        """Return [(title, payload)] of entries containing all words."""
+        words = normalize(query).split()
+        with self._lock:
+            keys = None
+            for word in sorted(words, key=len, reverse=True):
+                candidates = self._get_candidates(word)
+                if candidates is None:
+                    continue
+                keys = set(candidates) if keys is None else keys & candidates
+            if keys is None:
+                keys = self._entries.keys()
+
+            results = []
+            for key in keys:
+                name, text, title, payload = self._entries[key]
+                padded = ' ' + text
+                if not all(word in text for word in words):
+                    continue
+                if name == ' '.join(words):
+                    rank = 0
+                elif name.startswith(words[0] if words else ''):
+                    rank = 1
+                elif all(' ' + word in padded for word in words):
+                    rank = 2
+                else:
+                    rank = 3
+                results.append((rank, len(name), name, title, payload))
+        results.sort(key=lambda r: r[:3])
+        return [(r[3], r[4]) for r in results[:limit]]
@@ -8,12 +8,33 @@ from __future__ import print_function
 from __future__ import division
 from __future__ import unicode_literals
 
-import time
-import threading
-import platform
+import os
 import glob
+import struct
+import ctypes
+import ctypes.util
+import select
+import platform
+import threading
 import serial
 from . import decos
+from . import task_listener
+
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct('iIII')
+
+PORT_PREFIXES = ('ttyS', 'ttyUSB', 'ttyACM', 'ttyAMA', 'rfcomm',
+                 'tty.', 'cu.')
+SETTLE_DELAY = 0.2
+POLL_INTERVAL = 1.0
+MAX_POLL_INTERVAL = 8.0
+RESCAN_INTERVAL = 60.0
 
 
 def list_serial_ports():
@@ -30,33 +51,183 @@ def list_serial_ports():
     return serial_ports
 
 
-@decos.singleton
-class SerialListener(object):
+def is_port_name(name):
     """."""
+    return name.startswith(PORT_PREFIXES)
 
-    def __init__(self, call_back=None):
+
+class DevWatcher(object):
+    """Report device nodes created or removed in a directory (inotify)."""
+
+    def __init__(self, dev_path='/dev'):
+        """."""
+        self._fd = -1
+        lib_path = ctypes.util.find_library('c') or 'libc.so.6'
+        libc = ctypes.CDLL(lib_path, use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        mask = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+        path = os.fsencode(dev_path)
+        if libc.inotify_add_watch(fd, path, mask) < 0:
+            os.close(fd)
+            raise OSError(ctypes.get_errno(), 'inotify_add_watch failed')
+        self._fd = fd
+
+    @classmethod
+    def create(cls, dev_path='/dev'):
+        """Return a watcher, or None where inotify is not available."""
+        watcher = None
+        if platform.system() == 'Linux':
+            try:
+                watcher = cls(dev_path)
+            except (OSError, AttributeError):
+                pass
+        return watcher
+
+    def read_names(self):
+        """Return the port names touched by pending events."""
+        names = set()
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except (OSError, IOError):
+                break
+            if not data:
+                break
+            offset = 0
+            while offset + EVENT_HEADER.size <= len(data):
+                wd, mask, cookie, length = \
+                    EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    names.add('')
+                name = os.fsdecode(name)
+                if is_port_name(name):
+                    names.add(name)
+        return names
+
+    def fileno(self):
+        """."""
+        return self._fd
+
+    def close(self):
+        """."""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PortMonitor(object):
+    """Call call_back with the port list whenever it changes.
+
+    With inotify, a thread blocks in select on the watch and schedules
+    one rescan after each burst of hot-plug events; otherwise the port
+    list is polled from the shared scheduler.
+    """
+
+    def __init__(self, call_back=None, dev_path='/dev',
+                 list_ports=list_serial_ports):
         """."""
         self.is_alive = False
         self.call_back = call_back
+        self.dev_path = dev_path
+        self.list_ports = list_ports
+        self._serial_ports = []
+        self._lock = threading.Lock()
+        self._job = None
+        self._check_job = None
+        self._wake_fds = None
 
     def start(self):
         """."""
-        if not self.is_alive:
-            self.is_alive = True
-            listener_thread = threading.Thread(target=self.update)
-            listener_thread.start()
+        if self.is_alive:
+            return
+        self.is_alive = True
+        self._serial_ports = []
+        watcher = DevWatcher.create(self.dev_path)
+        if watcher:
+            self._wake_fds = os.pipe()
+            self.schedule_check(0)
+            thread = threading.Thread(target=self.watch,
+                                      args=(watcher, self._wake_fds))
+            thread.daemon = True
+            thread.start()
+        else:
+            self._job = task_listener.scheduler.schedule(
+                self.poll, period=POLL_INTERVAL)
 
-    def update(self):
+    def check_ports(self):
         """."""
-        pre_serial_ports = []
-        while self.is_alive:
-            serial_ports = list_serial_ports()
-            if serial_ports != pre_serial_ports:
-                pre_serial_ports = serial_ports
-                if callable(self.call_back):
-                    self.call_back(serial_ports)
-            time.sleep(1)
+        serial_ports = self.list_ports()
+        is_changed = serial_ports != self._serial_ports
+        if is_changed:
+            self._serial_ports = serial_ports
+            if callable(self.call_back):
+                self.call_back(serial_ports)
+        return is_changed
+
+    def schedule_check(self, delay):
+        """Rescan after delay, replacing a rescan not run yet."""
+        with self._lock:
+            if not self.is_alive:
+                return
+            if self._check_job:
+                self._check_job.cancel()
+            self._check_job = task_listener.scheduler.schedule(
+                self.check_ports, delay=delay)
+
+    def watch(self, watcher, wake_fds):
+        """Rescan on hot-plug events, and now and then to be safe."""
+        read_fd, write_fd = wake_fds
+        try:
+            while self.is_alive:
+                try:
+                    readable = select.select([watcher.fileno(), read_fd],
+                                             [], [], RESCAN_INTERVAL)[0]
+                except (OSError, ValueError, select.error):
+                    break
+                if read_fd in readable:
+                    break
+                if not readable:
+                    self.schedule_check(0)
+                elif watcher.read_names():
+                    # Give udev time to finish creating the node.
+                    self.schedule_check(SETTLE_DELAY)
+        finally:
+            watcher.close()
+            with self._lock:
+                if self._wake_fds is wake_fds:
+                    self._wake_fds = None
+                os.close(read_fd)
+                os.close(write_fd)
+
+    def poll(self):
+        """Poll, backing off while the port list stays the same."""
+        job = self._job
+        if job is None:
+            return
+        if self.check_ports():
+            job.period = POLL_INTERVAL
+        else:
+            job.period = min(job.period * 2, MAX_POLL_INTERVAL)
 
     def stop(self):
         """."""
-        self.is_alive = False
+        with self._lock:
+            self.is_alive = False
+            if self._job:
+                self._job.cancel()
+                self._job = None
+            if self._check_job:
+                self._check_job.cancel()
+                self._check_job = None
+            if self._wake_fds:
+                os.write(self._wake_fds[1], b'x')
+
+
+@decos.singleton
+class SerialListener(PortMonitor):
+    """The port monitor shared by the plugin."""
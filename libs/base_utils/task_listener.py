@@ -9,31 +9,129 @@ from __future__ import division
 from __future__ import unicode_literals
 
 import time
+import heapq
+import random
+import itertools
 import threading
+import traceback
 
+IDLE_TIMEOUT = 5.0
+clock = getattr(time, 'monotonic', time.time)
 
-class TaskListener(object):
-    """."""
 
-    def __init__(self, task, response=None, delay=0.01):
+class Job(object):
+    """A task due at some time, run again every period seconds if set."""
+
+    def __init__(self, task, period=None, jitter=0, background=False):
+        """."""
+        self.task = task
+        self.period = period
+        self.jitter = jitter
+        self.background = background
+        self.is_cancelled = False
+
+    def cancel(self):
+        """."""
+        self.is_cancelled = True
+
+
+class Scheduler(object):
+    """Run jobs from a timer heap in one thread, no polling.
+
+    Jobs run on the scheduler thread and should be short; jobs marked
+    background get a thread of their own for each run.
+    """
+
+    def __init__(self):
         """."""
+        self._heap = []
+        self._cond = threading.Condition()
+        self._counter = itertools.count()
         self._is_alive = False
-        self._task = task
-        self._response = response
-        self._delay = delay
 
-    def start(self):
+    def schedule(self, task, delay=0, period=None, jitter=0,
+                 background=False):
+        """Run task after delay seconds; return the Job."""
+        job = Job(task, period, jitter, background)
+        self._push(job, delay)
+        return job
+
+    def _push(self, job, delay):
         """."""
-        if not self._is_alive:
-            self._is_alive = True
-            thread = threading.Thread(target=self._loop)
-            thread.start()
+        with self._cond:
+            heapq.heappush(self._heap,
+                           (clock() + delay, next(self._counter), job))
+            if not self._is_alive:
+                self._is_alive = True
+                thread = threading.Thread(target=self._loop)
+                thread.daemon = True
+                thread.start()
+            self._cond.notify()
+
+    def _next_job(self):
+        """Wait for the next due job, return None once idle for too long."""
+        with self._cond:
+            while True:
+                while self._heap and self._heap[0][2].is_cancelled:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._cond.wait(IDLE_TIMEOUT)
+                    if not self._heap:
+                        self._is_alive = False
+                        return None
+                    continue
+                due_time = self._heap[0][0]
+                now = clock()
+                if due_time > now:
+                    self._cond.wait(due_time - now)
+                    continue
+                return heapq.heappop(self._heap)[2]
 
     def _loop(self):
         """."""
         while True:
-            self._run()
-            time.sleep(self._delay)
+            job = self._next_job()
+            if job is None:
+                break
+            if job.background:
+                thread = threading.Thread(target=self._run, args=(job,))
+                thread.daemon = True
+                thread.start()
+            else:
+                self._run(job)
+
+    def _run(self, job):
+        """."""
+        try:
+            job.task()
+        except Exception:
+            traceback.print_exc()
+        if job.period is not None and not job.is_cancelled:
+            self._push(job, job.period + random.uniform(0, job.jitter))
+
+
+scheduler = Scheduler()
+
+
+class TaskListener(object):
+    """Run task every delay seconds on the shared scheduler."""
+
+    def __init__(self, task, response=None, delay=0.01, jitter=0,
+                 background=False):
+        """."""
+        self._task = task
+        self._response = response
+        self._delay = delay
+        self._jitter = jitter
+        self._background = background
+        self._job = None
+
+    def start(self):
+        """."""
+        if self._job is None:
+            self._job = scheduler.schedule(self._run, period=self._delay,
+                                           jitter=self._jitter,
+                                           background=self._background)
 
     def _run(self):
         """."""
@@ -44,4 +142,6 @@ class TaskListener(object):
 
     def stop(self):
         """."""
-        self._is_alive = False
+        if self._job is not None:
+            self._job.cancel()
+            self._job = None
@@ -8,42 +8,86 @@ from __future__ import print_function
 from __future__ import division
 from __future__ import unicode_literals
 
-import time
 import sys
 import threading
+import traceback
+import collections
+
+IDLE_TIMEOUT = 5.0
+
+
+def join_lines(texts):
+    """Merge queued messages into one text, one message per line."""
+    lines = []
+    for text in texts:
+        if not isinstance(text, str):
+            text = str(text)
+        lines.append(text if text.endswith('\n') else text + '\n')
+    return ''.join(lines)
 
 
 class TaskQueue(object):
-    """."""
+    """Run consumer on queued objects, in order, in one worker thread.
+
+    With combine, all objects waiting in the queue are merged by
+    combine(list) and handed to the consumer at once.
+    """
 
-    def __init__(self, consumer=sys.stdout.write, delay=0.1):
+    def __init__(self, consumer=sys.stdout.write, combine=None):
         """."""
-        self._queue = []
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
         self._is_alive = False
         self._consumer = consumer
-        self._delay = delay
+        self._combine = combine
         self._callable = callable(self._consumer)
 
     def put(self, obj):
         """."""
         if self._callable:
-            self._queue.append(obj)
-            self._start()
+            with self._cond:
+                if self._accept(obj):
+                    self._queue.append(obj)
+                    self._start()
+                    self._cond.notify()
+
+    def _accept(self, obj):
+        """Called with the lock held; return False to drop obj."""
+        return True
 
     def _start(self):
-        """."""
+        """Called with the lock held."""
         if not self._is_alive:
             self._is_alive = True
             thread = threading.Thread(target=self._run)
+            thread.daemon = True
             thread.start()
 
+    def _get(self):
+        """Wait for the next job, return None once idle for too long."""
+        with self._cond:
+            if not self._queue:
+                self._cond.wait(IDLE_TIMEOUT)
+            if not self._queue:
+                self._is_alive = False
+                return None
+            if self._combine:
+                objs = list(self._queue)
+                self._queue.clear()
+                return (self._combine(objs),)
+            return (self._queue.popleft(),)
+
     def _run(self):
         """."""
-        while self._queue:
-            obj = self._queue.pop(0)
-            self._task(obj)
-            time.sleep(self._delay)
-        self._is_alive = False
+        while True:
+            job = self._get()
+            if job is None:
+                break
+            try:
+                self._task(job[0])
+            except Exception:
+                # Keep the worker alive, the next job may well succeed.
+                traceback.print_exc()
 
     def _task(self, obj):
         """."""
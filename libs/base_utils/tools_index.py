@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Doc."""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import threading
+
+from . import file
+
+
+def get_mtime(path):
+    """."""
+    mtime = 0
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        pass
+    return mtime
+
+
+def list_dir_names(path):
+    """."""
+    names = []
+    try:
+        names = os.listdir(path)
+    except OSError:
+        pass
+    names = [n for n in names if not n.startswith('.')]
+    names = [n for n in names if os.path.isdir(os.path.join(path, n))]
+    names.sort()
+    return names
+
+
+def find_include_dirs(path):
+    """."""
+    include_dirs = []
+    for dir_path, dir_names, file_names in os.walk(path):
+        dir_names[:] = sorted(n for n in dir_names if not n.startswith('.'))
+        if os.path.basename(dir_path) == 'include':
+            include_dirs.append(dir_path)
+            dir_names[:] = []
+    return include_dirs
+
+
+class ToolsIndex(file.JSONFile):
+    """Installed tools under packages/<packager>/tools/<name>/<version>."""
+
+    def __init__(self, path, packages_path):
+        """."""
+        super(ToolsIndex, self).__init__(path)
+        self._packages_path = packages_path
+        self._lock = threading.Lock()
+        if self._data.get('packages_path') != packages_path:
+            self._data = {'packages_path': packages_path}
+        self._data.setdefault('mtime', 0)
+        self._data.setdefault('packages', {})
+
+    def refresh(self):
+        """."""
+        with self._lock:
+            is_changed = False
+            mtime = get_mtime(self._packages_path)
+            pkgs_data = self._data['packages']
+            if mtime != self._data['mtime']:
+                self._data['mtime'] = mtime
+                names = list_dir_names(self._packages_path)
+                for name in list(pkgs_data):
+                    if name not in names:
+                        pkgs_data.pop(name)
+                for name in names:
+                    pkgs_data.setdefault(name, {'mtime': 0, 'tools': {}})
+                is_changed = True
+
+            for pkg_name in pkgs_data:
+                if self._refresh_package(pkg_name):
+                    is_changed = True
+            if is_changed:
+                self.save()
+
+    def _refresh_package(self, pkg_name):
+        """."""
+        is_changed = False
+        pkg_data = self._data['packages'][pkg_name]
+        tools_path = os.path.join(self._packages_path, pkg_name, 'tools')
+        mtime = get_mtime(tools_path)
+        tools_data = pkg_data['tools']
+        if mtime != pkg_data['mtime']:
+            pkg_data['mtime'] = mtime
+            names = list_dir_names(tools_path)
+            for name in list(tools_data):
+                if name not in names:
+                    tools_data.pop(name)
+            for name in names:
+                tools_data.setdefault(name, {'mtime': 0, 'versions': {}})
+            is_changed = True
+
+        for name in tools_data:
+            tool_data = tools_data[name]
+            tool_path = os.path.join(tools_path, name)
+            mtime = get_mtime(tool_path)
+            if mtime != tool_data['mtime']:
+                tool_data['mtime'] = mtime
+                vers_data = tool_data['versions']
+                versions = list_dir_names(tool_path)
+                for version in list(vers_data):
+                    if version not in versions:
+                        vers_data.pop(version)
+                for version in versions:
+                    if version not in vers_data:
+                        path = os.path.join(tool_path, version)
+                        vers_data[version] = \
+                            {'path': path,
+                             'include_dirs': find_include_dirs(path)}
+                is_changed = True
+        return is_changed
+
+    def get_version_info(self, package, name, version):
+        """."""
+        pkg_data = self._data['packages'].get(package, {})
+        tool_data = pkg_data.get('tools', {}).get(name, {})
+        return tool_data.get('versions', {}).get(version, {})
+
+    def get_tool_path(self, package, name, version):
+        """."""
+        version_info = self.get_version_info(package, name, version)
+        return version_info.get('path', '')
+
+    def get_include_dirs(self, package, name, version):
+        """."""
+        version_info = self.get_version_info(package, name, version)
+        return list(version_info.get('include_dirs', []))
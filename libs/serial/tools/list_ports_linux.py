@@ -8,10 +8,23 @@
 #
 # SPDX-License-Identifier:    BSD-3-Clause
 
-import glob
 import os
+import threading
 from serial.tools import list_ports_common
 
+# device name prefixes, see comports()
+DEVICE_PREFIXES = (
+    'ttyS',     # built-in serial ports
+    'ttyUSB',   # usb-serial with own driver
+    'ttyACM',   # usb-serial with CDC-ACM profile
+    'ttyAMA',   # ARM internal port (raspi)
+    'rfcomm',   # BT serial devices
+)
+
+# device path -> (stat key, SysFS), reused while the node is unchanged
+_cache = {}
+_cache_lock = threading.Lock()
+
 
 class SysFS(list_ports_common.ListPortInfo):
     """Wrapper for easy sysfs access and device info"""
@@ -35,12 +48,14 @@ class SysFS(list_ports_common.ListPortInfo):
             self.usb_device_path = None
         # fill-in info for USB devices
         if self.usb_device_path is not None:
-            self.vid = int(self.read_line(self.usb_device_path, 'idVendor'), 16)
-            self.pid = int(self.read_line(self.usb_device_path, 'idProduct'), 16)
-            self.serial_number = self.read_line(self.usb_device_path, 'serial')
+            usb_info = self.read_lines(self.usb_device_path, (
+                'idVendor', 'idProduct', 'serial', 'manufacturer', 'product'))
+            self.vid = int(usb_info['idVendor'], 16)
+            self.pid = int(usb_info['idProduct'], 16)
+            self.serial_number = usb_info['serial']
             self.location = os.path.basename(self.usb_device_path)
-            self.manufacturer = self.read_line(self.usb_device_path, 'manufacturer')
-            self.product = self.read_line(self.usb_device_path, 'product')
+            self.manufacturer = usb_info['manufacturer']
+            self.product = usb_info['product']
             self.interface = self.read_line(self.device_path, 'interface')
 
         if self.subsystem in ('usb', 'usb-serial'):
@@ -66,15 +81,70 @@ class SysFS(list_ports_common.ListPortInfo):
         except IOError:
             return None
 
+    def read_lines(self, path, names):
+        """\
+        Read several attribute files of one sysfs directory.
+        Returns a dict of name -> line, None for unreadable files.
+        """
+        return dict((name, self.read_line(path, name)) for name in names)
+
+
+def cache_key(device):
+    """\
+    Identify a device node and its sysfs entry. The key changes when the
+    node is recreated (unplug/replug) or its sysfs directory is replaced.
+    Returns None if the node is gone.
+    """
+    try:
+        node = os.stat(device)
+    except OSError:
+        return None
+    try:
+        sysfs = os.stat('/sys/class/tty/{}'.format(os.path.basename(device)))
+        sysfs_key = (sysfs.st_ino, sysfs.st_ctime)
+    except OSError:
+        sysfs_key = None
+    return (node.st_ino, node.st_ctime, node.st_rdev, sysfs_key)
+
+
+def device_order(name):
+    """Group by DEVICE_PREFIXES order, natural order within a group"""
+    index = 0
+    for index, prefix in enumerate(DEVICE_PREFIXES):
+        if name.startswith(prefix):
+            name = name[len(prefix):]
+            break
+    # tag each part so numbers and texts never get compared directly
+    return (index, [(isinstance(part, str), part)
+                    for part in list_ports_common.numsplit(name)])
+
+
+def list_devices(dev_path='/dev'):
+    try:
+        names = os.listdir(dev_path)
+    except OSError:
+        return []
+    names = sorted((name for name in names
+                    if name.startswith(DEVICE_PREFIXES)), key=device_order)
+    return [os.path.join(dev_path, name) for name in names]
+
 
-def comports():
-    devices = glob.glob('/dev/ttyS*')           # built-in serial ports
-    devices.extend(glob.glob('/dev/ttyUSB*'))   # usb-serial with own driver
-    devices.extend(glob.glob('/dev/ttyACM*'))   # usb-serial with CDC-ACM profile
-    devices.extend(glob.glob('/dev/ttyAMA*'))   # ARM internal port (raspi)
-    devices.extend(glob.glob('/dev/rfcomm*'))   # BT serial devices
+def comports(dev_path='/dev'):
+    devices = list_devices(dev_path)
+    infos = []
+    with _cache_lock:
+        for device in devices:
+            key = cache_key(device)
+            cached = _cache.get(device)
+            if key is None or cached is None or cached[0] != key:
+                cached = (key, SysFS(device))
+                _cache[device] = cached
+            infos.append(cached[1])
+        for device in list(_cache):
+            if device not in devices:
+                del _cache[device]
     return [info
-            for info in [SysFS(d) for d in devices]
+            for info in infos
             if info.subsystem != "platform"]    # hide non-present internal serial ports
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
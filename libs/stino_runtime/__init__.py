@@ -11,17 +11,19 @@ from __future__ import unicode_literals
 import os
 import re
 import glob
-import zipfile
-import tarfile
+import time
+import hashlib
 import platform
-import shutil
 import sublime
 import subprocess
+from concurrent import futures
 
 from base_utils import file
 from base_utils import c_file
 from base_utils import c_project
 from base_utils import index_file
+from base_utils import tools_index
+from base_utils import packages_index
 from base_utils import plain_params_file
 from base_utils import default_st_dirs
 from base_utils import default_arduino_dirs
@@ -29,6 +31,12 @@ from base_utils import serial_port
 from base_utils import task_queue
 from base_utils import task_listener
 from base_utils import downloader
+from base_utils import installer
+from base_utils import blob_store
+from base_utils import fast_copy
+from base_utils import search_index
+from base_utils import library_catalog
+from base_utils import elf_file
 from base_utils import sys_info
 from . import const
 from . import st_menu
@@ -118,28 +126,21 @@ def get_index_files_info(arduino_dir_path):
 def get_installed_packages_info(arduino_info):
     """."""
     installed_packages_info = {'installed_packages': {}}
-    arduino_dir_path = arduino_info['arduino_app_path']
-    packages_path = os.path.join(arduino_dir_path, 'packages')
-    package_paths = glob.glob(packages_path + '/*')
-    package_names = [os.path.basename(p) for p in package_paths]
+    pkgs_index = arduino_info['packages_index']
+    pkgs_index.refresh()
+    installed_pkgs = pkgs_index.get_packages()
+    package_names = sorted(installed_pkgs)
     installed_packages_info['installed_packages']['names'] = package_names
 
-    for package_path in package_paths:
-        pkg_name = os.path.basename(package_path)
+    for pkg_name in package_names:
         pkg_info = {'platforms': {}}
-        hardware_path = os.path.join(package_path, 'hardware')
-        platform_paths = glob.glob(hardware_path + '/*')
-
         pkg_info['platforms']['names'] = []
-        for platform_path in platform_paths:
-            ptfm_arch = os.path.basename(platform_path)
+        for ptfm_arch in sorted(installed_pkgs[pkg_name]):
             ptfm_name = selected.get_platform_name_by_arch(arduino_info,
                                                            pkg_name,
                                                            ptfm_arch)
             pkg_info['platforms']['names'].append(ptfm_name)
-
-            version_paths = glob.glob(platform_path + '/*')
-            versions = [os.path.basename(p) for p in version_paths]
+            versions = installed_pkgs[pkg_name][ptfm_arch]
             ptfm_info = {'versions': versions}
             pkg_info['platforms'][ptfm_name] = ptfm_info
         installed_packages_info['installed_packages'][pkg_name] = pkg_info
@@ -172,7 +173,7 @@ def update_serial_info(serial_ports):
     """."""
     global arduino_info
     arduino_info['serial_ports'] = {'names': serial_ports}
-    st_menu.update_serial_menu(arduino_info)
+    menu_refresher.mark('serial')
     check_selected(arduino_info, 'serial_port')
 
 
@@ -250,16 +251,18 @@ def on_platform_select(package_name, platform_name):
     global arduino_info
     arduino_info['selected'].set('package', package_name)
     arduino_info['selected'].set('platform', platform_name)
+    selected.invalidate_selection()
     check_platform_selected(arduino_info)
     sel_version = arduino_info['selected'].get('version')
     on_version_select(sel_version)
-    st_menu.update_version_menu(arduino_info)
+    menu_refresher.mark('version')
 
 
 def on_version_select(version):
     """."""
     global arduino_info
     arduino_info['selected'].set('version', version)
+    selected.invalidate_selection()
     boards_info = get_boards_info(arduino_info)
     arduino_info.update(boards_info)
     check_selected(arduino_info, 'board')
@@ -268,19 +271,18 @@ def on_version_select(version):
     check_selected(arduino_info, 'programmer')
     sel_board = arduino_info['selected'].get('board')
     on_board_select(sel_board)
-    st_menu.update_platform_example_menu(arduino_info)
-    st_menu.update_platform_library_menu(arduino_info)
-    st_menu.update_board_menu(arduino_info)
-    st_menu.update_programmer_menu(arduino_info)
+    menu_refresher.mark('platform_examples', 'platform_libraries', 'board',
+                        'programmer')
 
 
 def on_board_select(board_name):
     """."""
     global arduino_info
     arduino_info['selected'].set('board', board_name)
+    selected.invalidate_selection()
     check_board_options_selected(arduino_info)
-    st_menu.update_board_options_menu(arduino_info)
-    platform_info = selected.get_sel_platform_info(arduino_info)
+    menu_refresher.mark('board_options')
+    platform_info = selected.get_selection(arduino_info).platform_info
     check_tools_deps(platform_info)
 
 
@@ -288,12 +290,14 @@ def on_board_option_select(option, value):
     """."""
     global arduino_info
     arduino_info['selected'].set('option_%s' % option, value)
+    selected.invalidate_selection()
 
 
 def on_programmer_select(programmer_name):
     """."""
     global arduino_info
     arduino_info['selected'].set('programmer', programmer_name)
+    selected.invalidate_selection()
 
 
 def on_serial_select(serial_port):
@@ -308,9 +312,10 @@ def on_language_select(language_name):
     arduino_info['selected'].set('language', language)
 
 
-def download_platform_tool(down_info):
+def install_package_item(down_info):
     """."""
     global arduino_info
+    is_done = False
     down_type = down_info.get('type', '')
     url = down_info.get('url', '')
     package = down_info.get('package', '')
@@ -326,130 +331,165 @@ def download_platform_tool(down_info):
         package_path = os.path.join(packages_path, package)
         if down_type == 'platform':
             sub_path = os.path.join(package_path, 'hardware')
-            packages_info = arduino_info.get('packages', {})
-            package_info = packages_info.get(package, {})
-            platforms_info = package_info.get('platforms', {})
-            platform_info = platforms_info.get(name, {})
-            version_info = platform_info.get(version, {})
-            name = version_info.get('architecture', name)
-        elif down_type == 'tool':
+            name = down_info.get('arch', name)
+        else:
             sub_path = os.path.join(package_path, 'tools')
         name_path = os.path.join(sub_path, name)
         version_path = os.path.join(name_path, version)
 
-        if not os.path.isdir(version_path):
-            msg = '[%s] Waiting for download...' % url
+        if os.path.isdir(version_path):
+            is_done = True
+        else:
+            msg = '[%s] %s %s: ' % (package, name, version)
+            msg += 'Installation started.'
             message_queue.put(msg)
-            is_done = downloader.download(url, down_path, message_queue.put)
 
-            if is_done:
-                msg = '[%s] %s %s: ' % (package, name, version)
-                msg += 'Installation started.'
-                message_queue.put(msg)
-                if not os.path.isdir(name_path):
-                    os.makedirs(name_path)
-
-                zip_name = os.path.basename(url)
-                zip_path = os.path.join(down_path, zip_name)
-                if zip_name.endswith('.zip'):
-                    with zipfile.ZipFile(zip_path, 'r') as f:
-                        names = f.namelist()
-                        try:
-                            f.extractall(name_path)
-                        except (IOError, FileNotFoundError) as e:
-                            message_queue.put('%s' % e)
-                elif zip_name.endswith('.gz') or zip_name.endswith('.bz2'):
-                    with tarfile.open(zip_path, 'r') as f:
-                        names = f.getnames()
-                        try:
-                            f.extractall(name_path)
-                        except (IOError, FileNotFoundError) as e:
-                            message_queue.put('%s' % e)
-
-                if names:
-                    dir_name = names[0]
-                    new_path = os.path.join(name_path, dir_name)
-                    os.rename(new_path, version_path)
+            checksum = down_info.get('checksum', '')
+            size = down_info.get('size', 0)
+            connections = const.DOWNLOAD_CONNECTIONS
+            store = None
+            if down_type == 'tool':
+                store = arduino_info.get('blob_store')
+            is_done = installer.install(url, version_path, down_path,
+                                        checksum, size, message_queue.put,
+                                        connections=connections, store=store)
 
+            if is_done:
                 msg = '[%s] %s %s: ' % (package, name, version)
                 msg += 'Installation completed.'
                 message_queue.put(msg)
-
-                if down_type == 'platform':
-                    installed_packages_info = \
-                        get_installed_packages_info(arduino_info)
-                    arduino_info.update(installed_packages_info)
-                    st_menu.update_platform_menu(arduino_info)
-                    st_menu.update_version_menu(arduino_info)
-                    check_tools_deps(version_info)
+    return is_done
 
 
-def check_tools_deps(platform_info):
+def download_platform_tool(down_info):
+    """."""
+    global arduino_info
+    packages_info = arduino_info.get('packages', {})
+    package_info = packages_info.get(down_info.get('package', ''), {})
+    platforms_info = package_info.get('platforms', {})
+    platform_info = platforms_info.get(down_info.get('name', ''), {})
+    version_info = platform_info.get(down_info.get('version', ''), {})
+    down_info = dict(down_info)
+    down_info['arch'] = version_info.get('architecture',
+                                         down_info.get('name', ''))
+
+    if install_package_item(down_info):
+        arduino_info['packages_index'].add_version(down_info['package'],
+                                                   down_info['arch'],
+                                                   down_info['version'])
+        selected.invalidate_selection()
+        installed_packages_info = get_installed_packages_info(arduino_info)
+        arduino_info.update(installed_packages_info)
+        menu_refresher.mark('platform', 'version')
+        check_tools_deps(version_info)
+
+
+def install_tools(down_infos):
     """."""
-    is_ready = True
+    total = len(down_infos)
+    done = 0
+    failed = 0
+    msg = '[Tools] Installing %d tools...' % total
+    message_queue.put(msg)
+
+    workers = min(const.INSTALL_WORKERS, total)
+    with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        jobs = [executor.submit(install_package_item, down_info)
+                for down_info in down_infos]
+        for job in futures.as_completed(jobs):
+            done += 1
+            if not job.result():
+                failed += 1
+            msg = '[Tools] %d/%d finished' % (done, total)
+            if failed:
+                msg += ', %d failed' % failed
+            message_queue.put(msg + '.')
+
+    selected.invalidate_selection()
+    if failed:
+        msg = '[Tools] %d tools could not be installed.' % failed
+    else:
+        msg = '[Tools] All tools installed.'
+    message_queue.put(msg)
+
 
+def get_host_system_info(systems_info):
+    """."""
+    os_name = sys_info.get_os_name()
+    machine = platform.machine()
+    for system_info in systems_info:
+        host = system_info.get('host', '')
+        host_infos = host.split('-')
+        if len(host_infos) < 2:
+            continue
+        arch = host_infos[0]
+        host_os = host_infos[1]
+
+        if os_name == 'windows' and host_os == 'mingw32':
+            return system_info
+        elif os_name == 'osx' and host_os == 'apple':
+            return system_info
+        elif os_name == 'linux' and host_os == 'linux':
+            if machine == 'i686' and arch == 'i686':
+                return system_info
+            elif machine == 'x86_64' and arch == 'x86_64':
+                return system_info
+            elif arch == 'arm':
+                return system_info
+    return {}
+
+
+def plan_tools_install(platform_info):
+    """."""
+    down_infos = []
+    packages_info = arduino_info.get('packages', {})
     tools_info = selected.get_sel_tools_info(arduino_info, platform_info)
     tool_names = tools_info.get('names', [])
     for name in tool_names:
-        has_tool = False
         tool_info = tools_info.get(name, {})
         if tool_info.get('path', ''):
-            has_tool = True
-
-        if not has_tool:
-            is_ready = False
-
-            package = tool_info.get('packager', '')
-            version = tool_info.get('version', '')
-
-            packages_info = arduino_info.get('packages', {})
-            package_info = packages_info.get(package, {})
-            tools_info = package_info.get('tools', {})
-            tool_info = tools_info.get(name, {})
-            version_info = tool_info.get(version, {})
-            systems_info = version_info.get('systems', [])
-            for system_info in systems_info:
-                host = system_info.get('host', '')
-                url = system_info.get('url', '')
-                if '-' in host:
-                    host_infos = host.split('-')
-                    if len(host_infos) > 1:
-                        arch = host_infos[0]
-                        os_name = host_infos[1]
-
-                        go_down = False
-                        if sys_info.get_os_name() == 'windows':
-                            if os_name == 'mingw32':
-                                go_down = True
-                                break
-                        elif sys_info.get_os_name() == 'osx':
-                            if os_name == 'apple':
-                                go_down = True
-                                break
-                        elif sys_info.get_os_name() == 'linux':
-                            if os_name == 'linux':
-                                machine = platform.machine()
-                                if machine == 'i686' and arch == 'i686':
-                                    go_down = True
-                                    break
-                                elif machine == 'x86_64' and arch == 'x86_64':
-                                    go_down = True
-                                    break
-                                elif arch == 'arm':
-                                    go_down = True
-                                    break
-
-            if go_down:
-                down_info = {}
-                down_info['type'] = 'tool'
-                down_info['package'] = package
-                down_info['name'] = name
-                down_info['version'] = version
-                down_info['url'] = url
-                platform_tool_downloader.put(down_info)
+            continue
+
+        package = tool_info.get('packager', '')
+        version = tool_info.get('version', '')
+        package_info = packages_info.get(package, {})
+        index_tools_info = package_info.get('tools', {})
+        index_tool_info = index_tools_info.get(name, {})
+        version_info = index_tool_info.get(version, {})
+        systems_info = version_info.get('systems', [])
+        system_info = get_host_system_info(systems_info)
+
+        down_info = {}
+        down_info['type'] = 'tool'
+        down_info['package'] = package
+        down_info['name'] = name
+        down_info['version'] = version
+        down_info['url'] = system_info.get('url', '')
+        down_info['checksum'] = system_info.get('checksum', '')
+        down_info['size'] = system_info.get('size', 0)
+        down_infos.append(down_info)
+    return down_infos
+
+
+def check_tools_deps(platform_info):
+    """."""
+    down_infos = plan_tools_install(platform_info)
+    is_ready = not down_infos
+
+    down_infos = [d for d in down_infos if d['url']]
+    if down_infos:
+        platform_tools_installer.put(down_infos)
     return is_ready
 
 
+def gc_blob_store(store):
+    """."""
+    removed_count, removed_size = store.gc()
+    msg = '[Store] Removed %d unused files ' % removed_count
+    msg += '(%.2f M).' % (removed_size / 1024 / 1024)
+    message_queue.put(msg)
+
+
 def open_project(project_path, win):
     """."""
     prj_name = os.path.basename(project_path)
@@ -534,9 +574,110 @@ def install_platform(package, platform, version):
         down_info['name'] = platform
         down_info['version'] = version
         down_info['url'] = url
+        down_info['checksum'] = version_info.get('checksum', '')
+        down_info['size'] = version_info.get('size', 0)
         platform_tool_downloader.put(down_info)
 
 
+def index_installed_boards(board_search, pkg_name, arch, version):
+    """."""
+    arduino_app_path = arduino_info['arduino_app_path']
+    platform_path = os.path.join(arduino_app_path, 'packages', pkg_name,
+                                 'hardware', arch, version)
+    boards_file_path = os.path.join(platform_path, 'boards.txt')
+    group = 'boards:' + platform_path
+    signature = tools_index.get_mtime(boards_file_path)
+    if board_search.get_signature(group) != signature:
+        ptfm_name = selected.get_platform_name_by_arch(arduino_info,
+                                                       pkg_name, arch)
+        entries = []
+        if os.path.isfile(boards_file_path):
+            boards_file = plain_params_file.BoardsFile(boards_file_path)
+            for board_id, name, build_info in \
+                    boards_file.get_board_summaries():
+                fqbn = '%s:%s:%s' % (pkg_name, arch, board_id)
+                fields = [fqbn, arch, ptfm_name, version,
+                          build_info.get('mcu', ''),
+                          build_info.get('board', '')]
+                payload = {'type': 'board', 'package': pkg_name,
+                           'platform': ptfm_name, 'version': version,
+                           'board': name, 'fqbn': fqbn}
+                key = 'board:%s:%s' % (fqbn, version)
+                entries.append((key, name, fields, payload))
+        board_search.update_group(group, signature, entries)
+    return group
+
+
+def index_package_platforms(board_search, pkg_name):
+    """."""
+    packages_info = arduino_info.get('packages', {})
+    platforms_info = packages_info.get(pkg_name, {}).get('platforms', {})
+    ptfm_names = platforms_info.get('names', [])
+    group = 'platforms:' + pkg_name
+    signature = [(n, platforms_info[n].get('versions', []))
+                 for n in ptfm_names]
+    if board_search.get_signature(group) != signature:
+        entries = []
+        for ptfm_name in ptfm_names:
+            versions = platforms_info[ptfm_name].get('versions', [])
+            if not versions:
+                continue
+            version = versions[-1]
+            version_info = platforms_info[ptfm_name].get(version, {})
+            arch = version_info.get('architecture', '')
+            board_names = [b.get('name', '')
+                           for b in version_info.get('boards', [])]
+            fields = [pkg_name, arch, version_info.get('category', '')]
+            fields += board_names
+            payload = {'type': 'platform', 'package': pkg_name,
+                       'platform': ptfm_name, 'version': version}
+            key = 'platform:%s:%s' % (pkg_name, ptfm_name)
+            entries.append((key, ptfm_name, fields, payload))
+        board_search.update_group(group, signature, entries)
+    return group
+
+
+def refresh_board_search():
+    """Bring the board search index up to date, one group at a time."""
+    board_search = arduino_info['board_search']
+    groups = set()
+    installed_pkgs = arduino_info['packages_index'].get_packages()
+    for pkg_name in installed_pkgs:
+        for arch, versions in installed_pkgs[pkg_name].items():
+            for version in versions:
+                groups.add(index_installed_boards(board_search, pkg_name,
+                                                  arch, version))
+
+    packages_info = arduino_info.get('packages', {})
+    for pkg_name in packages_info.get('names', []):
+        groups.add(index_package_platforms(board_search, pkg_name))
+    board_search.remove_groups(groups)
+
+
+def search_boards(query):
+    """."""
+    refresh_board_search()
+    return arduino_info['board_search'].search(query,
+                                               const.BOARD_SEARCH_LIMIT)
+
+
+def on_board_search_select(payload):
+    """."""
+    sel_settings = arduino_info['selected']
+    if payload['type'] == 'platform':
+        install_platform(payload['package'], payload['platform'],
+                         payload['version'])
+        return
+
+    if sel_settings.get('package') != payload['package'] or \
+            sel_settings.get('platform') != payload['platform']:
+        on_platform_select(payload['package'], payload['platform'])
+    if sel_settings.get('version') != payload['version']:
+        on_version_select(payload['version'])
+    if sel_settings.get('board') != payload['board']:
+        on_board_select(payload['board'])
+
+
 def import_avr_platform(ide_path):
     """."""
     global arduino_info
@@ -548,6 +689,7 @@ def import_avr_platform(ide_path):
         sketch_examples_path = os.path.join(sketchbook_path, 'examples')
         sketch_libraries_path = os.path.join(sketchbook_path, 'libraries')
 
+        sketch_copier = fast_copy.TreeCopier()
         examples_path = os.path.join(ide_path, 'examples')
         if os.path.isdir(examples_path):
             paths = glob.glob(examples_path + '/*')
@@ -556,7 +698,7 @@ def import_avr_platform(ide_path):
                 name = os.path.basename(path)
                 target_path = os.path.join(sketch_examples_path, name)
                 if not os.path.exists(target_path):
-                    shutil.copytree(path, target_path)
+                    sketch_copier.copy_tree(path, target_path)
 
         libraries_path = os.path.join(ide_path, 'libraries')
         if os.path.isdir(libraries_path):
@@ -566,7 +708,11 @@ def import_avr_platform(ide_path):
                 name = os.path.basename(path)
                 target_path = os.path.join(sketch_libraries_path, name)
                 if not os.path.exists(target_path):
-                    shutil.copytree(path, target_path)
+                    sketch_copier.copy_tree(path, target_path)
+
+        if sketch_copier.stats['files']:
+            msg = '[Import] Sketchbook: %s' % sketch_copier.get_summary()
+            message_queue.put(msg)
 
         hardware_path = os.path.join(ide_path, 'hardware')
         index_file_path = os.path.join(hardware_path,
@@ -608,20 +754,32 @@ def import_avr_platform(ide_path):
                                                        platform_arch)
                             target_path = os.path.join(target_path,
                                                        version)
-                            if not os.path.isdir(target_path):
-                                shutil.copytree(platform_path, target_path)
+                            is_new = not os.path.isdir(target_path)
+                            if is_new:
+                                # Users edit platform.txt and boards.txt
+                                # in place, never copy over an import.
+                                copier = fast_copy.TreeCopier()
+                                copier.copy_tree(platform_path, target_path)
+                                msg = '[%s] %s %s: ' % (package_name,
+                                                        platform_name,
+                                                        version)
+                                msg += copier.get_summary()
+                                message_queue.put(msg)
+
+                                pkgs_index = arduino_info['packages_index']
+                                pkgs_index.add_version(package_name,
+                                                       platform_arch, version)
                                 msg = 'Importing Arduino IDE finished.'
+                                selected.invalidate_selection()
                                 installed_packages_info = \
                                     get_installed_packages_info(arduino_info)
                                 arduino_info.update(installed_packages_info)
-                                st_menu.update_platform_menu(arduino_info)
-                                st_menu.update_version_menu(arduino_info)
-
+                                menu_refresher.mark('platform', 'version')
                             else:
                                 msg = '[%s] %s %s ' % (package_name,
                                                        platform_name,
                                                        version)
-                                msg += 'exists.'
+                                msg += 'is already imported.'
                             message_queue.put(msg)
                             check_tools_deps(version_info)
     if not is_ide:
@@ -629,41 +787,23 @@ def import_avr_platform(ide_path):
         message_queue.put(msg)
 
 
-def find_include_dirs(path):
-    """."""
-    include_dirs = []
-    name = os.path.basename(path)
-    if name == 'include':
-        include_dirs.append(path)
-    else:
-        sub_paths = glob.glob(path + '/*')
-        sub_paths = [p for p in sub_paths if os.path.isdir(p)]
-        for sub_path in sub_paths:
-            include_dirs += find_include_dirs(sub_path)
-    return include_dirs
-
-
 def get_tool_include_dirs():
     """."""
     tool_include_dirs = []
-    platform_info = selected.get_sel_platform_info(arduino_info)
-    tools_info = selected.get_sel_tools_info(arduino_info, platform_info)
+    tools_info = selected.get_selection(arduino_info).tools_info
     tool_names = tools_info.get('names', [])
     for name in tool_names:
         tool_info = tools_info.get(name, {})
-        path = tool_info.get('path', '')
-        if path:
-            tool_include_dirs += find_include_dirs(path)
+        tool_include_dirs += tool_info.get('include_dirs', [])
     return tool_include_dirs
 
 
-def get_h_path_info(project):
-    """."""
-    h_path_info = {}
-    get_h_info = c_project.get_file_info_of_extensions
-    excludes = ['examples', 'samples']
+def get_library_paths():
+    """Sketchbook libraries first, then those of the selected platform."""
+    lib_paths = []
     sketchbook_path = arduino_info['sketchbook_path']
-    platform_path = selected.get_sel_platform_path(arduino_info)
+    selection = selected.get_selection(arduino_info)
+    platform_path = selection.platform_path
 
     paths = [sketchbook_path]
     if platform_path:
@@ -671,17 +811,27 @@ def get_h_path_info(project):
 
     for path in paths:
         libraries_path = os.path.join(path, 'libraries')
-        lib_paths = glob.glob(libraries_path + '/*')
-        lib_paths = [p for p in lib_paths if os.path.isdir(p)]
-        for lib_path in lib_paths:
-            src_path = os.path.join(lib_path, 'src')
-            if not os.path.isdir(src_path):
-                src_path = lib_path
-            info = get_h_info(src_path, c_file.H_EXTS, 'recursion', excludes)
-            h_path_info.update(info)
+        sub_paths = glob.glob(libraries_path + '/*')
+        lib_paths += [p for p in sub_paths if os.path.isdir(p)]
+    return lib_paths
+
+
+def get_h_path_info(project):
+    """."""
+    h_path_info = {}
+    get_h_info = c_project.get_file_info_of_extensions
+    excludes = ['examples', 'samples']
+    selection = selected.get_selection(arduino_info)
+
+    for lib_path in get_library_paths():
+        src_path = os.path.join(lib_path, 'src')
+        if not os.path.isdir(src_path):
+            src_path = lib_path
+        info = get_h_info(src_path, c_file.H_EXTS, 'recursion', excludes)
+        h_path_info.update(info)
 
     if project.is_arduino_project():
-        src_path = selected.get_sel_core_src_path(arduino_info)
+        src_path = selection.core_src_path
         if src_path:
             info = get_h_info(src_path, c_file.H_EXTS, 'recursion', excludes)
             h_path_info.update(info)
@@ -691,7 +841,8 @@ def get_h_path_info(project):
     return h_path_info
 
 
-def get_dep_cpps(dir_paths, h_path_info, used_cpps, used_headers, used_dirs):
+def get_dep_cpps(dir_paths, h_path_info, used_cpps, used_headers, used_dirs,
+                 missing_headers=None):
     """."""
     for dir_path in dir_paths:
         if dir_path not in used_dirs:
@@ -722,13 +873,172 @@ def get_dep_cpps(dir_paths, h_path_info, used_cpps, used_headers, used_dirs):
                         if dir_path not in sub_dir_paths:
                             if dir_path not in used_dirs:
                                 sub_dir_paths.append(dir_path)
+                    elif missing_headers is not None and \
+                            header not in missing_headers:
+                        missing_headers.append(header)
 
             used_cpps, used_headers, used_dirs = \
                 get_dep_cpps(sub_dir_paths, h_path_info, used_cpps,
-                             used_headers, used_dirs)
+                             used_headers, used_dirs, missing_headers)
     return used_cpps, used_headers, used_dirs
 
 
+def get_compiler_include_dirs():
+    """System include dirs of the g++ of the selected tools."""
+    include_dirs = []
+    tools_info = selected.get_selection(arduino_info).tools_info
+    for name in tools_info.get('names', []):
+        tool_path = tools_info.get(name, {}).get('path', '')
+        if not tool_path:
+            continue
+        bin_path = os.path.join(tool_path, 'bin')
+        for cmd_path in glob.glob(bin_path + '/*g++*'):
+            if cmd_path not in compiler_include_dirs:
+                compiler_include_dirs[cmd_path] = \
+                    query_compiler_include_dirs(cmd_path)
+            include_dirs += compiler_include_dirs[cmd_path]
+    return include_dirs
+
+
+def query_compiler_include_dirs(cmd_path):
+    """."""
+    include_dirs = []
+    try:
+        proc = subprocess.Popen([cmd_path, '-xc++', '-E', '-v', '-'],
+                                stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        result = proc.communicate(b'')
+    except (OSError, ValueError):
+        return include_dirs
+    text = result[1].decode(sys_info.get_sys_encoding(), 'replace')
+    is_in_list = False
+    for line in text.splitlines():
+        if line.startswith('#include <...> search starts here'):
+            is_in_list = True
+        elif line.startswith('End of search list'):
+            break
+        elif is_in_list and line.startswith(' '):
+            include_dirs.append(line.strip())
+    return include_dirs
+
+
+def is_header_in_dirs(header, dir_paths):
+    """."""
+    for dir_path in dir_paths:
+        if os.path.isfile(os.path.join(dir_path, header)):
+            return True
+    return False
+
+
+def find_src_paths(prj, prj_src_dir_paths):
+    """Return (src paths, include dirs, headers found nowhere).
+
+    Headers of the toolchain and SDKs, under the tool include dirs or
+    the compiler's own search list, are not missing.
+    """
+    missing_headers = []
+    include_dirs = get_tool_include_dirs()
+    system_dirs = include_dirs + get_compiler_include_dirs()
+    h_path_info = get_h_path_info(prj)
+    all_src_paths, used_headers, include_dirs = \
+        get_dep_cpps(prj_src_dir_paths, h_path_info, [], [], include_dirs,
+                     missing_headers)
+    missing_headers = [h for h in missing_headers
+                       if not is_header_in_dirs(h, system_dirs)]
+    return all_src_paths, include_dirs, missing_headers
+
+
+def get_unity_libraries():
+    """Libraries opted into unity builds, minus those that failed in it."""
+    settings = arduino_info['settings']
+    fallbacks = settings.get('unity_fallbacks', [])
+    names = settings.get('unity_build_libraries', [])
+    return [n for n in names if n not in fallbacks]
+
+
+def toggle_unity_library(name):
+    """."""
+    settings = arduino_info['settings']
+    names = list(settings.get('unity_build_libraries', []))
+    fallbacks = list(settings.get('unity_fallbacks', []))
+    if name in names and name not in fallbacks:
+        names.remove(name)
+    elif name not in names:
+        names.append(name)
+    if name in fallbacks:
+        fallbacks.remove(name)
+        settings.set('unity_fallbacks', fallbacks)
+    settings.set('unity_build_libraries', names)
+
+
+def apply_unity_build(all_src_paths, prj_build_path):
+    """Replace the C++ sources of unity libraries by a few unity files.
+
+    Return the new source list and {unity file path: library name}.
+    """
+    unity_info = {}
+    names = get_unity_libraries()
+    if not names:
+        return all_src_paths, unity_info
+
+    unity_dir_path = os.path.join(prj_build_path, 'unity')
+    src_paths = list(all_src_paths)
+    for lib_path in get_library_paths():
+        name = os.path.basename(lib_path)
+        if name not in names or name in unity_info.values():
+            continue
+        prefix = lib_path.replace('\\', '/') + '/'
+        lib_src_paths = [p for p in src_paths if p.startswith(prefix) and
+                         os.path.splitext(p)[1] in c_file.CPP_EXTS]
+        if len(lib_src_paths) < 2:
+            continue
+
+        index = src_paths.index(lib_src_paths[0])
+        src_paths = [p for p in src_paths if p not in lib_src_paths]
+        unity_paths = c_project.gen_unity_files(name, lib_src_paths,
+                                                unity_dir_path,
+                                                const.UNITY_MAX_FILES)
+        src_paths[index:index] = unity_paths
+        for unity_path in unity_paths:
+            unity_info[unity_path] = name
+    return src_paths, unity_info
+
+
+def resolve_missing_headers(headers):
+    """Map headers to catalog libraries, best architecture match first."""
+    resolved = {}
+    catalog = arduino_info['library_catalog']
+    arch = get_sel_arch()
+    for header in headers:
+        lib_infos = catalog.find_header(header, arch)
+        if lib_infos:
+            resolved[header] = lib_infos
+    return resolved
+
+
+def report_missing_headers(resolved):
+    """."""
+    arch = get_sel_arch()
+    for header in sorted(resolved):
+        names = []
+        for lib_info in resolved[header][:const.LIBRARY_CANDIDATES]:
+            name = '%s %s' % (lib_info['name'], lib_info['version'])
+            if library_catalog.get_arch_rank(lib_info, arch) > 1:
+                name += ' (%s)' % ', '.join(lib_info['architectures'])
+            names.append(name)
+        msg = '[Warning] %s is not found, it is provided by: %s.'
+        message_queue.put(msg % (header, '; '.join(names)))
+
+
+def install_libraries(lib_infos):
+    """Install libraries concurrently, return True if any was added."""
+    workers = min(const.INSTALL_WORKERS, len(lib_infos))
+    with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(install_library, lib_infos))
+    return any(results)
+
+
 def is_modified(file_path, info):
     """."""
     state = False
@@ -739,13 +1049,191 @@ def is_modified(file_path, info):
     return state
 
 
-def get_build_cmds(cmds_info, prj_build_path, all_src_paths):
+def insert_before_source(cmd, text):
+    """."""
+    if '"{source_file}"' in cmd:
+        return cmd.replace('"{source_file}"', text + ' "{source_file}"')
+    return cmd.replace('{source_file}', text + ' {source_file}')
+
+
+def get_headers_stamp(dir_paths):
+    """Paths and mtimes of every header under dir_paths."""
+    lines = []
+    for dir_path in dir_paths:
+        if dir_path and os.path.isdir(dir_path):
+            h_paths = c_project.list_files_of_extensions(dir_path,
+                                                         c_file.H_EXTS)
+            for h_path in sorted(h_paths):
+                lines.append('%s %s' % (h_path, os.path.getmtime(h_path)))
+    return '\n'.join(lines)
+
+
+def build_pch(cmds_info, prj_build_path, core_src_path, variant_path):
+    """Precompile the core Arduino.h, return the header to -include."""
+    h_path = os.path.join(core_src_path, 'Arduino.h').replace('\\', '/')
+    cmd_pattern = cmds_info.get('recipe.cpp.o.pattern', '')
+    if not (cmd_pattern and os.path.isfile(h_path)):
+        return ''
+
+    pch_dir_path = os.path.join(prj_build_path, 'pch')
+    pch_h_path = os.path.join(pch_dir_path, 'Arduino.h').replace('\\', '/')
+    gch_path = pch_h_path + '.gch'
+    if not os.path.isdir(pch_dir_path):
+        os.makedirs(pch_dir_path)
+    # The stub falls back to the real header when the .gch is unusable.
+    text = '#include "%s"\n' % h_path
+    if not os.path.isfile(pch_h_path) or file.File(pch_h_path).read() != text:
+        file.File(pch_h_path).write(text)
+
+    cmd = insert_before_source(cmd_pattern, '-x c++-header')
+    cmd = cmd.replace('{source_file}', pch_h_path)
+    cmd = cmd.replace('{object_file}', gch_path)
+    # Arduino.h pulls in the other core headers and pins_arduino.h.
+    key = '%s\n%s' % (cmd, get_headers_stamp([core_src_path, variant_path]))
+    pch_hash = hashlib.md5(key.encode('utf-8')).hexdigest()
+
+    pch_info = file.SettingsFile(os.path.join(pch_dir_path,
+                                              'pch.stino-settings'))
+    if pch_info.get('hash') == pch_hash and os.path.isfile(gch_path):
+        return pch_h_path
+
+    message_queue.put('Precompiling %s...' % h_path)
+    return_code, stdout, stderr = run_command(cmd)
+    if return_code != 0:
+        if os.path.isfile(gch_path):
+            os.remove(gch_path)
+        pch_info.set('hash', '')
+        msg = '[Warning] Arduino.h could not be precompiled.'
+        message_queue.put(msg)
+        if bool(arduino_info['settings'].get('verbose_build')):
+            message_queue.put(cmd)
+            message_queue.put(stderr.replace('\r', ''))
+        return ''
+    pch_info.set('hash', pch_hash)
+    return pch_h_path
+
+
+def get_obj_paths(prj_build_path, all_src_paths):
+    """Object paths, the sketch first as in get_build_cmds."""
+    obj_paths = []
+    for src_path in all_src_paths[::-1]:
+        src_name = os.path.basename(src_path)
+        obj_name = src_name + '.o'
+        obj_path = os.path.join(prj_build_path, obj_name)
+        obj_path = obj_path.replace('\\', '/')
+        obj_paths.append(obj_path)
+    return obj_paths
+
+
+def get_elf_path(prj_build_path):
+    """."""
+    prj_name = os.path.basename(prj_build_path)
+    return os.path.join(prj_build_path, prj_name + '.elf')
+
+
+def get_bin_cmds(cmds_info, prj_build_path, sketch_obj_path):
+    """Return link and objcopy commands, their messages, output paths."""
+    prj_name = os.path.basename(prj_build_path)
+    out_file_name = cmds_info.get('recipe.output.save_file', '')
+    if out_file_name:
+        bin_ext = out_file_name[-4:]
+    else:
+        bin_ext = '.bin'
+
+    bin_file_name = prj_name + bin_ext
+    elf_file_path = get_elf_path(prj_build_path)
+    bin_file_path = os.path.join(prj_build_path, bin_file_name)
+
+    cmd_pattern = cmds_info.get('recipe.c.combine.pattern', '')
+    cmd = cmd_pattern.replace('{object_files}', '"%s"' % sketch_obj_path)
+    cmds = [cmd]
+    msgs = ['Creating binary file...']
+    keys = ['recipe.objcopy.eep.pattern', 'recipe.objcopy.hex.pattern',
+            'recipe.objcopy.bin.pattern']
+    for key in keys:
+        cmd = cmds_info.get(key, '')
+        if cmd:
+            cmds.append(cmd)
+            msgs.append('')
+    return cmds, msgs, [elf_file_path, bin_file_path]
+
+
+def hash_file(file_path):
+    """."""
+    hasher = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for trunk in iter(lambda: f.read(65536), b''):
+            hasher.update(trunk)
+    return hasher.hexdigest()
+
+
+def get_obj_hashes(obj_paths, last_build_info):
+    """Content hash of each object, rehashing only those that changed."""
+    last_obj_hashes = last_build_info.get('obj_hashes', {})
+    obj_hashes = {}
+    for obj_path in obj_paths:
+        try:
+            stat = os.stat(obj_path)
+        except OSError:
+            continue
+        info = last_obj_hashes.get(obj_path)
+        if not (info and info[0] == stat.st_mtime and
+                info[1] == stat.st_size):
+            info = [stat.st_mtime, stat.st_size, hash_file(obj_path)]
+        obj_hashes[obj_path] = info
+    last_build_info.set('obj_hashes', obj_hashes)
+    return obj_hashes
+
+
+def get_bins_fingerprint(obj_hashes, bin_cmds):
+    """."""
+    hasher = hashlib.sha1()
+    for obj_path in sorted(obj_hashes):
+        text = '%s %s\n' % (obj_path, obj_hashes[obj_path][2])
+        hasher.update(text.encode('utf-8'))
+    for cmd in bin_cmds:
+        hasher.update((cmd + '\n').encode('utf-8'))
+    return hasher.hexdigest()
+
+
+def gen_bins(cmds_info, prj_build_path, src_paths):
+    """Link and objcopy unless objects and commands are as last time.
+
+    Return (is_ok, size command output).
+    """
+    last_build_path = os.path.join(prj_build_path,
+                                   'last_build.stino-settings')
+    last_build_info = file.SettingsFile(last_build_path)
+    obj_paths = get_obj_paths(prj_build_path, src_paths)
+    cmds, msgs, out_paths = get_bin_cmds(cmds_info, prj_build_path,
+                                         obj_paths[0])
+    size_cmd = cmds_info.get('recipe.size.pattern', '')
+    obj_hashes = get_obj_hashes(obj_paths, last_build_info)
+    fingerprint = get_bins_fingerprint(obj_hashes, cmds + [size_cmd])
+
+    size_output = last_build_info.get('size_output')
+    if fingerprint == last_build_info.get('bins_fingerprint') and \
+            size_output is not None and \
+            all(os.path.isfile(p) for p in out_paths):
+        message_queue.put('Binary files are up to date.')
+        return True, size_output
+
+    last_build_info.set('bins_fingerprint', '')
+    is_ok, failed_cmd = run_build_commands(cmds, msgs)
+    size_output = ''
+    if is_ok:
+        size_output = get_size_output(size_cmd, out_paths[0])
+        last_build_info.set('size_output', size_output)
+        last_build_info.set('bins_fingerprint', fingerprint)
+    return is_ok, size_output
+
+
+def get_build_cmds(cmds_info, prj_build_path, all_src_paths, pch_path=''):
     """."""
     is_full_build = bool(arduino_info['settings'].get('full_build'))
     last_build_path = os.path.join(prj_build_path,
                                    'last_build.stino-settings')
     last_build_info = file.SettingsFile(last_build_path)
-    prj_name = os.path.basename(prj_build_path)
     core_a_path = os.path.join(prj_build_path, 'core.a')
 
     last_package = last_build_info.get('package', '')
@@ -758,7 +1246,7 @@ def get_build_cmds(cmds_info, prj_build_path, all_src_paths):
     sel_platform = arduino_sel.get('platform', '')
     sel_version = arduino_sel.get('version', '')
     sel_board = arduino_sel.get('board', '')
-    sel_board_options = selected.get_sel_board_options(arduino_info)
+    sel_board_options = selected.get_selection(arduino_info).board_options
 
     if not is_full_build:
         if sel_package and sel_package != last_package:
@@ -780,25 +1268,17 @@ def get_build_cmds(cmds_info, prj_build_path, all_src_paths):
                             if sel_option and sel_option != last_option:
                                 is_full_build = True
 
-    obj_paths = []
     src_paths = all_src_paths[::-1]
-    for src_path in src_paths:
-        src_name = os.path.basename(src_path)
-        obj_name = src_name + '.o'
-        obj_path = os.path.join(prj_build_path, obj_name)
-        obj_path = obj_path.replace('\\', '/')
-        obj_paths.append(obj_path)
+    obj_paths = get_obj_paths(prj_build_path, all_src_paths)
 
     build_src_paths = []
     build_obj_paths = []
     libs_changed = False
-    need_gen_bins = False
 
     if is_full_build:
         build_src_paths = src_paths
         build_obj_paths = obj_paths
         libs_changed = True
-        need_gen_bins = True
     else:
         need_compile = False
         if is_modified(src_paths[0], last_build_info):
@@ -809,7 +1289,6 @@ def get_build_cmds(cmds_info, prj_build_path, all_src_paths):
         if need_compile:
             build_src_paths.append(src_paths[0])
             build_obj_paths.append(obj_paths[0])
-            need_gen_bins = True
 
         for src_path, obj_path in zip(src_paths[1:], obj_paths[1:]):
             need_compile = False
@@ -822,8 +1301,12 @@ def get_build_cmds(cmds_info, prj_build_path, all_src_paths):
                 build_src_paths.append(src_path)
                 build_obj_paths.append(obj_path)
 
+    # core.a is only rebuilt on changes, so it must follow added or
+    # removed sources too, e.g. when a library switches to unity build.
+    if last_build_info.get('src_paths') != src_paths:
+        libs_changed = True
+
     if libs_changed:
-        need_gen_bins = True
         if os.path.isfile(core_a_path):
             os.remove(core_a_path)
 
@@ -841,6 +1324,9 @@ def get_build_cmds(cmds_info, prj_build_path, all_src_paths):
             cmd = cmds_info.get('recipe.cpp.o.pattern', '')
         else:
             cmd = ''
+        if pch_path and (src_ext in c_file.CPP_EXTS or
+                         src_ext in c_file.INO_EXTS or not src_ext):
+            cmd = insert_before_source(cmd, '-include "%s"' % pch_path)
         cmd = cmd.replace('{source_file}', src_path)
         cmd = cmd.replace('{object_file}', obj_path)
         msg = 'Compile %s...' % src_path
@@ -857,43 +1343,6 @@ def get_build_cmds(cmds_info, prj_build_path, all_src_paths):
             msgs.append('')
     msgs.pop()
 
-    out_file_name = cmds_info.get('recipe.output.save_file', '')
-    if out_file_name:
-        bin_ext = out_file_name[-4:]
-    else:
-        bin_ext = '.bin'
-
-    elf_file_name = prj_name + '.elf'
-    bin_file_name = prj_name + bin_ext
-    elf_file_path = os.path.join(prj_build_path, elf_file_name)
-    bin_file_path = os.path.join(prj_build_path, bin_file_name)
-
-    if not (os.path.isfile(elf_file_path) and os.path.isfile(bin_file_path)):
-        need_gen_bins = True
-
-    msg = 'Creating binary file...'
-    msgs.append(msg)
-    if need_gen_bins:
-        cmd_pattern = cmds_info.get('recipe.c.combine.pattern', '')
-        cmd = cmd_pattern.replace('{object_files}', '"%s"' % obj_paths[0])
-        cmds.append(cmd)
-
-        cmd = cmds_info.get('recipe.objcopy.eep.pattern', '')
-        if cmd:
-            cmds.append(cmd)
-            msgs.append('')
-
-        cmd = cmds_info.get('recipe.objcopy.hex.pattern', '')
-        if cmd:
-            cmds.append(cmd)
-            msgs.append('')
-
-        cmd = cmds_info.get('recipe.objcopy.bin.pattern', '')
-        if cmd:
-            cmds.append(cmd)
-            msgs.append('')
-    msgs.pop()
-
     last_build_info.set('package', sel_package)
     last_build_info.set('platform', sel_platform)
     last_build_info.set('version', sel_version)
@@ -905,6 +1354,7 @@ def get_build_cmds(cmds_info, prj_build_path, all_src_paths):
     for src_path in src_paths:
         mtime = os.path.getmtime(src_path)
         last_build_info.set(src_path, mtime)
+    last_build_info.set('src_paths', src_paths)
     return cmds, msgs
 
 
@@ -957,7 +1407,7 @@ def run_upload_command(cmd):
 
 
 def run_build_commands(cmds, msgs):
-    """."""
+    """Return (is_ok, the command that failed)."""
     is_ok = True
     n = 0
 
@@ -969,8 +1419,28 @@ def run_build_commands(cmds, msgs):
             percent = n / total * 100
         is_ok = run_build_command(percent, cmd, msg)
         if not is_ok:
-            break
-    return is_ok
+            return is_ok, cmd
+    return is_ok, ''
+
+
+def get_failed_unity_library(unity_info, cmd):
+    """."""
+    for unity_path, name in unity_info.items():
+        if unity_path in cmd:
+            return name
+    return ''
+
+
+def fall_back_from_unity(name):
+    """Remember that name builds file by file from now on."""
+    settings = arduino_info['settings']
+    fallbacks = list(settings.get('unity_fallbacks', []))
+    if name not in fallbacks:
+        fallbacks.append(name)
+        settings.set('unity_fallbacks', fallbacks)
+    msg = '[Warning] %s failed in unity build, ' % name
+    msg += 'building it file by file from now on.'
+    message_queue.put(msg)
 
 
 def regular_numner(num):
@@ -985,67 +1455,180 @@ def regular_numner(num):
     return regular_num
 
 
-def run_size_command(cmd, regex_info):
-    """."""
+def get_size_output(cmd, elf_path=''):
+    """Output of the size command, read from the ELF for size -A.
+
+    An ELF that can not be read falls back to the size command itself.
+    """
+    stdout = ''
+    if elf_path and re.search(r'\s-A\s', cmd + ' '):
+        try:
+            sections = elf_file.ElfFile(elf_path).get_sections()
+        except (IOError, OSError, elf_file.ElfError):
+            pass
+        else:
+            return elf_file.format_sysv_sizes(elf_path, sections)
     if cmd:
         return_code, stdout, stderr = run_command(cmd)
-        if stdout:
-            board_info = selected.get_sel_board_info(arduino_info)
-            size_total = int(board_info.get('upload.maximum_size', '253952'))
-            size_data_total = int(board_info.get('upload.maximum_data_size',
-                                                 '10000'))
-
-            size_regex = regex_info.get('recipe.size.regex', '')
-            if size_regex:
-                pattern = re.compile(size_regex, re.M)
-                result = pattern.findall(stdout)
-                if result:
-                    try:
-                        int(result[0])
-                    except TypeError:
-                        result = result[0][:2]
-                    size = sum(int(n) for n in result)
-                    size_percent = size / size_total * 100
-
-                    size = regular_numner(size)
-                    size_total = regular_numner(size_total)
-                    size_percent = '%.1f' % size_percent
-                    text = 'Sketch uses '
-                    text += '%s bytes (%s%%) ' % (size, size_percent)
-                    text += 'of program storage space. '
-                    text += 'Maximum is %s bytes.' % size_total
-                    message_queue.put(text)
-
-            data_regex = regex_info.get('recipe.size.regex.data', '')
-            if data_regex:
-                pattern = re.compile(data_regex, re.M)
-                result = pattern.findall(stdout)
-                if result:
-                    try:
-                        int(result[0])
-                    except TypeError:
-                        result = result[0][1:]
-                size_data = sum(int(n) for n in result)
-                size_data_percent = size_data / size_data_total * 100
-                size_data_remain = size_data_total - size_data
-
-                size_data = regular_numner(size_data)
-                size_data_remain = regular_numner(size_data_remain)
-                size_data_total = regular_numner(size_data_total)
-                size_data_percent = '%.1f' % size_data_percent
-                text = 'Global variables use '
-                text += '%s bytes (%s%%) ' % (size_data, size_data_percent)
-                text += 'of dynamic memory, leaving '
-                text += '%s bytes for local variables. ' % size_data_remain
-                text += 'Maximum is %s bytes.' % size_data_total
+    return stdout
+
+
+def get_size_regex(regex):
+    """."""
+    pattern = size_regexes.get(regex)
+    if pattern is None:
+        pattern = re.compile(regex, re.M)
+        size_regexes[regex] = pattern
+    return pattern
+
+
+def analyze_size(prj_build_path, elf_path):
+    """Return (current, previous, is_cached) section and symbol sizes.
+
+    The analysis is kept in size.stino-settings under the hash of the
+    ELF, with the section sizes of the last builds as history.
+    """
+    size_path = os.path.join(prj_build_path, 'size.stino-settings')
+    size_info = file.SettingsFile(size_path)
+    elf_hash = hash_file(elf_path)
+    current = size_info.get('current', {})
+    if current.get('elf_hash') == elf_hash:
+        return current, size_info.get('previous', {}), True
+
+    elf = elf_file.ElfFile(elf_path)
+    sections = {}
+    for name, size, addr, flags in elf.get_sections():
+        if flags & elf_file.SHF_ALLOC and size:
+            sections[name] = size
+    symbols = {}
+    for name, size, section_name in elf.get_symbols():
+        symbols[name] = [symbols.get(name, [0])[0] + size, section_name]
+
+    previous = current
+    current = {'elf_hash': elf_hash, 'sections': sections,
+               'symbols': symbols}
+    history = size_info.get('history', [])
+    history.append({'elf_hash': elf_hash, 'time': int(time.time()),
+                    'sections': sections})
+    size_info.set_data({'current': current, 'previous': previous,
+                        'history': history[-const.SIZE_HISTORY:]})
+    return current, previous, False
+
+
+def report_size_analysis(prj_build_path):
+    """Print the largest symbols and the size changes since last build."""
+    elf_path = get_elf_path(prj_build_path)
+    try:
+        current, previous, is_cached = analyze_size(prj_build_path,
+                                                    elf_path)
+    except (IOError, OSError, elf_file.ElfError) as e:
+        msg = '[Warning] Size analysis of %s failed: %s' % (elf_path, e)
+        message_queue.put(msg)
+        return
+
+    n = const.SIZE_TOP_SYMBOLS
+    symbols = current.get('symbols', {})
+    items = sorted(symbols.items(), key=lambda i: (-i[1][0], i[0]))[:n]
+    lines = ['Largest symbols:']
+    for name, (size, section_name) in items:
+        lines.append('%10s  %-12s %s' % (regular_numner(size),
+                                         section_name, name))
+
+    if is_cached:
+        lines.append('Sizes are unchanged since the last build.')
+    elif previous:
+        sections = current.get('sections', {})
+        last_sections = previous.get('sections', {})
+        changes = []
+        for name in sorted(set(sections) | set(last_sections)):
+            delta = sections.get(name, 0) - last_sections.get(name, 0)
+            if delta:
+                changes.append('%s %+d' % (name, delta))
+        if changes:
+            lines.append('Changes since the last build: %s.' %
+                         ', '.join(changes))
+        else:
+            lines.append('Section sizes are unchanged since the last build.')
+
+        last_symbols = previous.get('symbols', {})
+        deltas = []
+        for name in set(symbols) | set(last_symbols):
+            delta = symbols.get(name, [0])[0] - \
+                last_symbols.get(name, [0])[0]
+            if delta:
+                deltas.append((-abs(delta), name, delta))
+        for key, name, delta in sorted(deltas)[:n]:
+            lines.append('%+10d  %s' % (delta, name))
+    message_queue.put('\n'.join(lines))
+
+
+def run_size_command(cmd, regex_info, stdout=None):
+    """Report sizes from the output of cmd, or from stdout if given."""
+    if stdout is None:
+        stdout = get_size_output(cmd)
+    if stdout:
+        board_info = selected.get_selection(arduino_info).board_info
+        size_total = int(board_info.get('upload.maximum_size', '253952'))
+        size_data_total = int(board_info.get('upload.maximum_data_size',
+                                             '10000'))
+
+        size_regex = regex_info.get('recipe.size.regex', '')
+        if size_regex:
+            pattern = get_size_regex(size_regex)
+            result = pattern.findall(stdout)
+            if result:
+                try:
+                    int(result[0])
+                except TypeError:
+                    result = result[0][:2]
+                size = sum(int(n) for n in result)
+                size_percent = size / size_total * 100
+
+                size = regular_numner(size)
+                size_total = regular_numner(size_total)
+                size_percent = '%.1f' % size_percent
+                text = 'Sketch uses '
+                text += '%s bytes (%s%%) ' % (size, size_percent)
+                text += 'of program storage space. '
+                text += 'Maximum is %s bytes.' % size_total
                 message_queue.put(text)
 
-            eeprom_regex = regex_info.get('recipe.size.regex.eeprom', '')
-            if eeprom_regex:
-                pattern = re.compile(eeprom_regex, re.M)
-                result = pattern.findall(stdout)
-                if result:
-                    message_queue.put(result)
+        data_regex = regex_info.get('recipe.size.regex.data', '')
+        if data_regex:
+            pattern = get_size_regex(data_regex)
+            result = pattern.findall(stdout)
+            if result:
+                try:
+                    int(result[0])
+                except TypeError:
+                    result = result[0][1:]
+            size_data = sum(int(n) for n in result)
+            size_data_percent = size_data / size_data_total * 100
+            size_data_remain = size_data_total - size_data
+
+            size_data = regular_numner(size_data)
+            size_data_remain = regular_numner(size_data_remain)
+            size_data_total = regular_numner(size_data_total)
+            size_data_percent = '%.1f' % size_data_percent
+            text = 'Global variables use '
+            text += '%s bytes (%s%%) ' % (size_data, size_data_percent)
+            text += 'of dynamic memory, leaving '
+            text += '%s bytes for local variables. ' % size_data_remain
+            text += 'Maximum is %s bytes.' % size_data_total
+            message_queue.put(text)
+
+        eeprom_regex = regex_info.get('recipe.size.regex.eeprom', '')
+        if eeprom_regex:
+            pattern = get_size_regex(eeprom_regex)
+            result = pattern.findall(stdout)
+            if result:
+                try:
+                    int(result[0])
+                except TypeError:
+                    result = result[0][1:]
+                size_eeprom = sum(int(n) for n in result)
+                text = 'EEPROM uses %s bytes.' % regular_numner(size_eeprom)
+                message_queue.put(text)
 
 
 def build_sketch(build_info):
@@ -1057,8 +1640,8 @@ def build_sketch(build_info):
     message_queue.put(msg)
     msg = '[Step 1] Check Toolchain.'
     message_queue.put(msg)
-    platform_info = selected.get_sel_platform_info(arduino_info)
-    is_ready = check_tools_deps(platform_info)
+    selection = selected.get_selection(arduino_info)
+    is_ready = check_tools_deps(selection.platform_info)
     if is_ready:
         msg = '[Step 2] Find all source files.'
         message_queue.put(msg)
@@ -1072,18 +1655,27 @@ def build_sketch(build_info):
             prj.gen_arduino_tmp_file()
             prj_src_dir_paths.append(prj.get_build_path())
 
-        all_src_paths = []
-        used_headers = []
-        include_dirs = get_tool_include_dirs()
-
-        h_path_info = get_h_path_info(prj)
-        all_src_paths, used_headers, dep_dirs = \
-            get_dep_cpps(prj_src_dir_paths, h_path_info, all_src_paths,
-                         used_headers, include_dirs)
+        all_src_paths, include_dirs, missing_headers = \
+            find_src_paths(prj, prj_src_dir_paths)
+        resolved = resolve_missing_headers(missing_headers)
+        if resolved:
+            report_missing_headers(resolved)
+            if arduino_info['settings'].get('auto_install_libraries'):
+                arch = get_sel_arch()
+                lib_infos = []
+                for header in sorted(resolved):
+                    lib_info = resolved[header][0]
+                    if library_catalog.get_arch_rank(lib_info, arch) > 1:
+                        continue
+                    if lib_info not in lib_infos:
+                        lib_infos.append(lib_info)
+                if lib_infos and install_libraries(lib_infos):
+                    all_src_paths, include_dirs, missing_headers = \
+                        find_src_paths(prj, prj_src_dir_paths)
         all_src_paths = [p.replace('\\', '/') for p in all_src_paths]
 
-        core_src_path = selected.get_sel_core_src_path(arduino_info)
-        variant_path = selected.get_sel_variant_path(arduino_info)
+        core_src_path = selection.core_src_path
+        variant_path = selection.variant_path
         if core_src_path not in include_dirs:
             include_dirs.append(core_src_path)
         if variant_path not in include_dirs:
@@ -1092,11 +1684,35 @@ def build_sketch(build_info):
         arduino_info['include_paths'] = include_dirs
 
         cmds_info = selected.get_commands_info(arduino_info, prj)
-        cmds, msgs = get_build_cmds(cmds_info, prj_build_path, all_src_paths)
+        variants_errors = arduino_info.get('variants_errors', {})
+        for key in variants_errors.get('cyclic', []):
+            msg = '[Error] Cyclic variable {%s} in build recipes.' % key
+            message_queue.put(msg)
+        if bool(arduino_info['settings'].get('verbose_build')):
+            for key in variants_errors.get('unresolved', []):
+                msg = '[Warning] Unresolved variable {%s}.' % key
+                message_queue.put(msg)
+        pch_path = ''
+        if arduino_info['settings'].get('precompile_header') and \
+                prj.is_arduino_project():
+            pch_path = build_pch(cmds_info, prj_build_path, core_src_path,
+                                 variant_path)
 
         msg = '[Step 3] Start building.'
         message_queue.put(msg)
-        is_ok = run_build_commands(cmds, msgs)
+        while True:
+            src_paths, unity_info = apply_unity_build(all_src_paths,
+                                                      prj_build_path)
+            cmds, msgs = get_build_cmds(cmds_info, prj_build_path, src_paths,
+                                        pch_path)
+            is_ok, failed_cmd = run_build_commands(cmds, msgs)
+            name = get_failed_unity_library(unity_info, failed_cmd)
+            if is_ok or not name:
+                break
+            fall_back_from_unity(name)
+        if is_ok:
+            is_ok, size_output = gen_bins(cmds_info, prj_build_path,
+                                          src_paths)
         if is_ok:
             arduino_info['settings'].set('full_build', False)
             size_cmd = cmds_info.get('recipe.size.pattern', '')
@@ -1109,7 +1725,8 @@ def build_sketch(build_info):
                 regex = cmds_info.get(key, '')
                 if regex:
                     regex_info[key] = regex
-            run_size_command(size_cmd, regex_info)
+            run_size_command(size_cmd, regex_info, size_output)
+            report_size_analysis(prj_build_path)
             if upload_mode == 'upload':
                 upload_cmd = cmds_info.get('upload.pattern', '')
                 sketch_uploader.put(upload_cmd)
@@ -1192,27 +1809,100 @@ def print_boards_info(arduino_info):
             #     value_info = option_info.get(value_name, {})
 
 
+def check_pkg_index(key):
+    """."""
+    arduino_dir_path = arduino_info['arduino_app_path']
+    url = arduino_info['package_index'].get(key)
+    validators = arduino_info['etags'].get(key)
+    if not isinstance(validators, dict):
+        validators = {}
+    state, validators = downloader.download_if_modified(url, arduino_dir_path,
+                                                        validators)
+    return key, url, state, validators
+
+
 def check_pkgs():
     """."""
     global arduino_info
     is_changed = False
     arduino_dir_path = arduino_info['arduino_app_path']
-    for key in arduino_info['package_index'].get_keys():
-        url = arduino_info['package_index'].get(key)
-        remote_etag = downloader.get_remote_etag(url)
-        if remote_etag:
-            local_etag = arduino_info['etags'].get(key)
-            if remote_etag != local_etag:
-                is_done = downloader.download(url, arduino_dir_path,
-                                              message_queue.put,
-                                              mode='replace')
-                if is_done:
-                    arduino_info['etags'].set(key, remote_etag)
-                    is_changed = True
+    keys = list(arduino_info['package_index'].get_keys())
+    if keys:
+        workers = min(const.INDEX_CHECK_WORKERS, len(keys))
+        with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(check_pkg_index, keys))
+
+        for key, url, state, validators in results:
+            if state == 'modified':
+                arduino_info['etags'].set(key, validators)
+                message_queue.put('[%s] Package index updated.' % url)
+                is_changed = True
     if is_changed:
         index_files_info = get_index_files_info(arduino_dir_path)
         arduino_info.update(index_files_info)
-        st_menu.update_install_platform_menu(arduino_info)
+        selected.invalidate_selection()
+        menu_refresher.mark('install_platform')
+
+
+def check_libs():
+    """."""
+    catalog = arduino_info['library_catalog']
+    validators = arduino_info['etags'].get('library_index')
+    if not isinstance(validators, dict):
+        validators = {}
+    state, validators = catalog.update(validators)
+    if state == 'modified':
+        arduino_info['etags'].set('library_index', validators)
+        message_queue.put('[%s] Library index updated.' %
+                          const.LIBRARY_INDEX_URL_GZ)
+
+
+def get_sel_arch():
+    """."""
+    sel_pkg = arduino_info['selected'].get('package')
+    sel_ptfm = arduino_info['selected'].get('platform')
+    return selected.get_platform_arch_by_name(arduino_info, sel_pkg,
+                                              sel_ptfm)
+
+
+def search_libraries(query):
+    """."""
+    catalog = arduino_info['library_catalog']
+    if not catalog.is_ready():
+        message_queue.put('Library index is not available yet.')
+        return []
+    return catalog.search(query, arch=get_sel_arch(),
+                          limit=const.LIBRARY_SEARCH_LIMIT)
+
+
+def install_library(lib_info):
+    """."""
+    name = lib_info.get('name', '')
+    version = lib_info.get('version', '')
+    url = lib_info.get('url', '')
+    if not (name and version and url):
+        return False
+
+    sketchbook_path = arduino_info['sketchbook_path']
+    libraries_path = os.path.join(sketchbook_path, 'libraries')
+    library_path = os.path.join(libraries_path, name.replace(' ', '_'))
+    if os.path.exists(library_path):
+        msg = '[%s] %s is already installed.' % (name, library_path)
+        message_queue.put(msg)
+        return False
+
+    arduino_app_path = arduino_info['arduino_app_path']
+    down_path = os.path.join(arduino_app_path, 'staging', 'libraries')
+    message_queue.put('[%s] %s: Installation started.' % (name, version))
+    is_done = installer.install(url, library_path, down_path,
+                                lib_info.get('checksum', ''),
+                                lib_info.get('size', 0), message_queue.put,
+                                connections=const.DOWNLOAD_CONNECTIONS)
+    if is_done:
+        message_queue.put('[%s] %s: Installation completed.' %
+                          (name, version))
+        menu_refresher.mark('libraries')
+    return is_done
 
 
 def init():
@@ -1245,9 +1935,30 @@ def init():
     if not arduino_info['package_index'].get('arduino'):
         arduino_info['package_index'].set('arduino', const.PACKAGE_INDEX_URL)
 
+    packages_path = os.path.join(arduino_dir_path, 'packages')
+    tools_file_path = os.path.join(arduino_dir_path, 'tools.stino-settings')
+    arduino_info['tools_index'] = tools_index.ToolsIndex(tools_file_path,
+                                                         packages_path)
+
+    installed_file_path = os.path.join(arduino_dir_path,
+                                       'installed.stino-settings')
+    arduino_info['packages_index'] = \
+        packages_index.PackagesIndex(installed_file_path, packages_path)
+
+    arduino_info['board_search'] = search_index.SearchIndex()
+
+    catalog_path = os.path.join(arduino_dir_path, 'library_catalog')
+    arduino_info['library_catalog'] = \
+        library_catalog.LibraryCatalog(catalog_path,
+                                       const.LIBRARY_INDEX_URL_GZ)
+
+    store_path = os.path.join(arduino_dir_path, 'store')
+    arduino_info['blob_store'] = blob_store.BlobStore(store_path)
+
     # 1. init packages info
     index_files_info = get_index_files_info(arduino_dir_path)
     arduino_info.update(index_files_info)
+    selected.invalidate_selection()
 
     installed_packages_info = get_installed_packages_info(arduino_info)
     arduino_info.update(installed_packages_info)
@@ -1287,17 +1998,32 @@ def init():
     st_menu.update_language_menu(arduino_info)
 
 
-message_queue = task_queue.TaskQueue(st_panel.StPanel().write)
+message_queue = task_queue.TaskQueue(st_panel.StPanel().write,
+                                     combine=task_queue.join_lines)
 message_queue.put('Thanks for supporting Stino!')
 
+size_regexes = {}
+compiler_include_dirs = {}
 arduino_info = {}
+menu_refresher = st_menu.MenuRefresher(arduino_info)
 init()
 
 pkgs_checker = task_listener.TaskListener(task=check_pkgs,
-                                          delay=const.REMOTE_CHECK_PERIOD)
+                                          delay=const.REMOTE_CHECK_PERIOD,
+                                          jitter=const.REMOTE_CHECK_JITTER,
+                                          background=True)
 pkgs_checker.start()
 
+libs_checker = task_listener.TaskListener(task=check_libs,
+                                          delay=const.REMOTE_CHECK_PERIOD,
+                                          jitter=const.REMOTE_CHECK_JITTER,
+                                          background=True)
+libs_checker.start()
+
 platform_tool_downloader = downloader.DownloadQueue(download_platform_tool)
+platform_tools_installer = downloader.DownloadQueue(install_tools)
+library_installer = downloader.DownloadQueue(install_library)
+tools_store_cleaner = task_queue.TaskQueue(gc_blob_store)
 ide_importer = task_queue.TaskQueue(import_avr_platform)
 sketch_builder = task_queue.TaskQueue(build_sketch)
 sketch_uploader = task_queue.TaskQueue(upload_sketch)
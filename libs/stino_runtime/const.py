@@ -8,3 +8,15 @@ LIBRARY_INDEX_URL = \
 LIBRARY_INDEX_URL_GZ = \
     'http://downloads.arduino.cc/libraries/library_index.json.gz'
 REMOTE_CHECK_PERIOD = 1800
+REMOTE_CHECK_JITTER = 120
+MENU_REFRESH_DELAY = 0.3
+MENU_REFRESH_MAX_DELAY = 2.0
+INDEX_CHECK_WORKERS = 4
+DOWNLOAD_CONNECTIONS = 4
+INSTALL_WORKERS = 4
+BOARD_SEARCH_LIMIT = 200
+LIBRARY_SEARCH_LIMIT = 200
+LIBRARY_CANDIDATES = 3
+UNITY_MAX_FILES = 16
+SIZE_HISTORY = 50
+SIZE_TOP_SYMBOLS = 10
@@ -10,8 +10,12 @@ from __future__ import unicode_literals
 
 import os
 import re
+import types
+import threading
+import collections
 
 from base_utils import plain_params_file
+from base_utils import tools_index as tools_index_file
 
 
 def get_package_names(pkgs_info):
@@ -66,26 +70,18 @@ def get_platform_info(pkgs_info, pkg_name, ptfm_name, ptfm_ver):
 
 def get_platform_name_by_arch(arduino_info, pkg_name, ptfm_arch):
     """."""
-    ptfm_name = ''
     pkgs_info = arduino_info.get('packages', {})
-    ptfm_names = get_platform_names(pkgs_info, pkg_name)
-    ptfm_arches = get_platform_arches(pkgs_info, pkg_name)
-    if ptfm_arch in ptfm_arches:
-        index = ptfm_arches.index(ptfm_arch)
-        ptfm_name = ptfm_names[index]
-    return ptfm_name
+    package_info = get_package_info(pkgs_info, pkg_name)
+    platforms_info = package_info.get('platforms', {})
+    return platforms_info.get('arch_names', {}).get(ptfm_arch, '')
 
 
 def get_platform_arch_by_name(arduino_info, pkg_name, ptfm_name):
     """."""
-    ptfm_arch = ''
     pkgs_info = arduino_info.get('packages', {})
-    ptfm_names = get_platform_names(pkgs_info, pkg_name)
-    ptfm_arches = get_platform_arches(pkgs_info, pkg_name)
-    if ptfm_name in ptfm_names:
-        index = ptfm_names.index(ptfm_name)
-        ptfm_arch = ptfm_arches[index]
-    return ptfm_arch
+    package_info = get_package_info(pkgs_info, pkg_name)
+    platforms_info = package_info.get('platforms', {})
+    return platforms_info.get('name_arches', {}).get(ptfm_name, '')
 
 
 def get_sel_platform_info(arduino_info):
@@ -103,7 +99,7 @@ def get_sel_board_info(arduino_info):
     sel_board = arduino_info['selected'].get('board')
     board_info = arduino_info['boards'].get(sel_board, {})
 
-    sel_board_info = board_info.get('generic', {})
+    sel_board_info = dict(board_info.get('generic', {}))
     options = board_info.get('options', [])
     for option in options:
         key = 'option_%s' % option
@@ -133,25 +129,36 @@ def get_sel_tools_info(arduino_info, platform_info):
     """."""
     tools_info = {'names': []}
 
+    tools_index = arduino_info.get('tools_index')
+    if tools_index:
+        tools_index.refresh()
     arduino_app_path = arduino_info['arduino_app_path']
     packages_path = os.path.join(arduino_app_path, 'packages')
     tools_deps = platform_info.get('toolsDependencies', [])
     for tool_info in tools_deps:
+        tool_info = dict(tool_info)
         package = tool_info.get('packager', '')
         name = tool_info.get('name', '')
         version = tool_info.get('version', '')
         path = ''
+        include_dirs = []
 
         if package and name and version:
-            package_path = os.path.join(packages_path, package)
-            if os.path.isdir(package_path):
+            if tools_index:
+                path = tools_index.get_tool_path(package, name, version)
+                include_dirs = tools_index.get_include_dirs(package, name,
+                                                            version)
+            else:
+                package_path = os.path.join(packages_path, package)
                 tools_path = os.path.join(package_path, 'tools')
                 tool_path = os.path.join(tools_path, name)
-                if os.path.isdir(tool_path):
-                    path = os.path.join(tool_path, version)
-                    if not os.path.isdir(path):
-                        path = ''
+                path = os.path.join(tool_path, version)
+                if os.path.isdir(path):
+                    include_dirs = tools_index_file.find_include_dirs(path)
+                else:
+                    path = ''
         tool_info['path'] = path
+        tool_info['include_dirs'] = include_dirs
         tools_info['names'].append(name)
         tools_info[name] = tool_info
     return tools_info
@@ -199,63 +206,217 @@ def get_sel_variant_path(arduino_info):
     return variant_path
 
 
+Selection = collections.namedtuple('Selection',
+                                   ['platform_info', 'platform_path', 'arch',
+                                    'board_info', 'board_options',
+                                    'programmer_info', 'core_src_path',
+                                    'variant_path', 'tools_info'])
+
+_selection = {'key': None, 'value': None}
+_selection_lock = threading.Lock()
+
+
+def freeze(obj):
+    """."""
+    if isinstance(obj, (dict, types.MappingProxyType)):
+        obj = types.MappingProxyType(dict((k, freeze(v))
+                                          for k, v in obj.items()))
+    elif isinstance(obj, (list, tuple)):
+        obj = tuple(freeze(v) for v in obj)
+    return obj
+
+
+def get_selection_key(arduino_info):
+    """."""
+    sel_data = arduino_info['selected'].get_data()
+    return tuple(sorted((k, str(v)) for k, v in sel_data.items()))
+
+
+def make_selection(arduino_info):
+    """."""
+    sel_pkg = arduino_info['selected'].get('package')
+    sel_ptfm = arduino_info['selected'].get('platform')
+    platform_info = get_sel_platform_info(arduino_info)
+    selection = Selection(
+        platform_info=freeze(platform_info),
+        platform_path=get_sel_platform_path(arduino_info),
+        arch=get_platform_arch_by_name(arduino_info, sel_pkg, sel_ptfm),
+        board_info=freeze(get_sel_board_info(arduino_info)),
+        board_options=freeze(get_sel_board_options(arduino_info)),
+        programmer_info=freeze(get_sel_programmer_info(arduino_info)),
+        core_src_path=get_sel_core_src_path(arduino_info),
+        variant_path=get_sel_variant_path(arduino_info),
+        tools_info=freeze(get_sel_tools_info(arduino_info, platform_info)))
+    return selection
+
+
+def get_selection(arduino_info):
+    """."""
+    key = get_selection_key(arduino_info)
+    with _selection_lock:
+        if _selection['value'] is None or _selection['key'] != key:
+            _selection['value'] = make_selection(arduino_info)
+            _selection['key'] = key
+        selection = _selection['value']
+    return selection
+
+
+def invalidate_selection():
+    """."""
+    with _selection_lock:
+        _selection['key'] = None
+        _selection['value'] = None
+
+
+VARIANT_PATTERN = re.compile(r'\{\S+?}')
+LATE_VARIANTS = ['source_file', 'object_file', 'object_files']
+
+_templates = {}
+_commands_cache = {}
+
+
 def get_variants(text):
     """."""
-    pattern_text = r'\{\S+?}'
-    pattern = re.compile(pattern_text)
-    variants = pattern.findall(text)
+    variants = VARIANT_PATTERN.findall(text)
     return variants
 
 
+def parse_template(text):
+    """."""
+    tokens = _templates.get(text)
+    if tokens is None:
+        tokens = []
+        start = 0
+        for match in VARIANT_PATTERN.finditer(text):
+            if match.start() > start:
+                tokens.append((False, text[start:match.start()]))
+            tokens.append((True, match.group()[1:-1]))
+            start = match.end()
+        if start < len(text):
+            tokens.append((False, text[start:]))
+        tokens = tuple(tokens)
+        _templates[text] = tokens
+    return tokens
+
+
+class VariantsResolver(object):
+    """."""
+
+    def __init__(self, info, prefix=''):
+        """."""
+        self._info = info
+        self._prefix = prefix
+        self._values = {}
+        self._resolving = []
+        self.cyclic = []
+        self.unresolved = []
+
+    def _get_info_key(self, key):
+        """."""
+        info_key = None
+        if self._prefix and (self._prefix + key) in self._info:
+            info_key = self._prefix + key
+        elif key in self._info:
+            info_key = key
+        return info_key
+
+    def resolve(self, key):
+        """."""
+        if key in self._values:
+            return self._values[key]
+
+        info_key = self._get_info_key(key)
+        if info_key is None:
+            if key not in self.unresolved:
+                self.unresolved.append(key)
+            return None
+
+        if key in self._resolving:
+            if key not in self.cyclic:
+                self.cyclic.append(key)
+            return None
+
+        self._resolving.append(key)
+        value = self.expand(str(self._info[info_key]))
+        self._resolving.pop()
+        self._values[key] = value
+        return value
+
+    def expand(self, text):
+        """."""
+        parts = []
+        for is_variant, token in parse_template(text):
+            if is_variant:
+                value = self.resolve(token)
+                if value is None:
+                    value = '{%s}' % token
+                parts.append(value)
+            else:
+                parts.append(token)
+        return ''.join(parts)
+
+
 def replace_variants(text, info, prefix=''):
     """."""
-    variants = get_variants(text)
-    for variant in variants:
-        go_replace = False
-        key = variant[1:-1]
-
-        if key in info:
-            value = info[key]
-            go_replace = True
-        if prefix:
-            prefix_key = prefix + key
-            if prefix_key in info:
-                value = info[prefix_key]
-                go_replace = True
-
-        if go_replace:
-            value = replace_variants(value, info, prefix)
-            text = text.replace(variant, value)
-    return text
+    resolver = VariantsResolver(info, prefix)
+    return resolver.expand(text)
 
 
-def get_commands_info(arduino_info, project):
+def expand_commands(all_cmds_info, all_info, tool_names):
     """."""
     cmds_info = {}
+    errors = {'cyclic': [], 'unresolved': []}
+    resolvers = {'': VariantsResolver(all_info)}
+    for tool_name in tool_names:
+        tool_id = 'tools.%s.' % tool_name
+        resolvers[tool_id] = VariantsResolver(all_info, tool_id)
+
+    for key in all_cmds_info:
+        if key.startswith('recipe.') or key.startswith('preproc.'):
+            cmds_info[key] = resolvers[''].expand(all_cmds_info[key])
+        elif key.startswith('tools.'):
+            for tool_name in tool_names:
+                tool_id = 'tools.%s.' % tool_name
+                tool_remote_id = 'tools.%s_remote.' % tool_name
+                if (key.startswith(tool_id) or key.startswith(tool_remote_id))\
+                        and key.endswith('pattern'):
+                    cmd = resolvers[tool_id].expand(all_cmds_info[key])
+                    cmds_info[key.replace(tool_id, '')] = cmd
+
+    for resolver in resolvers.values():
+        for key in resolver.cyclic:
+            if key not in errors['cyclic']:
+                errors['cyclic'].append(key)
+        for key in resolver.unresolved:
+            if key not in errors['unresolved'] and key not in LATE_VARIANTS:
+                errors['unresolved'].append(key)
+    return cmds_info, errors
+
+
+def get_commands_info(arduino_info, project):
+    """."""
     all_cmds_info = {}
-    platform_path = get_sel_platform_path(arduino_info)
+    selection = get_selection(arduino_info)
+    platform_path = selection.platform_path
     if platform_path:
         cmd_file_path = os.path.join(platform_path, 'platform.txt')
         cmd_file = plain_params_file.PlainParamsFile(cmd_file_path)
         all_cmds_info = cmd_file.get_info()
 
-    platform_info = get_sel_platform_info(arduino_info)
-    board_info = get_sel_board_info(arduino_info)
-    programmer_info = get_sel_programmer_info(arduino_info)
+    board_info = selection.board_info
+    programmer_info = selection.programmer_info
 
     prj_name = project.get_name()
     arduino_app_path = arduino_info['arduino_app_path']
     build_path = os.path.join(arduino_app_path, 'build')
     platform_system_path = os.path.join(platform_path, 'system')
-    platform_variant_path = get_sel_variant_path(arduino_info)
+    platform_variant_path = selection.variant_path
 
     prj_build_path = os.path.join(build_path, prj_name)
     serial_port = arduino_info['selected'].get('serial_port', '')
     verbose_upload = bool(arduino_info['settings'].get('verbose_upload'))
     verify_code = bool(arduino_info['settings'].get('verify_code'))
 
-    sel_pkg = arduino_info['selected'].get('package')
-    sel_ptfm = arduino_info['selected'].get('platform')
     include_paths = arduino_info.get('include_paths', [])
     includes = ['"-I%s"' % p.replace('\\', '/') for p in include_paths]
 
@@ -265,8 +426,7 @@ def get_commands_info(arduino_info, project):
     all_info['runtime.platform.path'] = platform_path.replace('\\', '/')
     all_info['build.system.path'] = platform_system_path.replace('\\', '/')
     all_info['build.variant.path'] = platform_variant_path.replace('\\', '/')
-    all_info['build.arch'] = get_platform_arch_by_name(arduino_info,
-                                                       sel_pkg, sel_ptfm)
+    all_info['build.arch'] = selection.arch
     all_info['serial.port'] = str(serial_port)
     all_info['serial.port.file'] = str(serial_port)
     all_info['runtime.ide.version'] = '20000'
@@ -279,7 +439,7 @@ def get_commands_info(arduino_info, project):
     all_info.update(programmer_info)
     all_info.update(board_info)
 
-    tools_info = get_sel_tools_info(arduino_info, platform_info)
+    tools_info = selection.tools_info
     tool_names = tools_info.get('names', [])
     for tool_name in tool_names:
         tool_info = tools_info.get(tool_name, {})
@@ -315,20 +475,13 @@ def get_commands_info(arduino_info, project):
             all_info['%sprogram.verify' % tool_id] = \
                 all_info.get('%sprogram.params.noverify', '')
 
-    for key in all_cmds_info:
-        if key.startswith('recipe.') or key.startswith('preproc.'):
-            cmd = all_cmds_info[key]
-            cmd = replace_variants(cmd, all_info)
-            cmds_info[key] = cmd
-        elif key.startswith('tools.'):
-            for tool_name in tool_names:
-                tool_id = 'tools.%s.' % tool_name
-                tool_remote_id = 'tools.%s_remote.' % tool_name
-                if (key.startswith(tool_id) or key.startswith(tool_remote_id))\
-                        and key.endswith('pattern'):
-                    cmd = all_cmds_info[key]
-                    cmd = replace_variants(cmd, all_info, tool_id)
-
-                    key = key.replace(tool_id, '')
-                    cmds_info[key] = cmd
-    return cmds_info
+    cache_key = (tuple(sorted(all_cmds_info.items())),
+                 tuple(sorted(all_info.items())), tuple(tool_names))
+    if cache_key not in _commands_cache:
+        if len(_commands_cache) > 16:
+            _commands_cache.clear()
+        _commands_cache[cache_key] = expand_commands(all_cmds_info, all_info,
+                                                     tool_names)
+    cmds_info, errors = _commands_cache[cache_key]
+    arduino_info['variants_errors'] = errors
+    return dict(cmds_info)
@@ -10,214 +10,177 @@ from __future__ import unicode_literals
 
 import os
 import glob
+import json
 import codecs
+import threading
 from base_utils import file
+from base_utils import dir_index
+from base_utils import task_listener
 from base_utils import default_st_dirs
 from . import const
 from . import selected
 
 plugin_name = const.PLUGIN_NAME
+examples_index = dir_index.DirIndex()
 
 
-def write_menu(menu_type, menu_text):
+def separator():
     """."""
+    return {'caption': '-'}
+
+
+def menu_item(caption, item_id, command='', args=None, checkbox=False,
+              children=None):
+    """."""
+    item = {'caption': caption, 'id': item_id}
+    if command:
+        item['command'] = command
+    if args is not None:
+        item['args'] = args
+    if checkbox:
+        item['checkbox'] = True
+    if children is not None:
+        item['children'] = children
+    return item
+
+
+def arduino_menu(caption, item_id, children):
+    """Wrap children in Arduino > caption, as every Stino menu file is."""
+    sub_menu = menu_item(caption, item_id, children=children)
+    main_menu = {'caption': 'Arduino', 'mnemonic': 'A', 'id': 'arduino',
+                 'children': [sub_menu]}
+    return [main_menu]
+
+
+def dumps_menu(menu):
+    """."""
+    return json.dumps(menu, indent='\t', ensure_ascii=False,
+                      sort_keys=True) + '\n'
+
+
+def write_menu(menu_type, menu):
+    """Write the menu file atomically, and only if its content changed."""
     file_name = 'Main.sublime-menu'
     menu_path = default_st_dirs.get_plugin_menu_path(plugin_name)
     dir_path = os.path.join(menu_path, menu_type)
     file.check_dir(dir_path)
     file_path = os.path.join(dir_path, file_name)
-    with codecs.open(file_path, 'w', 'utf-8') as f:
-        f.write(menu_text)
+
+    text = dumps_menu(menu)
+    if os.path.isfile(file_path):
+        with codecs.open(file_path, 'r', 'utf-8') as f:
+            try:
+                if f.read() == text:
+                    return False
+            except UnicodeDecodeError:
+                pass
+
+    tmp_file_path = file_path + '.stino-tmp'
+    with codecs.open(tmp_file_path, 'w', 'utf-8') as f:
+        f.write(text)
+    os.replace(tmp_file_path, file_path)
+    return True
+
+
+def list_dir_paths(path):
+    """."""
+    paths = glob.glob(path + '/*')
+    paths = [p for p in paths if os.path.isdir(p)]
+    return paths
 
 
 def update_sketchbook_menu(arduino_info):
     """."""
     none_sketches = ['libraries', 'examples']
     sketchbook_path = arduino_info.get('sketchbook_path')
-    sketch_paths = glob.glob(sketchbook_path + '/*')
-    sketch_paths = [p for p in sketch_paths if os.path.isdir(p)]
-
-    text = '\t' * 0 + '[\n'
-    text += '\t' * 1 + '{\n'
-    text += '\t' * 2 + '"caption": "Arduino",\n'
-    text += '\t' * 2 + '"mnemonic": "A",\n'
-    text += '\t' * 2 + '"id": "arduino",\n'
-    text += '\t' * 2 + '"children":\n'
-    text += '\t' * 2 + '[\n'
-    text += '\t' * 3 + '{\n'
-    text += '\t' * 4 + '"caption": "Open Sketch",\n'
-    text += '\t' * 4 + '"id": "stino_sketchbook",\n'
-    text += '\t' * 4 + '"children":\n'
-    text += '\t' * 4 + '[\n'
-    text += '\t' * 5 + '{\n'
-    text += '\t' * 6 + '"caption": "Refresh",\n'
-    text += '\t' * 6 + '"id": "stino_refresh_sketchbook",\n'
-    text += '\t' * 6 + '"command": "stino_refresh_sketchbook"\n'
-    text += '\t' * 5 + '},\n'
-    text += '\t' * 5 + '{\n'
-    text += '\t' * 6 + '"caption": "Change Location...",\n'
-    text += '\t' * 6 + '"id": "stino_change_sketchbook_location",\n'
-    text += '\t' * 6 + '"command": "stino_change_sketchbook_location"\n'
-    text += '\t' * 5 + '},\n'
-    text += '\t' * 5 + '{\n'
-    text += '\t' * 6 + '"caption": "In New Window",\n'
-    text += '\t' * 6 + '"id": "stino_open_in_new_win",\n'
-    text += '\t' * 6 + '"command": "stino_open_in_new_win",\n'
-    text += '\t' * 6 + '"checkbox": true\n'
-    text += '\t' * 5 + '},\n'
-    text += '\t' * 5 + '{"caption": "-"},'
-    text += '\t' * 5 + '{\n'
-    text += '\t' * 6 + '"caption": "New Sketch...",\n'
-    text += '\t' * 6 + '"id": "stino_new_sketch",\n'
-    text += '\t' * 6 + '"command": "stino_new_sketch"\n'
-    text += '\t' * 5 + '},\n'
-    text += '\t' * 5 + '{"caption": "-"}'
+    sketch_paths = list_dir_paths(sketchbook_path)
+
+    items = [menu_item('Refresh', 'stino_refresh_sketchbook',
+                       'stino_refresh_sketchbook'),
+             menu_item('Change Location...',
+                       'stino_change_sketchbook_location',
+                       'stino_change_sketchbook_location'),
+             menu_item('In New Window', 'stino_open_in_new_win',
+                       'stino_open_in_new_win', checkbox=True),
+             separator(),
+             menu_item('New Sketch...', 'stino_new_sketch',
+                       'stino_new_sketch'),
+             separator()]
 
     for sketch_path in sketch_paths:
         sketch_path = sketch_path.replace('\\', '/')
         sketch_name = os.path.basename(sketch_path)
         if sketch_name in none_sketches:
             continue
-        text += ',\n'
-        text += '\t' * 5 + '{\n'
-        text += '\t' * 6 + '"caption": "%s",\n' % sketch_name
-        text += '\t' * 6 + '"id": "stino_sketch_%s",\n' % sketch_name
-        text += '\t' * 6 + '"command": "stino_open_sketch",\n'
-        text += '\t' * 6 + '"args": {"sketch_path": "%s"}\n' % sketch_path
-        text += '\t' * 5 + '}'
-
-    text += '\n' + '\t' * 4 + ']\n'
-    text += '\t' * 3 + '}\n'
-    text += '\t' * 2 + ']\n'
-    text += '\t' * 1 + '}\n'
-    text += '\t' * 0 + ']\n'
+        items.append(menu_item(sketch_name, 'stino_sketch_%s' % sketch_name,
+                               'stino_open_sketch',
+                               {'sketch_path': sketch_path}))
 
-    write_menu('sketchbook', text)
+    menu = arduino_menu('Open Sketch', 'stino_sketchbook', items)
+    write_menu('sketchbook', menu)
 
 
-def get_example_menu_text(level, paths):
-    """."""
-    text = ''
-    for path in paths:
+def get_example_menu_items(dir_path):
+    """Top level entries only, deeper levels open in the examples browser."""
+    items = []
+    for name, path, is_sketch in examples_index.list_dirs(dir_path):
         path = path.replace('\\', '/')
-        name = os.path.basename(path)
-        file_path = os.path.join(path, name + '.ino')
-
-        text += ',\n'
-        text += '\t' * level + '{\n'
-        text += '\t' * (level + 1)
-        text += '"caption": "%s",\n' % name
-        text += '\t' * (level + 1)
-        text += '"id": "stino_example_%s",\n' % name
-        text += '\t' * (level + 1)
-
-        if os.path.isfile(file_path):
-            text += '"command": "stino_open_example",\n'
-            text += '\t' * (level + 1)
-            text += '"args": {"example_path": "%s"}\n' % path
-
+        item_id = 'stino_example_%s' % name
+        if is_sketch:
+            item = menu_item(name, item_id, 'stino_open_example',
+                             {'example_path': path})
         else:
-            next_paths = glob.glob(path + '/*')
-            next_paths = [p for p in next_paths if os.path.isdir(p)]
-            text += '"children":\n'
-            text += '\t' * (level + 1)
-            text += '[\n'
-            text += '\t' * (level + 2)
-            text += '{"caption": "-"}'
-            text += get_example_menu_text(level + 2, next_paths)
-            text += '\t' * (level + 1)
-            text += ']\n'
-
-        text += '\t' * level
-        text += '}'
-    return text
+            item = menu_item(name + '...', item_id, 'stino_browse_examples',
+                             {'dir_path': path})
+        items.append(item)
+    return items
+
+
+def get_library_menu_items(paths):
+    """."""
+    items = []
+    for library_path in paths:
+        library_path = library_path.replace('\\', '/')
+        library_name = os.path.basename(library_path)
+        items.append(menu_item(library_name,
+                               'stino_library_%s' % library_name,
+                               'stino_import_library',
+                               {'library_path': library_path}))
+    return items
 
 
 def update_example_menu(arduino_info):
     """."""
     sketchbook_path = arduino_info.get('sketchbook_path')
     examples_path = os.path.join(sketchbook_path, 'examples')
-    example_paths = glob.glob(examples_path + '/*')
-    example_paths = [p for p in example_paths if os.path.isdir(p)]
-
     libraries_path = os.path.join(sketchbook_path, 'libraries')
-    library_paths = glob.glob(libraries_path + '/*')
-    library_paths = [p for p in library_paths if os.path.isdir(p)]
-
-    text = '\t' * 0 + '[\n'
-    text += '\t' * 1 + '{\n'
-    text += '\t' * 2 + '"caption": "Arduino",\n'
-    text += '\t' * 2 + '"mnemonic": "A",\n'
-    text += '\t' * 2 + '"id": "arduino",\n'
-    text += '\t' * 2 + '"children":\n'
-    text += '\t' * 2 + '[\n'
-    text += '\t' * 3 + '{\n'
-    text += '\t' * 4 + '"caption": "Open Example",\n'
-    text += '\t' * 4 + '"id": "stino_examples",\n'
-    text += '\t' * 4 + '"children":\n'
-    text += '\t' * 4 + '[\n'
-    text += '\t' * 5 + '{\n'
-    text += '\t' * 6 + '"caption": "Refresh",\n'
-    text += '\t' * 6 + '"id": "stino_refresh_examples",\n'
-    text += '\t' * 6 + '"command": "stino_refresh_examples"\n'
-    text += '\t' * 5 + '},\n'
-    text += '\t' * 5 + '{"caption": "-"}'
-    text += get_example_menu_text(5, example_paths)
-    text += ',' + '\t' * 5 + '{"caption": "-"}'
-    text += get_example_menu_text(5, library_paths)
-    text += '\n' + '\t' * 4 + ']\n'
-    text += '\t' * 3 + '}\n'
-    text += '\t' * 2 + ']\n'
-    text += '\t' * 1 + '}\n'
-    text += '\t' * 0 + ']\n'
-
-    write_menu('examples', text)
+
+    items = [menu_item('Refresh', 'stino_refresh_examples',
+                       'stino_refresh_examples'),
+             separator()]
+    items += get_example_menu_items(examples_path)
+    items.append(separator())
+    items += get_example_menu_items(libraries_path)
+
+    menu = arduino_menu('Open Example', 'stino_examples', items)
+    write_menu('examples', menu)
 
 
 def update_library_menu(arduino_info):
     """."""
     sketchbook_path = arduino_info.get('sketchbook_path')
     libraries_path = os.path.join(sketchbook_path, 'libraries')
-    library_paths = glob.glob(libraries_path + '/*')
-    library_paths = [p for p in library_paths if os.path.isdir(p)]
-
-    text = '\t' * 0 + '[\n'
-    text += '\t' * 1 + '{\n'
-    text += '\t' * 2 + '"caption": "Arduino",\n'
-    text += '\t' * 2 + '"mnemonic": "A",\n'
-    text += '\t' * 2 + '"id": "arduino",\n'
-    text += '\t' * 2 + '"children":\n'
-    text += '\t' * 2 + '[\n'
-    text += '\t' * 3 + '{\n'
-    text += '\t' * 4 + '"caption": "Import Library",\n'
-    text += '\t' * 4 + '"id": "stino_import_library",\n'
-    text += '\t' * 4 + '"children":\n'
-    text += '\t' * 4 + '[\n'
-    text += '\t' * 5 + '{\n'
-    text += '\t' * 6 + '"caption": "Refresh",\n'
-    text += '\t' * 6 + '"id": "stino_refresh_libraries",\n'
-    text += '\t' * 6 + '"command": "stino_refresh_libraries"\n'
-    text += '\t' * 5 + '},\n'
-    text += '\t' * 5 + '{"caption": "-"}'
-
-    for library_path in library_paths:
-        library_path = library_path.replace('\\', '/')
-        library_name = os.path.basename(library_path)
-        text += ',\n'
-        text += '\t' * 5 + '{\n'
-        text += '\t' * 6 + '"caption": "%s",\n' % library_name
-        text += '\t' * 6 + '"id": "stino_library_%s",\n' % library_name
-        text += '\t' * 6 + '"command": "stino_import_library",\n'
-        text += '\t' * 6 + '"args": {"library_path": "%s"}\n' % library_path
-        text += '\t' * 5 + '}'
+    library_paths = list_dir_paths(libraries_path)
 
-    text += '\n' + '\t' * 4 + ']\n'
-    text += '\t' * 3 + '}\n'
-    text += '\t' * 2 + ']\n'
-    text += '\t' * 1 + '}\n'
-    text += '\t' * 0 + ']\n'
+    items = [menu_item('Refresh', 'stino_refresh_libraries',
+                       'stino_refresh_libraries'),
+             menu_item('Search Libraries...', 'stino_search_libraries',
+                       'stino_search_libraries'),
+             separator()]
+    items += get_library_menu_items(library_paths)
 
-    write_menu('libraries', text)
+    menu = arduino_menu('Import Library', 'stino_import_library', items)
+    write_menu('libraries', menu)
 
 
 def update_install_platform_menu(arduino_info):
@@ -225,84 +188,40 @@ def update_install_platform_menu(arduino_info):
     packages_info = arduino_info.get('packages', {})
     package_names = packages_info.get('names', [])
 
-    text = '\t' * 0 + '[\n'
-    text += '\t' * 1 + '{\n'
-    text += '\t' * 2 + '"caption": "Arduino",\n'
-    text += '\t' * 2 + '"mnemonic": "A",\n'
-    text += '\t' * 2 + '"id": "arduino",\n'
-    text += '\t' * 2 + '"children":\n'
-    text += '\t' * 2 + '[\n'
-    text += '\t' * 3 + '{\n'
-    text += '\t' * 4 + '"caption": "Install Platform",\n'
-    text += '\t' * 4 + '"id": "stino_install_platform",\n'
-    text += '\t' * 4 + '"children":\n'
-    text += '\t' * 4 + '[\n'
-    text += '\t' * 5 + '{\n'
-    text += '\t' * 6 + '"caption": "Refresh",\n'
-    text += '\t' * 6 + '"id": "stino_refresh_install_platform",\n'
-    text += '\t' * 6 + '"command": "stino_refresh_install_platform"\n'
-    text += '\t' * 5 + '},\n'
-    text += '\t' * 5 + '{\n'
-    text += '\t' * 6 + '"caption": "Add Package",\n'
-    text += '\t' * 6 + '"id": "stino_add_package",\n'
-    text += '\t' * 6 + '"command": "stino_add_package"\n'
-    text += '\t' * 5 + '},\n'
-    text += '\t' * 5 + '{\n'
-    text += '\t' * 6 + '"caption": "Import from IDE",\n'
-    text += '\t' * 6 + '"id": "stino_import_avr_platform",\n'
-    text += '\t' * 6 + '"command": "stino_import_avr_platform"\n'
-    text += '\t' * 5 + '},\n'
-    text += '\t' * 5 + '{"caption": "-"}'
+    items = [menu_item('Refresh', 'stino_refresh_install_platform',
+                       'stino_refresh_install_platform'),
+             menu_item('Add Package', 'stino_add_package',
+                       'stino_add_package'),
+             menu_item('Import from IDE', 'stino_import_avr_platform',
+                       'stino_import_avr_platform'),
+             separator()]
 
     for package_name in package_names:
-        text += ',\n'
-        text += '\t' * 5 + '{\n'
-        text += '\t' * 6 + '"caption": "%s",\n' % package_name
-        text += '\t' * 6 + '"id": "stino_package_%s",\n' % package_name
-        text += '\t' * 6 + '"children":\n'
-        text += '\t' * 6 + '[\n'
-        text += '\t' * 7 + '{"caption": "-"}'
-
+        package_items = [separator()]
         package_info = packages_info.get(package_name, {})
         platforms_info = package_info.get('platforms', {})
         platform_names = platforms_info.get('names', [])
         for platform_name in platform_names:
-            text += ',\n'
-            text += '\t' * 7 + '{\n'
-            text += '\t' * 8 + '"caption": "%s",\n' % platform_name
-            text += '\t' * 8 + '"id": "stino_platform_%s",\n' % platform_name
-            text += '\t' * 8 + '"children":\n'
-            text += '\t' * 8 + '['
-            text += '\t' * 9 + '{"caption": "-"}'
-
+            platform_items = [separator()]
             platform_info = platforms_info.get(platform_name, {})
             versions = platform_info.get('versions', [])
             for version in versions:
-                text += ',\n'
-                text += '\t' * 9 + '{'
-                text += '\t' * 10 + '"caption": "%s",\n' % version
-                text += '\t' * 10 + '"id": "stino_platform_%s",\n' % version
-                text += '\t' * 10 + '"command": "stino_install_platform",\n'
-
-                arg_text = '"args": {"package_name": "%s", ' % package_name
-                arg_text += '"platform_name": "%s", ' % platform_name
-                arg_text += '"version": "%s"}\n' % version
-                text += '\t' * 10 + arg_text
-                text += '\t' * 9 + '}'
-
-            text += '\n' + '\t' * 8 + ']'
-            text += '\t' * 7 + '}'
-
-        text += '\n' + '\t' * 6 + ']\n'
-        text += '\t' * 5 + '}'
-
-    text += '\n' + '\t' * 4 + ']\n'
-    text += '\t' * 3 + '}\n'
-    text += '\t' * 2 + ']\n'
-    text += '\t' * 1 + '}\n'
-    text += '\t' * 0 + ']\n'
-
-    write_menu('install_platform', text)
+                args = {'package_name': package_name,
+                        'platform_name': platform_name,
+                        'version': version}
+                platform_items.append(menu_item(version,
+                                                'stino_platform_%s' % version,
+                                                'stino_install_platform',
+                                                args))
+            platform_id = 'stino_platform_%s' % platform_name
+            package_items.append(menu_item(platform_name, platform_id,
+                                           children=platform_items))
+        package_id = 'stino_package_%s' % package_name
+        items.append(menu_item(package_name, package_id,
+                               children=package_items))
+
+    menu = arduino_menu('Install Platform', 'stino_install_platform', items)
+    write_menu('install_platform', menu)
 
 
 def update_platform_menu(arduino_info):
@@ -310,60 +229,28 @@ def update_platform_menu(arduino_info):
     packages_info = arduino_info.get('installed_packages', {})
     package_names = packages_info.get('names', [])
 
-    text = '\t' * 0 + '[\n'
-    text += '\t' * 1 + '{\n'
-    text += '\t' * 2 + '"caption": "Arduino",\n'
-    text += '\t' * 2 + '"mnemonic": "A",\n'
-    text += '\t' * 2 + '"id": "arduino",\n'
-    text += '\t' * 2 + '"children":\n'
-    text += '\t' * 2 + '[\n'
-    text += '\t' * 3 + '{\n'
-    text += '\t' * 4 + '"caption": "Platform",\n'
-    text += '\t' * 4 + '"id": "stino_platform",\n'
-    text += '\t' * 4 + '"children":\n'
-    text += '\t' * 4 + '[\n'
-    text += '\t' * 5 + '{\n'
-    text += '\t' * 6 + '"caption": "Refresh",\n'
-    text += '\t' * 6 + '"id": "stino_refresh_platforms",\n'
-    text += '\t' * 6 + '"command": "stino_refresh_platforms"\n'
-    text += '\t' * 5 + '},\n'
-    text += '\t' * 5 + '{"caption": "-"}'
+    items = [menu_item('Refresh', 'stino_refresh_platforms',
+                       'stino_refresh_platforms'),
+             separator()]
 
     for package_name in package_names:
-        text += ',\n'
-        text += '\t' * 5 + '{\n'
-        text += '\t' * 6 + '"caption": "%s",\n' % package_name
-        text += '\t' * 6 + '"id": "stino_package_%s",\n' % package_name
-        text += '\t' * 6 + '"children":\n'
-        text += '\t' * 6 + '[\n'
-        text += '\t' * 7 + '{"caption": "-"}'
-
+        package_items = [separator()]
         package_info = packages_info.get(package_name, {})
         platforms_info = package_info.get('platforms', {})
         platform_names = platforms_info.get('names', [])
         for platform_name in platform_names:
-            text += ',\n'
-            text += '\t' * 7 + '{\n'
-            text += '\t' * 8 + '"caption": "%s",\n' % platform_name
-            text += '\t' * 8 + '"id": "stino_platform_%s",\n' % platform_name
-            text += '\t' * 8 + '"command": "stino_select_platform",\n'
-
-            arg_text = '"args": {"package_name": "%s", ' % package_name
-            arg_text += '"platform_name": "%s"},\n' % platform_name
-            text += '\t' * 8 + arg_text
-            text += '\t' * 8 + '"checkbox": true\n'
-            text += '\t' * 7 + '}'
+            args = {'package_name': package_name,
+                    'platform_name': platform_name}
+            platform_id = 'stino_platform_%s' % platform_name
+            package_items.append(menu_item(platform_name, platform_id,
+                                           'stino_select_platform', args,
+                                           checkbox=True))
+        package_id = 'stino_package_%s' % package_name
+        items.append(menu_item(package_name, package_id,
+                               children=package_items))
 
-        text += '\n' + '\t' * 6 + ']\n'
-        text += '\t' * 5 + '}'
-
-    text += '\n' + '\t' * 4 + ']\n'
-    text += '\t' * 3 + '}\n'
-    text += '\t' * 2 + ']\n'
-    text += '\t' * 1 + '}\n'
-    text += '\t' * 0 + ']\n'
-
-    write_menu('platform', text)
+    menu = arduino_menu('Platform', 'stino_platform', items)
+    write_menu('platform', menu)
 
 
 def update_version_menu(arduino_info):
@@ -374,91 +261,41 @@ def update_version_menu(arduino_info):
     versions = selected.get_platform_versions(package_infos, sel_package,
                                               sel_platform)
 
-    text = '\t' * 0 + '[\n'
-    text += '\t' * 1 + '{\n'
-    text += '\t' * 2 + '"caption": "Arduino",\n'
-    text += '\t' * 2 + '"mnemonic": "A",\n'
-    text += '\t' * 2 + '"id": "arduino",\n'
-    text += '\t' * 2 + '"children":\n'
-    text += '\t' * 2 + '[\n'
-    text += '\t' * 3 + '{\n'
-    text += '\t' * 4 + '"caption": "Version",\n'
-    text += '\t' * 4 + '"id": "stino_platform_version",\n'
-    text += '\t' * 4 + '"children":\n'
-    text += '\t' * 4 + '[\n'
-    text += '\t' * 5 + '{\n'
-    text += '\t' * 6 + '"caption": "Refresh",\n'
-    text += '\t' * 6 + '"id": "stino_refresh_platform_versions",\n'
-    text += '\t' * 6 + '"command": "stino_refresh_platform_versions"\n'
-    text += '\t' * 5 + '},\n'
-    text += '\t' * 5 + '{\n'
-    text += '\t' * 6 + '"caption": "Check Toolchain",\n'
-    text += '\t' * 6 + '"id": "stino_check_tools",\n'
-    text += '\t' * 6 + '"command": "stino_check_tools"\n'
-    text += '\t' * 5 + '},\n'
-    text += '\t' * 5 + '{"caption": "-"}'
+    items = [menu_item('Refresh', 'stino_refresh_platform_versions',
+                       'stino_refresh_platform_versions'),
+             menu_item('Check Toolchain', 'stino_check_tools',
+                       'stino_check_tools'),
+             menu_item('Clean Up Toolchain Store', 'stino_gc_store',
+                       'stino_gc_store'),
+             separator()]
 
     for version in versions:
-        text += ',\n'
-        text += '\t' * 5 + '{\n'
-        text += '\t' * 6 + '"caption": "%s",\n' % version
-        text += '\t' * 6 + '"id": "stino_version_%s",\n' % version
-        text += '\t' * 6 + '"command": "stino_select_version",\n'
-        text += '\t' * 6 + '"args": {"version": "%s"},\n' % version
-        text += '\t' * 6 + '"checkbox": true\n'
-        text += '\t' * 5 + '}'
-
-    text += '\n' + '\t' * 4 + ']\n'
-    text += '\t' * 3 + '}\n'
-    text += '\t' * 2 + ']\n'
-    text += '\t' * 1 + '}\n'
-    text += '\t' * 0 + ']\n'
+        items.append(menu_item(version, 'stino_version_%s' % version,
+                               'stino_select_version', {'version': version},
+                               checkbox=True))
 
-    write_menu('version', text)
+    menu = arduino_menu('Version', 'stino_platform_version', items)
+    write_menu('version', menu)
 
 
 def update_platform_example_menu(arduino_info):
     """."""
-    example_paths = []
-    library_paths = []
+    items = [menu_item('Refresh', 'stino_refresh_platform_examples',
+                       'stino_refresh_platform_examples'),
+             separator()]
     platform_path = selected.get_sel_platform_path(arduino_info)
     if platform_path:
         examples_path = os.path.join(platform_path, 'examples')
-        example_paths = glob.glob(examples_path + '/*')
-        example_paths = [p for p in example_paths if os.path.isdir(p)]
-
         libraries_path = os.path.join(platform_path, 'libraries')
-        library_paths = glob.glob(libraries_path + '/*')
-        library_paths = [p for p in library_paths if os.path.isdir(p)]
-
-    text = '\t' * 0 + '[\n'
-    text += '\t' * 1 + '{\n'
-    text += '\t' * 2 + '"caption": "Arduino",\n'
-    text += '\t' * 2 + '"mnemonic": "A",\n'
-    text += '\t' * 2 + '"id": "arduino",\n'
-    text += '\t' * 2 + '"children":\n'
-    text += '\t' * 2 + '[\n'
-    text += '\t' * 3 + '{\n'
-    text += '\t' * 4 + '"caption": "Open Platform Example",\n'
-    text += '\t' * 4 + '"id": "stino_platform_examples",\n'
-    text += '\t' * 4 + '"children":\n'
-    text += '\t' * 4 + '[\n'
-    text += '\t' * 5 + '{\n'
-    text += '\t' * 6 + '"caption": "Refresh",\n'
-    text += '\t' * 6 + '"id": "stino_refresh_platform_examples",\n'
-    text += '\t' * 6 + '"command": "stino_refresh_platform_examples"\n'
-    text += '\t' * 5 + '},\n'
-    text += '\t' * 5 + '{"caption": "-"}'
-    text += get_example_menu_text(5, example_paths)
-    text += ',' + '\t' * 5 + '{"caption": "-"}'
-    text += get_example_menu_text(5, library_paths)
-    text += '\n' + '\t' * 4 + ']\n'
-    text += '\t' * 3 + '}\n'
-    text += '\t' * 2 + ']\n'
-    text += '\t' * 1 + '}\n'
-    text += '\t' * 0 + ']\n'
-
-    write_menu('platform_examples', text)
+        items += get_example_menu_items(examples_path)
+        items.append(separator())
+        items += get_example_menu_items(libraries_path)
+    else:
+        items.append(separator())
+
+    menu = arduino_menu('Open Platform Example', 'stino_platform_examples',
+                        items)
+    write_menu('platform_examples', menu)
 
 
 def update_platform_library_menu(arduino_info):
@@ -467,88 +304,35 @@ def update_platform_library_menu(arduino_info):
     platform_path = selected.get_sel_platform_path(arduino_info)
     if platform_path:
         libraries_path = os.path.join(platform_path, 'libraries')
-        library_paths = glob.glob(libraries_path + '/*')
-        library_paths = [p for p in library_paths if os.path.isdir(p)]
-
-    text = '\t' * 0 + '[\n'
-    text += '\t' * 1 + '{\n'
-    text += '\t' * 2 + '"caption": "Arduino",\n'
-    text += '\t' * 2 + '"mnemonic": "A",\n'
-    text += '\t' * 2 + '"id": "arduino",\n'
-    text += '\t' * 2 + '"children":\n'
-    text += '\t' * 2 + '[\n'
-    text += '\t' * 3 + '{\n'
-    text += '\t' * 4 + '"caption": "Import Platform Library",\n'
-    text += '\t' * 4 + '"id": "stino_import_platform_library",\n'
-    text += '\t' * 4 + '"children":\n'
-    text += '\t' * 4 + '[\n'
-    text += '\t' * 5 + '{\n'
-    text += '\t' * 6 + '"caption": "Refresh",\n'
-    text += '\t' * 6 + '"id": "stino_refresh_platform_libraries",\n'
-    text += '\t' * 6 + '"command": "stino_refresh_platform_libraries"\n'
-    text += '\t' * 5 + '},\n'
-    text += '\t' * 5 + '{"caption": "-"}'
-
-    for library_path in library_paths:
-        library_path = library_path.replace('\\', '/')
-        library_name = os.path.basename(library_path)
-        text += ',\n'
-        text += '\t' * 5 + '{\n'
-        text += '\t' * 6 + '"caption": "%s",\n' % library_name
-        text += '\t' * 6 + '"id": "stino_library_%s",\n' % library_name
-        text += '\t' * 6 + '"command": "stino_import_library",\n'
-        text += '\t' * 6 + '"args": {"library_path": "%s"}\n' % library_path
-        text += '\t' * 5 + '}'
+        library_paths = list_dir_paths(libraries_path)
 
-    text += '\n' + '\t' * 4 + ']\n'
-    text += '\t' * 3 + '}\n'
-    text += '\t' * 2 + ']\n'
-    text += '\t' * 1 + '}\n'
-    text += '\t' * 0 + ']\n'
+    items = [menu_item('Refresh', 'stino_refresh_platform_libraries',
+                       'stino_refresh_platform_libraries'),
+             separator()]
+    items += get_library_menu_items(library_paths)
 
-    write_menu('platform_libraries', text)
+    menu = arduino_menu('Import Platform Library',
+                        'stino_import_platform_library', items)
+    write_menu('platform_libraries', menu)
 
 
 def update_board_menu(arduino_info):
     """."""
     board_names = arduino_info['boards'].get('names', [])
 
-    text = '\t' * 0 + '[\n'
-    text += '\t' * 1 + '{\n'
-    text += '\t' * 2 + '"caption": "Arduino",\n'
-    text += '\t' * 2 + '"mnemonic": "A",\n'
-    text += '\t' * 2 + '"id": "arduino",\n'
-    text += '\t' * 2 + '"children":\n'
-    text += '\t' * 2 + '[\n'
-    text += '\t' * 3 + '{\n'
-    text += '\t' * 4 + '"caption": "Board",\n'
-    text += '\t' * 4 + '"id": "stino_board",\n'
-    text += '\t' * 4 + '"children":\n'
-    text += '\t' * 4 + '[\n'
-    text += '\t' * 5 + '{\n'
-    text += '\t' * 6 + '"caption": "Refresh",\n'
-    text += '\t' * 6 + '"id": "stino_refresh_boards",\n'
-    text += '\t' * 6 + '"command": "stino_refresh_boards"\n'
-    text += '\t' * 5 + '},\n'
-    text += '\t' * 5 + '{"caption": "-"}'
+    items = [menu_item('Refresh', 'stino_refresh_boards',
+                       'stino_refresh_boards'),
+             menu_item('Search Boards...', 'stino_search_boards',
+                       'stino_search_boards'),
+             separator()]
 
     for board_name in board_names:
-        text += ',\n'
-        text += '\t' * 5 + '{\n'
-        text += '\t' * 6 + '"caption": "%s",\n' % board_name
-        text += '\t' * 6 + '"id": "stino_board_%s",\n' % board_name
-        text += '\t' * 6 + '"command": "stino_select_board",\n'
-        text += '\t' * 6 + '"args": {"board_name": "%s"},\n' % board_name
-        text += '\t' * 6 + '"checkbox": true\n'
-        text += '\t' * 5 + '}'
-
-    text += '\n' + '\t' * 4 + ']\n'
-    text += '\t' * 3 + '}\n'
-    text += '\t' * 2 + ']\n'
-    text += '\t' * 1 + '}\n'
-    text += '\t' * 0 + ']\n'
+        items.append(menu_item(board_name, 'stino_board_%s' % board_name,
+                               'stino_select_board',
+                               {'board_name': board_name}, checkbox=True))
 
-    write_menu('board', text)
+    menu = arduino_menu('Board', 'stino_board', items)
+    write_menu('board', menu)
 
 
 def update_board_options_menu(arduino_info):
@@ -557,102 +341,44 @@ def update_board_options_menu(arduino_info):
     board_info = arduino_info['boards'].get(sel_board, {})
     options = board_info.get('options', [])
 
-    text = '\t' * 0 + '[\n'
-    text += '\t' * 1 + '{\n'
-    text += '\t' * 2 + '"caption": "Arduino",\n'
-    text += '\t' * 2 + '"mnemonic": "A",\n'
-    text += '\t' * 2 + '"id": "arduino",\n'
-    text += '\t' * 2 + '"children":\n'
-    text += '\t' * 2 + '[\n'
-    text += '\t' * 3 + '{\n'
-    text += '\t' * 4 + '"caption": "Board Options",\n'
-    text += '\t' * 4 + '"id": "board_options",\n'
-    text += '\t' * 4 + '"children":\n'
-    text += '\t' * 4 + '[\n'
-    text += '\t' * 5 + '{\n'
-    text += '\t' * 6 + '"caption": "Refresh",\n'
-    text += '\t' * 6 + '"id": "stino_refresh_board_options",\n'
-    text += '\t' * 6 + '"command": "stino_refresh_board_options"\n'
-    text += '\t' * 5 + '},\n'
-    text += '\t' * 5 + '{"caption": "-"}'
+    items = [menu_item('Refresh', 'stino_refresh_board_options',
+                       'stino_refresh_board_options'),
+             separator()]
 
     for option in options:
-        text += ',\n'
-        text += '\t' * 5 + '{\n'
-        text += '\t' * 6 + '"caption": "%s",\n' % option
-        text += '\t' * 6 + '"id": "stino_board_%s",\n' % option
-        text += '\t' * 6 + '"children":\n'
-        text += '\t' * 6 + '[\n'
-        text += '\t' * 7 + '{"caption": "-"}'
-
+        option_items = [separator()]
         items_info = board_info.get(option, {})
         names = items_info.get('names', [])
         for name in names:
-            text += ',\n'
-            text += '\t' * 7 + '{\n'
-            text += '\t' * 8 + '"caption": "%s",\n' % name
-            text += '\t' * 8 + '"id": "stino_board_option_%s",\n' % name
-            text += '\t' * 8 + '"command": "stino_select_board_option",\n'
-
-            arg_text = '"args": {"option": "%s", ' % option
-            arg_text += '"value": "%s"},\n' % name
-            text += '\t' * 8 + arg_text
-            text += '\t' * 8 + '"checkbox": true\n'
-            text += '\t' * 7 + '}'
-
-        text += '\n' + '\t' * 6 + ']\n'
-        text += '\t' * 5 + '}'
+            option_items.append(menu_item(name,
+                                          'stino_board_option_%s' % name,
+                                          'stino_select_board_option',
+                                          {'option': option, 'value': name},
+                                          checkbox=True))
+        items.append(menu_item(option, 'stino_board_%s' % option,
+                               children=option_items))
 
-    text += '\n' + '\t' * 4 + ']\n'
-    text += '\t' * 3 + '}\n'
-    text += '\t' * 2 + ']\n'
-    text += '\t' * 1 + '}\n'
-    text += '\t' * 0 + ']\n'
-
-    write_menu('board_options', text)
+    menu = arduino_menu('Board Options', 'board_options', items)
+    write_menu('board_options', menu)
 
 
 def update_programmer_menu(arduino_info):
     """."""
     programmer_names = arduino_info['programmers'].get('names', [])
 
-    text = '\t' * 0 + '[\n'
-    text += '\t' * 1 + '{\n'
-    text += '\t' * 2 + '"caption": "Arduino",\n'
-    text += '\t' * 2 + '"mnemonic": "A",\n'
-    text += '\t' * 2 + '"id": "arduino",\n'
-    text += '\t' * 2 + '"children":\n'
-    text += '\t' * 2 + '[\n'
-    text += '\t' * 3 + '{\n'
-    text += '\t' * 4 + '"caption": "Programmer",\n'
-    text += '\t' * 4 + '"id": "stino_programmer",\n'
-    text += '\t' * 4 + '"children":\n'
-    text += '\t' * 4 + '[\n'
-    text += '\t' * 5 + '{\n'
-    text += '\t' * 6 + '"caption": "Refresh",\n'
-    text += '\t' * 6 + '"id": "stino_refresh_programmers",\n'
-    text += '\t' * 6 + '"command": "stino_refresh_programmers"\n'
-    text += '\t' * 5 + '},\n'
-    text += '\t' * 5 + '{"caption": "-"}'
+    items = [menu_item('Refresh', 'stino_refresh_programmers',
+                       'stino_refresh_programmers'),
+             separator()]
 
     for programmer_name in programmer_names:
-        text += ',\n'
-        text += '\t' * 5 + '{\n'
-        text += '\t' * 6 + '"caption": "%s",\n' % programmer_name
-        text += '\t' * 6 + '"id": "stino_programmer_%s",\n' % programmer_name
-        text += '\t' * 6 + '"command": "stino_select_programmer",\n'
-        text += '\t' * 6
-        text += '"args": {"programmer_name": "%s"},\n' % programmer_name
-        text += '\t' * 6 + '"checkbox": true\n'
-        text += '\t' * 5 + '}'
-
-    text += '\n' + '\t' * 4 + ']\n'
-    text += '\t' * 3 + '}\n'
-    text += '\t' * 2 + ']\n'
-    text += '\t' * 1 + '}\n'
-    text += '\t' * 0 + ']\n'
+        items.append(menu_item(programmer_name,
+                               'stino_programmer_%s' % programmer_name,
+                               'stino_select_programmer',
+                               {'programmer_name': programmer_name},
+                               checkbox=True))
 
-    write_menu('programmer', text)
+    menu = arduino_menu('Programmer', 'stino_programmer', items)
+    write_menu('programmer', menu)
 
 
 def update_serial_menu(arduino_info):
@@ -660,43 +386,17 @@ def update_serial_menu(arduino_info):
     serial_ports_info = arduino_info.get('serial_ports', {})
     serial_ports = serial_ports_info.get('names', [])
 
-    text = '\t' * 0 + '[\n'
-    text += '\t' * 1 + '{\n'
-    text += '\t' * 2 + '"caption": "Arduino",\n'
-    text += '\t' * 2 + '"mnemonic": "A",\n'
-    text += '\t' * 2 + '"id": "arduino",\n'
-    text += '\t' * 2 + '"children":\n'
-    text += '\t' * 2 + '[\n'
-    text += '\t' * 3 + '{\n'
-    text += '\t' * 4 + '"caption": "Serial Port",\n'
-    text += '\t' * 4 + '"id": "serial_port",\n'
-    text += '\t' * 4 + '"children":\n'
-    text += '\t' * 4 + '[\n'
-    text += '\t' * 5 + '{\n'
-    text += '\t' * 6 + '"caption": "Refresh",\n'
-    text += '\t' * 6 + '"id": "stino_refresh_serials",\n'
-    text += '\t' * 6 + '"command": "stino_refresh_serials"\n'
-    text += '\t' * 5 + '},\n'
-    text += '\t' * 5 + '{"caption": "-"}'
+    items = [menu_item('Refresh', 'stino_refresh_serials',
+                       'stino_refresh_serials'),
+             separator()]
 
     for serial_port in serial_ports:
-        text += ',\n'
-        text += '\t' * 5 + '{\n'
-        text += '\t' * 6 + '"caption": "%s",\n' % serial_port
-        text += '\t' * 6 + '"id": "stino_serial_%s",\n' % serial_port
-        text += '\t' * 6 + '"command": "stino_select_serial",\n'
-        text += '\t' * 6
-        text += '"args": {"serial_port": "%s"},\n' % serial_port
-        text += '\t' * 6 + '"checkbox": true\n'
-        text += '\t' * 5 + '}'
-
-    text += '\n' + '\t' * 4 + ']\n'
-    text += '\t' * 3 + '}\n'
-    text += '\t' * 2 + ']\n'
-    text += '\t' * 1 + '}\n'
-    text += '\t' * 0 + ']\n'
+        items.append(menu_item(serial_port, 'stino_serial_%s' % serial_port,
+                               'stino_select_serial',
+                               {'serial_port': serial_port}, checkbox=True))
 
-    write_menu('serial', text)
+    menu = arduino_menu('Serial Port', 'serial_port', items)
+    write_menu('serial', menu)
 
 
 def update_language_menu(arduino_info):
@@ -704,40 +404,71 @@ def update_language_menu(arduino_info):
     languages_info = arduino_info.get('languages', {})
     languages = languages_info.get('names', [])
 
-    text = '\t' * 0 + '[\n'
-    text += '\t' * 1 + '{\n'
-    text += '\t' * 2 + '"caption": "Arduino",\n'
-    text += '\t' * 2 + '"mnemonic": "A",\n'
-    text += '\t' * 2 + '"id": "arduino",\n'
-    text += '\t' * 2 + '"children":\n'
-    text += '\t' * 2 + '[\n'
-    text += '\t' * 3 + '{\n'
-    text += '\t' * 4 + '"caption": "Language",\n'
-    text += '\t' * 4 + '"id": "stino_language",\n'
-    text += '\t' * 4 + '"children":\n'
-    text += '\t' * 4 + '[\n'
-    text += '\t' * 5 + '{\n'
-    text += '\t' * 6 + '"caption": "Refresh",\n'
-    text += '\t' * 6 + '"id": "stino_refresh_languages",\n'
-    text += '\t' * 6 + '"command": "stino_refresh_languages"\n'
-    text += '\t' * 5 + '},\n'
-    text += '\t' * 5 + '{"caption": "-"}'
+    items = [menu_item('Refresh', 'stino_refresh_languages',
+                       'stino_refresh_languages'),
+             separator()]
 
     for language in languages:
-        text += ',\n'
-        text += '\t' * 5 + '{\n'
-        text += '\t' * 6 + '"caption": "%s",\n' % language
-        text += '\t' * 6 + '"id": "stino_language_%s",\n' % language
-        text += '\t' * 6 + '"command": "stino_select_language",\n'
-        text += '\t' * 6
-        text += '"args": {"language": "%s"},\n' % language
-        text += '\t' * 6 + '"checkbox": true\n'
-        text += '\t' * 5 + '}'
-
-    text += '\n' + '\t' * 4 + ']\n'
-    text += '\t' * 3 + '}\n'
-    text += '\t' * 2 + ']\n'
-    text += '\t' * 1 + '}\n'
-    text += '\t' * 0 + ']\n'
-
-    write_menu('language', text)
+        items.append(menu_item(language, 'stino_language_%s' % language,
+                               'stino_select_language',
+                               {'language': language}, checkbox=True))
+
+    menu = arduino_menu('Language', 'stino_language', items)
+    write_menu('language', menu)
+
+
+MENU_UPDATERS = [('sketchbook', update_sketchbook_menu),
+                 ('examples', update_example_menu),
+                 ('libraries', update_library_menu),
+                 ('install_platform', update_install_platform_menu),
+                 ('platform', update_platform_menu),
+                 ('version', update_version_menu),
+                 ('platform_examples', update_platform_example_menu),
+                 ('platform_libraries', update_platform_library_menu),
+                 ('board', update_board_menu),
+                 ('board_options', update_board_options_menu),
+                 ('programmer', update_programmer_menu),
+                 ('serial', update_serial_menu),
+                 ('language', update_language_menu)]
+
+
+class MenuRefresher(object):
+    """Regenerate the menus marked dirty, once marks stop coming in."""
+
+    def __init__(self, arduino_info, delay=const.MENU_REFRESH_DELAY,
+                 max_delay=const.MENU_REFRESH_MAX_DELAY):
+        """."""
+        self._arduino_info = arduino_info
+        self._delay = delay
+        self._max_delay = max_delay
+        self._dirty = set()
+        self._first_mark_time = 0
+        self._job = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def mark(self, *menu_types):
+        """."""
+        with self._lock:
+            now = task_listener.clock()
+            if not self._dirty:
+                self._first_mark_time = now
+            self._dirty.update(menu_types)
+            if self._job:
+                self._job.cancel()
+            delay = min(self._delay,
+                        self._first_mark_time + self._max_delay - now)
+            self._job = task_listener.scheduler.schedule(self.refresh,
+                                                         max(delay, 0),
+                                                         background=True)
+
+    def refresh(self):
+        """."""
+        with self._refresh_lock:
+            with self._lock:
+                dirty = self._dirty
+                self._dirty = set()
+                self._job = None
+            for menu_type, update_menu in MENU_UPDATERS:
+                if menu_type in dirty:
+                    update_menu(self._arduino_info)
@@ -8,17 +8,27 @@ from __future__ import print_function
 from __future__ import division
 from __future__ import unicode_literals
 
+import threading
+import collections
 import sublime
 
 from base_utils import sys_info
 
+FRAME_INTERVAL = 33
+MAX_PANEL_SIZE = 2 * 1024 * 1024
+
 
 class StPanel:
     """."""
 
-    def __init__(self, name='stino_panel'):
+    def __init__(self, name='stino_panel', max_size=MAX_PANEL_SIZE):
         """."""
         self._name = name
+        self._max_size = max_size
+        self._pending = collections.deque()
+        self._pending_size = 0
+        self._is_scheduled = False
+        self._lock = threading.Lock()
         self._window = sublime.active_window()
         python_version = sys_info.get_python_version()
         if python_version < 3:
@@ -35,13 +45,37 @@ class StPanel:
         self._panel.settings().set('color_scheme', color_scheme)
 
     def write(self, text):
-        """."""
+        """Queue text, it is appended at the next frame."""
         if not text.endswith('\n'):
             text += '\n'
-        view = self._window.active_view()
+        with self._lock:
+            self._pending.append(text)
+            self._pending_size += len(text)
+            while self._pending_size > self._max_size and \
+                    len(self._pending) > 1:
+                self._pending_size -= len(self._pending.popleft())
+            if not self._is_scheduled:
+                self._is_scheduled = True
+                sublime.set_timeout(self._flush, FRAME_INTERVAL)
+
+    def _flush(self):
+        """Append all queued text in one edit, on the main thread."""
+        with self._lock:
+            text = ''.join(self._pending)
+            self._pending.clear()
+            self._pending_size = 0
+            self._is_scheduled = False
+        if not text:
+            return
+
         self._panel.set_read_only(False)
-        self._panel.run_command('stino_panel_write', {'text': text})
-        panel_name = 'output.' + self._name
-        self._window.run_command("show_panel", {"panel": panel_name})
+        self._panel.run_command('stino_panel_write',
+                                {'text': text, 'max_size': self._max_size})
         self._panel.set_read_only(True)
-        self._window.focus_view(view)
+
+        panel_name = 'output.' + self._name
+        active_panel = getattr(self._window, 'active_panel', None)
+        if active_panel is None or active_panel() != panel_name:
+            view = self._window.active_view()
+            self._window.run_command("show_panel", {"panel": panel_name})
+            self._window.focus_view(view)
@@ -0,0 +1,13 @@
+int counter = 3;
+int buffer[16];
+static const char greeting[] = "hello";
+
+int scale(int x)
+{
+    return x * counter + buffer[x & 15] + greeting[x % 5];
+}
+
+int main(void)
+{
+    return scale(1);
+}
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Doc."""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import re
+import sys
+import threading
+import http.server
+
+libs_path = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'libs')
+if libs_path not in sys.path:
+    sys.path.insert(0, libs_path)
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    """Serve server.files with validators and, optionally, byte ranges."""
+
+    def log_message(self, *args):
+        """."""
+
+    def do_HEAD(self):
+        """."""
+        self.respond(with_body=False)
+
+    def do_GET(self):
+        """."""
+        self.respond(with_body=True)
+
+    def respond(self, with_body):
+        """."""
+        server = self.server
+        server.requests.append((self.command, self.path,
+                                dict(self.headers.items())))
+        info = server.files.get(self.path)
+        if info is None:
+            self.send_error(404)
+            return
+
+        etag = info.get('etag', '')
+        last_modified = info.get('last_modified', '')
+        if_none_match = self.headers.get('If-None-Match')
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if (if_none_match and if_none_match == etag) or \
+                (not if_none_match and if_modified_since and
+                 if_modified_since == last_modified):
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        data = info['data']
+        start, end = 0, len(data) - 1
+        code = 200
+        match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+        if match and server.honor_ranges:
+            start = int(match.group(1))
+            if match.group(2):
+                end = min(int(match.group(2)), end)
+            code = 206
+
+        self.send_response(code)
+        self.send_header('Content-Length', str(end - start + 1))
+        if code == 206:
+            self.send_header('Content-Range',
+                             'bytes %d-%d/%d' % (start, end, len(data)))
+        if server.advertise_ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        if etag:
+            self.send_header('ETag', etag)
+        if last_modified:
+            self.send_header('Last-Modified', last_modified)
+        self.end_headers()
+        if with_body:
+            body = data[start:end + 1]
+            if server.drop_after is not None:
+                body = body[:server.drop_after]
+                server.drop_after = None
+                self.close_connection = True
+            self.wfile.write(body)
+
+
+class StandInServer(http.server.ThreadingHTTPServer):
+    """A localhost HTTP server running in a daemon thread.
+
+    Set drop_after to cut the next response body after that many bytes.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        """."""
+        http.server.ThreadingHTTPServer.__init__(self, ('127.0.0.1', 0),
+                                                 StandInHandler)
+        self.files = {}
+        self.requests = []
+        self.honor_ranges = True
+        self.advertise_ranges = True
+        self.drop_after = None
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def add_file(self, path, data, etag='', last_modified=''):
+        """Serve data at path, return its URL."""
+        self.files[path] = {'data': data, 'etag': etag,
+                            'last_modified': last_modified}
+        return 'http://127.0.0.1:%d%s' % (self.server_address[1], path)
+
+    def get_requests(self, command='GET'):
+        """."""
+        return [r for r in self.requests if r[0] == command]
+
+    def close(self):
+        """."""
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Doc."""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import glob
+import shutil
+import tempfile
+import unittest
+
+import local_server
+from base_utils import downloader
+
+DATA = bytes(bytearray(i * 7 % 251 for i in range(300 * 1024)))
+
+
+class DownloadTest(unittest.TestCase):
+    """Split and resumed downloads against a local stand-in server."""
+
+    def setUp(self):
+        """."""
+        self.server = local_server.StandInServer()
+        self.dir_path = tempfile.mkdtemp()
+        self.url = self.server.add_file('/tool.tar.bz2', DATA, '"v1"')
+        self.file_path = os.path.join(self.dir_path, 'tool.tar.bz2')
+        self.messages = []
+        self.split_min_size = downloader.SPLIT_MIN_SIZE
+        downloader.SPLIT_MIN_SIZE = 64 * 1024
+
+    def tearDown(self):
+        """."""
+        downloader.SPLIT_MIN_SIZE = self.split_min_size
+        self.server.close()
+        shutil.rmtree(self.dir_path)
+
+    def download(self, connections=1):
+        """."""
+        return downloader.download(self.url, self.dir_path,
+                                   self.messages.append,
+                                   connections=connections)
+
+    def get_part_path(self, etag='"v1"', size=len(DATA)):
+        """Path of the single-part temp file for the given version."""
+        remote_info = {'ETag': etag}
+        key = downloader.get_parts_key(remote_info, size)
+        return '%s.stino-down.%s.part' % (self.file_path, key)
+
+    def get_ranges(self):
+        """."""
+        return [r[2].get('Range') for r in self.server.get_requests()]
+
+    def assert_downloaded(self):
+        """."""
+        with open(self.file_path, 'rb') as f:
+            self.assertEqual(f.read(), DATA)
+        self.assertEqual(glob.glob(self.file_path + '.stino-down*'), [])
+
+    def test_split_ranges(self):
+        """."""
+        self.assertEqual(downloader.split_ranges(10, 3),
+                         [(0, 2), (3, 5), (6, 9)])
+
+    def test_multi_part_join(self):
+        """."""
+        self.assertTrue(self.download(connections=4))
+        self.assert_downloaded()
+        ranges = sorted(self.get_ranges())
+        self.assertEqual(len(ranges), 4)
+        self.assertIn('bytes=0-%d' % (len(DATA) // 4 - 1), ranges)
+
+    def test_resume(self):
+        """."""
+        half = len(DATA) // 2
+        with open(self.get_part_path(), 'wb') as f:
+            f.write(DATA[:half])
+        self.assertTrue(self.download())
+        self.assert_downloaded()
+        self.assertEqual(self.get_ranges(),
+                         ['bytes=%d-%d' % (half, len(DATA) - 1)])
+
+    def test_resume_from_unkeyed_part(self):
+        """."""
+        half = len(DATA) // 2
+        with open(self.file_path + '.stino-down', 'wb') as f:
+            f.write(DATA[:half])
+        self.assertTrue(self.download(connections=4))
+        self.assert_downloaded()
+        self.assertEqual(self.get_ranges(),
+                         ['bytes=%d-%d' % (half, len(DATA) - 1)])
+
+    def test_resume_without_validators(self):
+        """."""
+        self.server.files['/tool.tar.bz2']['etag'] = ''
+        half = len(DATA) // 2
+        with open(self.file_path + '.stino-down', 'wb') as f:
+            f.write(DATA[:half])
+        self.assertTrue(self.download())
+        self.assert_downloaded()
+        self.assertEqual(self.get_ranges(),
+                         ['bytes=%d-%d' % (half, len(DATA) - 1)])
+
+    def test_server_ignoring_range(self):
+        """."""
+        self.server.honor_ranges = False
+        with open(self.get_part_path(), 'wb') as f:
+            f.write(DATA[:1000])
+        self.assertTrue(self.download())
+        self.assert_downloaded()
+
+    def test_server_without_ranges(self):
+        """."""
+        self.server.honor_ranges = False
+        self.server.advertise_ranges = False
+        self.assertTrue(self.download(connections=4))
+        self.assert_downloaded()
+        self.assertEqual(len(self.get_ranges()), 1)
+
+    def test_stale_part_of_changed_file(self):
+        """."""
+        stale_path = self.get_part_path(etag='"v0"')
+        with open(stale_path, 'wb') as f:
+            f.write(b'x' * 1000)
+        self.assertTrue(self.download())
+        self.assert_downloaded()
+        self.assertEqual(self.get_ranges(), ['bytes=0-%d' % (len(DATA) - 1)])
+
+    def test_oversized_part(self):
+        """."""
+        with open(self.get_part_path(), 'wb') as f:
+            f.write(DATA + b'stale tail')
+        self.assertTrue(self.download())
+        self.assert_downloaded()
+
+    def test_shrunk_remote_file(self):
+        """."""
+        with open(self.get_part_path(), 'wb') as f:
+            f.write(DATA[:1000])
+        self.server.files['/tool.tar.bz2']['data'] = DATA[:-1000]
+        self.assertTrue(self.download())
+        with open(self.file_path, 'rb') as f:
+            self.assertEqual(f.read(), DATA[:-1000])
+        self.assertEqual(glob.glob(self.file_path + '.stino-down*'), [])
+
+        self.server.files['/tool.tar.bz2']['data'] = DATA
+        self.assertTrue(self.download())
+        self.assert_downloaded()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Doc."""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import sys
+import unittest
+
+libs_path = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'libs')
+if libs_path not in sys.path:
+    sys.path.insert(0, libs_path)
+
+from base_utils import elf_file  # noqa: E402
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'fixtures')
+SAMPLE_NAMES = ['sample64.elf', 'sample64.o', 'sample32.o']
+
+
+def get_rows(text):
+    """Section rows and total of size -A output, without the header."""
+    return [line.split() for line in text.splitlines()[2:] if line.strip()]
+
+
+class ElfFileTest(unittest.TestCase):
+    """Compare the ELF reader with size -A output of the fixtures."""
+
+    def test_sysv_sizes(self):
+        """."""
+        for name in SAMPLE_NAMES:
+            elf_path = os.path.join(FIXTURES_PATH, name)
+            with open(elf_path + '.size.txt') as f:
+                expected = get_rows(f.read())
+            sections = elf_file.ElfFile(elf_path).get_sections()
+            text = elf_file.format_sysv_sizes(elf_path, sections)
+            self.assertEqual(get_rows(text), expected, name)
+
+    def test_symbols(self):
+        """."""
+        elf_path = os.path.join(FIXTURES_PATH, 'sample64.elf')
+        symbols = elf_file.ElfFile(elf_path).get_symbols()
+        sizes = dict((name, (size, section_name))
+                     for name, size, section_name in symbols)
+        self.assertEqual(sizes['buffer'], (64, '.bss'))
+        self.assertEqual(sizes['counter'], (4, '.data'))
+        self.assertEqual(sizes['greeting'], (6, '.rodata'))
+        self.assertIn('main', sizes)
+        self.assertEqual(sizes['scale'][1], '.text')
+
+    def test_not_elf(self):
+        """."""
+        path = os.path.join(FIXTURES_PATH, 'library_index.json')
+        self.assertRaises(elf_file.ElfError, elf_file.ElfFile, path)
+
+
+if __name__ == '__main__':
+    unittest.main()
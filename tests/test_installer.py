@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Doc."""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+
+import io
+import os
+import shutil
+import hashlib
+import tarfile
+import tempfile
+import unittest
+
+import local_server
+from base_utils import installer
+
+PAYLOAD = bytes(bytearray(i * 13 % 256 for i in range(200 * 1024)))
+
+
+def make_tar(members):
+    """Build a tar.gz from (name, data or None, linkname) tuples."""
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode='w:gz') as f:
+        for name, data, linkname in members:
+            info = tarfile.TarInfo(name)
+            if linkname:
+                info.type = tarfile.SYMTYPE
+                info.linkname = linkname
+                f.addfile(info)
+            else:
+                info.size = len(data)
+                f.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+def get_checksum(data):
+    """."""
+    return 'SHA-256:' + hashlib.sha256(data).hexdigest()
+
+
+class InstallerTest(unittest.TestCase):
+    """Install archives served by a local stand-in server."""
+
+    def setUp(self):
+        """."""
+        self.server = local_server.StandInServer()
+        self.dir_path = tempfile.mkdtemp()
+        self.staging_path = os.path.join(self.dir_path, 'staging')
+        self.target_path = os.path.join(self.dir_path, 'tools', 'gcc', '1.0')
+        self.outside_path = os.path.join(self.dir_path, 'outside')
+        os.makedirs(self.outside_path)
+        self.messages = []
+
+    def tearDown(self):
+        """."""
+        self.server.close()
+        shutil.rmtree(self.dir_path)
+
+    def install(self, data, checksum=None, connections=1):
+        """."""
+        url = self.server.add_file('/gcc.tar.gz', data, '"v1"')
+        if checksum is None:
+            checksum = get_checksum(data)
+        return installer.install(url, self.target_path, self.staging_path,
+                                 checksum, len(data), self.messages.append,
+                                 connections=connections)
+
+    def test_stream_install(self):
+        """."""
+        data = make_tar([('gcc/bin/gcc', PAYLOAD, '')])
+        self.assertTrue(self.install(data))
+        with open(os.path.join(self.target_path, 'bin', 'gcc'), 'rb') as f:
+            self.assertEqual(f.read(), PAYLOAD)
+        self.assertEqual(len(self.server.get_requests()), 1)
+
+    def test_interrupted_stream_resumes(self):
+        """."""
+        data = make_tar([('gcc/bin/gcc', PAYLOAD, '')])
+        half = len(data) // 2
+        self.server.drop_after = half
+        self.assertTrue(self.install(data))
+        with open(os.path.join(self.target_path, 'bin', 'gcc'), 'rb') as f:
+            self.assertEqual(f.read(), PAYLOAD)
+        ranges = [r[2].get('Range') for r in self.server.get_requests()]
+        self.assertEqual(ranges, [None, 'bytes=%d-%d' % (half, len(data) - 1)])
+
+    def test_unsafe_links_are_skipped(self):
+        """."""
+        for linkname in (self.outside_path, '../../../../outside'):
+            data = make_tar([('gcc/bin/gcc', b'gcc', ''),
+                             ('gcc/evil', None, linkname),
+                             ('gcc/evil/payload', b'owned', ''),
+                             ('gcc/lib', None, 'bin'),
+                             ('gcc/lib/up', None, '..'),
+                             ('gcc/lib/up/payload', b'owned', '')])
+            for connections in (1, 4):
+                self.assertTrue(self.install(data, connections=connections))
+                self.assertEqual(os.listdir(self.outside_path), [])
+                self.assertFalse(os.path.islink(os.path.join(
+                    self.target_path, 'evil')))
+                shutil.rmtree(self.staging_path)
+
+    def test_checksum_before_extracting(self):
+        """."""
+        data = make_tar([('gcc/bin/gcc', PAYLOAD, '')])
+        self.assertFalse(self.install(data, get_checksum(b'other'),
+                                      connections=4))
+        self.assertFalse(os.path.exists(self.target_path))
+        self.assertEqual(os.listdir(os.path.dirname(self.target_path)), [])
+        self.assertTrue(any('Checksum mismatch' in m for m in self.messages))
+
+
+if __name__ == '__main__':
+    unittest.main()
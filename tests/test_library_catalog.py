@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Doc."""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import gzip
+import shutil
+import tempfile
+import unittest
+
+import local_server
+from base_utils import library_catalog
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'fixtures', 'library_index.json')
+
+
+def get_names(lib_infos):
+    """."""
+    return [i['name'] for i in lib_infos]
+
+
+class LibraryCatalogTest(unittest.TestCase):
+    """Lookups on a catalog built from the fixture index."""
+
+    def setUp(self):
+        """."""
+        self.dir_path = tempfile.mkdtemp()
+        self.catalog = library_catalog.LibraryCatalog(self.dir_path)
+        self.catalog.import_index(FIXTURE_PATH)
+
+    def tearDown(self):
+        """."""
+        shutil.rmtree(self.dir_path)
+
+    def test_version_key(self):
+        """."""
+        versions = ['1.2.0', '1.10.1', '1.9', '1.0.0-beta']
+        self.assertEqual(sorted(versions, key=library_catalog.version_key),
+                         ['1.0.0-beta', '1.2.0', '1.9', '1.10.1'])
+
+    def test_name_lookup(self):
+        """."""
+        infos = self.catalog.get_versions('servo')
+        self.assertEqual([i['version'] for i in infos], ['1.2.0', '1.10.1'])
+        self.assertEqual(self.catalog.get_library('SERVO')['version'],
+                         '1.10.1')
+        self.assertEqual(self.catalog.get_library('Servo', '1.2.0')['size'],
+                         45000)
+        self.assertEqual(self.catalog.get_library('Servo', '9.9.9'), {})
+        self.assertEqual(self.catalog.get_library('Missing'), {})
+
+    def test_search(self):
+        """."""
+        infos = self.catalog.search('servo')
+        self.assertEqual(get_names(infos), ['ESP32Servo', 'Servo'])
+        self.assertEqual(get_names(self.catalog.search('servo', 'avr')),
+                         ['Servo'])
+        self.assertEqual(get_names(self.catalog.search('led pixels')),
+                         ['Adafruit NeoPixel'])
+        self.assertEqual(get_names(self.catalog.search('', 'esp32')),
+                         ['Adafruit NeoPixel', 'DHT sensor library',
+                          'ESP32Servo'])
+        self.assertEqual(len(self.catalog.search('', limit=2)), 2)
+
+    def test_category_lookup(self):
+        """."""
+        infos = self.catalog.search('', category='Device Control')
+        self.assertEqual(get_names(infos), ['ESP32Servo', 'Servo'])
+        infos = self.catalog.search('', category='sensors')
+        self.assertEqual(get_names(infos), ['DHT sensor library'])
+        self.assertEqual(self.catalog.search('', category='Timing'), [])
+
+    def test_header_lookup(self):
+        """."""
+        infos = self.catalog.find_header('DHT_U.h')
+        self.assertEqual(get_names(infos), ['DHT sensor library'])
+        self.assertEqual(infos[0]['version'], '1.4.6')
+        infos = self.catalog.find_header('Adafruit_NeoPixel.h')
+        self.assertEqual(get_names(infos), ['Adafruit NeoPixel'])
+        infos = self.catalog.find_header('utility/DHT.h')
+        self.assertEqual(get_names(infos), ['DHT sensor library'])
+        self.assertEqual(self.catalog.find_header('stdint.h'), [])
+
+    def test_arch_ranking(self):
+        """."""
+        self.assertEqual(get_names(self.catalog.find_header('Servo.h',
+                                                            'esp32')),
+                         ['ESP32Servo', 'Servo'])
+        self.assertEqual(get_names(self.catalog.find_header('Servo.h',
+                                                            'avr')),
+                         ['Servo', 'ESP32Servo'])
+        lib_info = self.catalog.get_library('ESP32Servo')
+        self.assertEqual(library_catalog.get_arch_rank(lib_info, 'ESP32'), 0)
+        self.assertEqual(library_catalog.get_arch_rank(lib_info, 'avr'), 2)
+        lib_info = self.catalog.get_library('Adafruit NeoPixel')
+        self.assertEqual(library_catalog.get_arch_rank(lib_info, 'avr'), 1)
+
+    def test_offline_load(self):
+        """."""
+        catalog = library_catalog.LibraryCatalog(self.dir_path,
+                                                 'http://127.0.0.1:9/x.gz')
+        state, validators = catalog.update({'etag': '"old"'})
+        self.assertEqual(state, 'failed')
+        self.assertTrue(catalog.is_ready())
+        self.assertEqual(get_names(catalog.find_header('DHT.h')),
+                         ['DHT sensor library'])
+
+        os.remove(catalog.get_table_path())
+        self.assertFalse(catalog.is_ready())
+        self.assertEqual(catalog.search('servo'), [])
+
+    def test_update_from_gzip_index(self):
+        """."""
+        with open(FIXTURE_PATH, 'rb') as f:
+            data = gzip.compress(f.read())
+        server = local_server.StandInServer()
+        try:
+            url = server.add_file('/library_index.json.gz', data, '"v1"')
+            dir_path = os.path.join(self.dir_path, 'remote')
+            catalog = library_catalog.LibraryCatalog(dir_path, url)
+            state, validators = catalog.update()
+            self.assertEqual(state, 'modified')
+            self.assertEqual(catalog.get_library('Servo')['version'],
+                             '1.10.1')
+            state, validators = catalog.update(validators)
+            self.assertEqual(state, 'not_modified')
+        finally:
+            server.close()
+
+        catalog = library_catalog.LibraryCatalog(dir_path, url)
+        self.assertTrue(catalog.is_ready())
+        self.assertEqual(get_names(catalog.search('humidity')),
+                         ['DHT sensor library'])
+
+
+if __name__ == '__main__':
+    unittest.main()
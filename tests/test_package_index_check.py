@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Doc."""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import local_server
+from base_utils import downloader
+from base_utils import index_file
+
+LAST_MODIFIED = 'Mon, 19 Oct 2026 10:00:00 GMT'
+
+
+def make_index(package_name):
+    """."""
+    index_info = {'packages': [{'name': package_name, 'platforms': [],
+                                'tools': []}]}
+    return json.dumps(index_info).encode('utf-8')
+
+
+class PackageIndexCheckTest(unittest.TestCase):
+    """Conditional index downloads against a local stand-in server."""
+
+    def setUp(self):
+        """."""
+        self.server = local_server.StandInServer()
+        self.dir_path = tempfile.mkdtemp()
+        self.url = self.server.add_file('/package_test_index.json',
+                                        make_index('test'), '"v1"',
+                                        LAST_MODIFIED)
+        self.index_path = os.path.join(self.dir_path,
+                                       'package_test_index.json')
+
+    def tearDown(self):
+        """."""
+        self.server.close()
+        shutil.rmtree(self.dir_path)
+
+    def get_package_names(self):
+        """."""
+        info = index_file.IndexFiles([self.index_path]).get_info()
+        return info['packages']['names']
+
+    def test_modified_then_not_modified(self):
+        """."""
+        state, validators = downloader.download_if_modified(self.url,
+                                                            self.dir_path)
+        self.assertEqual(state, 'modified')
+        self.assertEqual(validators, {'etag': '"v1"',
+                                      'last_modified': LAST_MODIFIED})
+        self.assertEqual(self.get_package_names(), ['test'])
+
+        state, validators = downloader.download_if_modified(self.url,
+                                                            self.dir_path,
+                                                            validators)
+        self.assertEqual(state, 'not_modified')
+        headers = self.server.get_requests()[-1][2]
+        self.assertEqual(headers.get('If-None-Match'), '"v1"')
+        self.assertEqual(headers.get('If-Modified-Since'), LAST_MODIFIED)
+
+        last_modified_only = {'last_modified': LAST_MODIFIED}
+        state, validators = downloader.download_if_modified(
+            self.url, self.dir_path, last_modified_only)
+        self.assertEqual(state, 'not_modified')
+        self.assertEqual(validators, last_modified_only)
+
+    def test_missing_local_index(self):
+        """."""
+        state, validators = downloader.download_if_modified(self.url,
+                                                            self.dir_path)
+        os.remove(self.index_path)
+        state, validators = downloader.download_if_modified(self.url,
+                                                            self.dir_path,
+                                                            validators)
+        self.assertEqual(state, 'modified')
+        self.assertTrue(os.path.isfile(self.index_path))
+        headers = self.server.get_requests()[-1][2]
+        self.assertNotIn('If-None-Match', headers)
+        self.assertNotIn('If-Modified-Since', headers)
+
+    def test_cached_parse(self):
+        """."""
+        downloader.download_if_modified(self.url, self.dir_path)
+        info = index_file.IndexFiles.get_file_info(self.index_path)
+        state, validators = downloader.download_if_modified(
+            self.url, self.dir_path, {'etag': '"v1"'})
+        self.assertEqual(state, 'not_modified')
+        self.assertIs(index_file.IndexFiles.get_file_info(self.index_path),
+                      info)
+
+        self.server.add_file('/package_test_index.json',
+                             make_index('changed'), '"v2"', LAST_MODIFIED)
+        state, validators = downloader.download_if_modified(
+            self.url, self.dir_path, validators)
+        self.assertEqual(state, 'modified')
+        self.assertEqual(validators['etag'], '"v2"')
+        mtime = os.path.getmtime(self.index_path)
+        os.utime(self.index_path, (mtime + 10, mtime + 10))
+        self.assertEqual(self.get_package_names(), ['changed'])
+
+    def test_failed(self):
+        """."""
+        url = self.url.replace('package_test', 'missing')
+        state, validators = downloader.download_if_modified(url,
+                                                            self.dir_path)
+        self.assertEqual(state, 'failed')
+        self.assertFalse(os.path.exists(os.path.join(self.dir_path,
+                                                     'missing_index.json')))
+
+
+if __name__ == '__main__':
+    unittest.main()
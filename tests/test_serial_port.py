@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Doc."""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import sys
+import shutil
+import platform
+import tempfile
+import threading
+import unittest
+
+libs_path = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'libs')
+if libs_path not in sys.path:
+    sys.path.insert(0, libs_path)
+
+from base_utils import serial_port  # noqa: E402
+from serial.tools import list_ports_linux  # noqa: E402
+
+TIMEOUT = 6.0
+
+
+class PortMonitorTest(unittest.TestCase):
+    """Drive a PortMonitor with a fake /dev tree."""
+
+    def setUp(self):
+        """."""
+        self.dev_path = tempfile.mkdtemp()
+        self.changes = []
+        self.changed = threading.Event()
+        self.monitor = serial_port.PortMonitor(self.on_change,
+                                               self.dev_path,
+                                               self.list_ports)
+
+    def tearDown(self):
+        """."""
+        self.monitor.stop()
+        shutil.rmtree(self.dev_path)
+
+    def list_ports(self):
+        """."""
+        names = os.listdir(self.dev_path)
+        return sorted(os.path.join(self.dev_path, n) for n in names
+                      if serial_port.is_port_name(n))
+
+    def on_change(self, serial_ports):
+        """."""
+        self.changes.append(serial_ports)
+        self.changed.set()
+
+    def add_node(self, name):
+        """."""
+        open(os.path.join(self.dev_path, name), 'w').close()
+
+    def wait_ports(self, names):
+        """Wait for the callback to report exactly names."""
+        expected = [os.path.join(self.dev_path, n) for n in names]
+        self.changed.wait(TIMEOUT)
+        self.changed.clear()
+        self.assertEqual(self.changes[-1], expected)
+
+    def test_creating_and_removing_nodes(self):
+        """."""
+        self.add_node('ttyACM0')
+        self.monitor.start()
+        self.wait_ports(['ttyACM0'])
+
+        self.add_node('ttyUSB0')
+        self.add_node('null')
+        self.wait_ports(['ttyACM0', 'ttyUSB0'])
+
+        os.remove(os.path.join(self.dev_path, 'ttyACM0'))
+        self.wait_ports(['ttyUSB0'])
+
+    @unittest.skipUnless(platform.system() == 'Linux', 'needs inotify')
+    def test_watcher_reports_port_names(self):
+        """."""
+        watcher = serial_port.DevWatcher(self.dev_path)
+        try:
+            self.add_node('ttyUSB3')
+            self.add_node('sda1')
+            os.remove(os.path.join(self.dev_path, 'ttyUSB3'))
+            self.assertEqual(watcher.read_names(), set(['ttyUSB3']))
+            self.assertEqual(watcher.read_names(), set())
+        finally:
+            watcher.close()
+
+    def test_polling_fallback(self):
+        """."""
+        create = serial_port.DevWatcher.create
+        serial_port.DevWatcher.create = classmethod(lambda cls, path: None)
+        try:
+            self.monitor.start()
+        finally:
+            serial_port.DevWatcher.create = create
+        self.assertFalse(self.changed.wait(0.5))
+
+        self.add_node('ttyUSB1')
+        self.wait_ports(['ttyUSB1'])
+        os.remove(os.path.join(self.dev_path, 'ttyUSB1'))
+        self.wait_ports([])
+
+    def test_list_order(self):
+        """."""
+        for name in ('rfcomm0', 'ttyS10', 'ttyUSB1', 'ttyS2', 'ttySAC0',
+                     'ttyACM0', 'ttyUSB0', 'ttyS0', 'null'):
+            self.add_node(name)
+        names = [os.path.basename(p)
+                 for p in list_ports_linux.list_devices(self.dev_path)]
+        self.assertEqual(names, ['ttyS0', 'ttyS2', 'ttyS10', 'ttySAC0',
+                                 'ttyUSB0', 'ttyUSB1', 'ttyACM0',
+                                 'rfcomm0'])
+
+    def test_stop_is_safe_while_scheduled(self):
+        """."""
+        self.monitor.start()
+        self.monitor.stop()
+        self.monitor.stop()
+        self.monitor.poll()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Doc."""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import sys
+import threading
+import unittest
+
+libs_path = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'libs')
+if libs_path not in sys.path:
+    sys.path.insert(0, libs_path)
+
+from base_utils import task_queue  # noqa: E402
+
+
+class TaskQueueTest(unittest.TestCase):
+    """Batched consumers with mixed queued objects."""
+
+    def test_join_lines(self):
+        """."""
+        self.assertEqual(task_queue.join_lines(['a', 'b\n', ['1'], 3]),
+                         "a\nb\n['1']\n3\n")
+
+    def test_batch_with_list_item(self):
+        """."""
+        texts = []
+        done = threading.Event()
+
+        def consume(text):
+            texts.append(text)
+            if 'last' in text:
+                done.set()
+
+        queue = task_queue.TaskQueue(consume, task_queue.join_lines)
+        for obj in ('first', ['1024'], 'last'):
+            queue.put(obj)
+        self.assertTrue(done.wait(5))
+        self.assertEqual(''.join(texts), "first\n['1024']\nlast\n")
+
+
+if __name__ == '__main__':
+    unittest.main()